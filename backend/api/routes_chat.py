@@ -2,44 +2,31 @@
 """
 routes_chat.py — Чат-бот аналитик ТИТАН
 
-POST /api/chat — вопрос к LLM по загруженным данным ТОРО.
-Поддержка: DeepSeek API (приоритет) → Ollama Qwen3 4B (фоллбек).
+POST /api/chat        — вопрос к LLM по загруженным данным ТОРО.
+POST /api/chat/stream — то же, ответ потоком токенов (SSE).
+Цифры модель получает инструментами по данным сессии (core/chat_tools.py),
+в промпте — только краткая сводка.
+Поддержка: DeepSeek API (приоритет) → Ollama Qwen3 4B (фоллбек),
+клиент и настройки провайдеров — utils/llm_client.py.
 """
 
 import os
-import httpx
+import json
+import asyncio
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from state.session import get_session
 from config.constants import METHODS_RISK
-
-
-# ── Загрузка .env ──
-
-def _load_env():
-    for p in [os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env"),
-              os.path.join(os.path.dirname(__file__), "..", ".env")]:
-        if os.path.exists(p):
-            with open(p) as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith("#") and "=" in line:
-                        k, v = line.split("=", 1)
-                        os.environ.setdefault(k.strip(), v.strip())
-
-_load_env()
+from core import chat_tools
+from utils import llm_client
+from utils.profiling import profiled
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
-# ── Конфигурация LLM ──
-
-DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
-DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
-DEEPSEEK_MODEL = "deepseek-chat"
-
-OLLAMA_URL = "http://localhost:11434/api/chat"
-OLLAMA_MODEL = "qwen3:4b"
+# TITAN_CHAT_TOOLS=0 — без инструментов, вся сводка в промпте
+CHAT_TOOLS_ENABLED = os.environ.get("TITAN_CHAT_TOOLS", "1") != "0"
 
 SYSTEM_PROMPT_TEMPLATE = """\
 Ты — аудитор-аналитик системы ТИТАН Аудит ТОРО. Отвечаешь на русском языке.
@@ -52,9 +39,14 @@ SYSTEM_PROMPT_TEMPLATE = """\
 - Отвечай кратко и по делу
 - Ссылайся на конкретные цифры из данных
 - Если вопрос вне контекста данных — скажи что не имеешь информации
-- Используй термины ТОРО: заказ, ЕО (единица оборудования), ТМ (техническое место), план/факт\
+- Используй термины ТОРО: заказ, ЕО (единица оборудования), ТМ (техническое место), план/факт{tools_rules}\
 """
 
+TOOLS_RULES = """
+- Для цифр, которых нет в сводке (разрезы по ТМ, цехам, периодам, топы), вызывай инструменты \
+list_values / aggregate / top_orders / summary и опирайся только на их результаты
+- Названия объектов сначала уточняй через list_values"""
+
 FALLBACK_MESSAGE = (
     "LLM-модель не подключена. Для работы чата установите Ollama и модель Qwen3 4B.\n"
     "Команды:\n"
@@ -83,8 +75,11 @@ class ChatResponse(BaseModel):
 
 # ── Формирование контекста из DataFrame ──
 
-def _build_context(df) -> str:
-    """Сводка по загруженным данным для системного промпта."""
+def _build_context(df, full: bool = True) -> str:
+    """Сводка по загруженным данным для системного промпта.
+
+    full=False — только общие KPI и измерения (остальное модель получает инструментами).
+    """
     lines = []
 
     # Общие KPI
@@ -97,6 +92,10 @@ def _build_context(df) -> str:
     lines.append(f"План (сумма): {plan_sum:,.0f} руб.".replace(",", " "))
     lines.append(f"Факт (сумма): {fact_sum:,.0f} руб.".replace(",", " "))
     lines.append(f"Отклонение: {dev:+,.0f} руб. ({dev_pct:+.1f}%)".replace(",", " "))
+    if not full:
+        dims = [d for d, col in chat_tools.DIMENSIONS.items() if col in df.columns]
+        lines.append(f"Измерения для инструментов: {', '.join(dims)}")
+        return "\n".join(lines)
 
     # Статистика по методам
     method_stats = []
@@ -143,7 +142,7 @@ def _build_context(df) -> str:
 
     # Топ-5 затратных ТМ
     if 'ТМ' in df.columns and 'Fact_N' in df.columns:
-        tm_sum = df.groupby('ТМ')['Fact_N'].sum().nlargest(5)
+        tm_sum = df.groupby('ТМ', observed=True)['Fact_N'].sum().nlargest(5)
         if not tm_sum.empty:
             lines.append("\nТоп-5 ТМ по фактическим затратам:")
             for tm, s in tm_sum.items():
@@ -152,44 +151,53 @@ def _build_context(df) -> str:
     return "\n".join(lines)
 
 
-# ── Проверка доступности Ollama ──
+def _session_context(session, full: bool = True) -> str:
+    """Сводка для промпта — одна на версию данных сессии (дозагрузка её меняет)."""
+    version = session.get('version', 1)
+    cache = session.setdefault('chat_context', {})
+    if cache.get(full, (None,))[0] != version:
+        cache[full] = (version, _build_context(session["df"], full))
+    return cache[full][1]
+
 
-async def _check_ollama() -> bool:
-    """Проверить доступность Ollama."""
-    try:
-        async with httpx.AsyncClient(timeout=3.0) as client:
-            resp = await client.get("http://localhost:11434/api/tags")
-            return resp.status_code == 200
-    except Exception:
-        return False
+def _build_messages(req: ChatRequest, session, with_tools: bool = False) -> list[dict]:
+    system_prompt = SYSTEM_PROMPT_TEMPLATE.format(
+        context=_session_context(session, full=not with_tools),
+        tools_rules=TOOLS_RULES if with_tools else "",
+    )
+    messages = [{"role": "system", "content": system_prompt}]
+    for msg in req.history[-20:]:
+        messages.append({"role": msg.role, "content": msg.content})
+    messages.append({"role": "user", "content": req.message})
+    return messages
 
 
-async def _query_deepseek(messages: list[dict]) -> str:
-    """Отправить запрос к DeepSeek API."""
-    headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": DEEPSEEK_MODEL, "messages": messages, "max_tokens": 2000, "temperature": 0.3}
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(DEEPSEEK_API_URL, json=payload, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
-        return data["choices"][0]["message"]["content"]
+def _prepare(req: ChatRequest, session, on_call=None):
+    """Сообщения для LLM и инструменты (или None, если отключены).
 
+    Возвращает (messages, tools, plain_messages): plain_messages — функция,
+    строящая сообщения с полной сводкой; вызывается только для модели без
+    поддержки инструментов.
+    """
+    if not CHAT_TOOLS_ENABLED:
+        return _build_messages(req, session), None, None
 
-async def _query_ollama(messages: list[dict]) -> str:
-    """Отправить запрос к Ollama и получить ответ."""
-    payload = {
-        "model": OLLAMA_MODEL,
-        "messages": messages,
-        "stream": False,
+    def execute(name, args):
+        return chat_tools.run_tool(session, name, args)
+
+    tools = {
+        "specs": chat_tools.TOOL_SPECS,
+        "execute": profiled(execute),
+        "on_call": on_call,
     }
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        resp = await client.post(OLLAMA_URL, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-        return data.get("message", {}).get("content", "Нет ответа от модели.")
+    plain = profiled(lambda: _build_messages(req, session))
+    return _build_messages(req, session, with_tools=True), tools, plain
+
 
+UNAVAILABLE_MESSAGE = "LLM недоступна. Проверьте DeepSeek API ключ или Ollama."
 
-# ── Эндпоинт ──
+
+# ── Эндпоинты ──
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat(req: ChatRequest):
@@ -198,42 +206,64 @@ async def chat(req: ChatRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Сессия не найдена.")
 
-    df = session["df"]
-    context = _build_context(df)
-    system_prompt = SYSTEM_PROMPT_TEMPLATE.format(context=context)
+    messages, tools, plain = _prepare(req, session)
+    reply, provider = await llm_client.complete(messages, tools, plain)
+    if provider is None:
+        return ChatResponse(reply=UNAVAILABLE_MESSAGE, llm_available=False)
+    return ChatResponse(reply=reply, llm_available=True)
 
-    messages = [{"role": "system", "content": system_prompt}]
-    for msg in req.history[-20:]:
-        messages.append({"role": msg.role, "content": msg.content})
-    messages.append({"role": "user", "content": req.message})
 
-    # Приоритет: DeepSeek API → Ollama → заглушка
-    if DEEPSEEK_API_KEY:
-        try:
-            reply = await _query_deepseek(messages)
-            return ChatResponse(reply=reply, llm_available=True)
-        except Exception as e:
-            print(f"[Chat] DeepSeek error: {e}")
+def _sse(event, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
 
-    if await _check_ollama():
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Чат с ответом потоком (text/event-stream).
+
+    События: tool {"name", "args"} — модель вызвала инструмент; token {"text"} —
+    очередной фрагмент ответа; done {"llm_available", "provider"} — конец;
+    error {"error"} — обрыв ответа.
+    """
+    session = get_session(req.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Сессия не найдена.")
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_call(name, args):
+        await queue.put(_sse("tool", {"name": name, "args": args}))
+
+    messages, tools, plain = _prepare(req, session, on_call)
+
+    async def produce():
+        provider = None
         try:
-            reply = await _query_ollama(messages)
-            return ChatResponse(reply=reply, llm_available=True)
+            async for provider, token in llm_client.stream(messages, tools, plain):
+                await queue.put(_sse("token", {"text": token}))
         except Exception as e:
-            print(f"[Chat] Ollama error: {e}")
+            print(f"[Chat] stream error: {e}")
+            await queue.put(_sse("error", {"error": str(e)}))
+            await queue.put(None)
+            return
+        if provider is None:
+            await queue.put(_sse("token", {"text": UNAVAILABLE_MESSAGE}))
+        await queue.put(_sse("done", {"llm_available": provider is not None, "provider": provider or "none"}))
+        await queue.put(None)
+
+    async def events():
+        task = asyncio.create_task(produce())
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+        finally:
+            task.cancel()
 
-    return ChatResponse(
-        reply="LLM недоступна. Проверьте DeepSeek API ключ или Ollama.",
-        llm_available=False,
-    )
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @router.get("/chat/status")
 async def chat_status():
-    """Статус доступности LLM-провайдеров."""
-    has_ds = bool(DEEPSEEK_API_KEY)
-    has_ol = await _check_ollama()
-    return {
-        "available": has_ds or has_ol,
-        "provider": "deepseek" if has_ds else ("ollama" if has_ol else "none"),
-    }
+    """Статус доступности LLM-провайдеров (проверка Ollama кэшируется)."""
+    return await llm_client.provider_status()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+api/routes_dashboard.py — Все вкладки одним запросом
+
+POST /api/dashboard — фильтры и скоринг один раз, затем запрошенные разделы
+(параллельно в потоках при parallel=true). При stream=true ответ —
+NDJSON: по строке {"section", "data"} на раздел в порядке готовности,
+чтобы быстрые графики отрисовывались первыми; с format=columns таблицы
+разделов — по колонкам (utils/columnar.py). Расчёт, вытесненный новыми
+фильтрами сессии, прерывается (utils/cancellation.py); в потоке — последней
+строкой {"cancelled": причина}.
+"""
+
+import os
+import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from fastapi import APIRouter, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from state.session import get_session
+from core.pipeline import filter_and_score, merge_thresholds, filter_state
+from utils.cancellation import Cancelled, begin, check, checkpoint, record_cancel, run_cancellable
+from utils.profiling import profiled, profiled_iter
+from utils.columnar import to_columns, wants_columns
+from api.routes_kpi import build_kpi
+from api.routes_finance import build_finance
+from api.routes_timeline import build_timeline
+from api.routes_work_types import build_work_types
+from api.routes_planners import build_planners
+from api.routes_workplaces import build_workplaces
+from api.routes_risks import build_risks
+from api.routes_quality import build_quality
+from api.routes_orders import build_orders
+from api.routes_equipment import build_equipment
+
+router = APIRouter()
+
+# Потоков на расчёт разделов одного запроса
+DASHBOARD_WORKERS = int(os.environ.get('TITAN_DASHBOARD_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Раздел → построитель (data — результат filter_and_score, p — параметры раздела)
+SECTIONS = {
+    'kpi': lambda data, p: build_kpi(data['scored']),
+    'finance': lambda data, p: build_finance(data['scored']),
+    'timeline': lambda data, p: build_timeline(data['scored']),
+    'work_types': lambda data, p: build_work_types(data['scored']),
+    'planners': lambda data, p: build_planners(data['scored']),
+    'workplaces': lambda data, p: build_workplaces(data['scored']),
+    'risks': lambda data, p: build_risks(
+        data['scored'], data['scoring_info'], data['thresholds'],
+        p.get('page', 1), p.get('page_size', 50)),
+    # Вкладка качества смотрит на исходные (не скоренные) колонки
+    'quality': lambda data, p: build_quality(data['filtered']),
+    'orders': lambda data, p: build_orders(
+        data['scored'], data['f'], data['df_all'],
+        p.get('page', 1), p.get('page_size', 50), p.get('sort', 'Risk_Sum'), p.get('order', 'desc')),
+    'equipment': lambda data, p: build_equipment(data['scored'], data['agg'].get('eo_month')),
+}
+
+
+class DashboardRequest(BaseModel):
+    session_id: str
+    filters: dict = {}
+    thresholds: dict = {}
+    sections: list[str] = list(SECTIONS)
+    # Параметры отдельных разделов: {"orders": {"page": 2, "sort": "Fact_N"}, ...}
+    params: dict = {}
+    parallel: bool = True
+    stream: bool = False
+
+
+def _build_section(name, data, params):
+    checkpoint()
+    try:
+        return SECTIONS[name](data, params.get(name) or {})
+    except Cancelled:
+        raise
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _iter_sections(names, data, params, parallel):
+    """(раздел, данные) в порядке готовности."""
+    if not parallel or len(names) < 2 or DASHBOARD_WORKERS < 2:
+        for name in names:
+            yield name, _build_section(name, data, params)
+        return
+    with ThreadPoolExecutor(max_workers=min(DASHBOARD_WORKERS, len(names)),
+                            thread_name_prefix='titan-dashboard') as pool:
+        # Копия контекста — чтобы замеры этапов попали в метрики этого запроса
+        futures = {
+            pool.submit(contextvars.copy_context().run, profiled(_build_section), name, data, params): name
+            for name in names
+        }
+        try:
+            for fut in as_completed(futures):
+                yield futures[fut], fut.result()
+        finally:
+            # Отмена расчёта или закрытый поток ответа — оставшиеся разделы не строить
+            for fut in futures:
+                fut.cancel()
+
+
+@router.post("/api/dashboard")
+async def get_dashboard(req: DashboardRequest, request: Request):
+    """Несколько вкладок по одному проходу фильтров и скоринга."""
+    session = get_session(req.session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    unknown = [s for s in req.sections if s not in SECTIONS]
+    if unknown:
+        return JSONResponse(status_code=400, content={"error": f"Неизвестные разделы: {', '.join(unknown)}"})
+    names = list(dict.fromkeys(req.sections))
+
+    thresh = merge_thresholds(req.thresholds)
+    df_all = session['df']
+    token = begin(req.session_id, filter_state(req.filters, thresh))
+
+    def _score():
+        data = filter_and_score(df_all, req.filters, thresh, session['agg'])
+        data.update(f=req.filters, thresholds=thresh, df_all=df_all)
+        return data
+
+    if req.stream:
+        data = await run_cancellable(token, request, _score)
+        columns = wants_columns()
+
+        def lines():
+            # Разделы строятся уже после ответа — токен проверяется явно между ними
+            try:
+                for name, result in _iter_sections(names, data, req.params, req.parallel):
+                    check(token)
+                    result = jsonable_encoder(result)
+                    if columns:
+                        result = to_columns(result)
+                    line = json.dumps({"section": name, "data": result}, ensure_ascii=False)
+                    yield line.encode('utf-8') + b'\n'
+            except Cancelled as e:
+                record_cancel(token, e.reason)
+                yield json.dumps({"cancelled": e.reason}).encode('utf-8') + b'\n'
+        return StreamingResponse(profiled_iter(lines()), media_type='application/x-ndjson')
+
+    def _build():
+        data = _score()
+        return data, dict(_iter_sections(names, data, req.params, req.parallel))
+
+    data, sections = await run_cancellable(token, request, _build)
+    return {
+        "session_id": req.session_id,
+        "rows": len(data['scored']),
+        "sections": {name: sections[name] for name in names},
+    }
@@ -4,22 +4,25 @@ api/routes_equipment.py — GET /api/tab/equipment
 Вкладка Оборудование: классификация, метрики по классам, TOP-50, heatmap, частота обслуживания.
 """
 
-import json
 import re
 import pandas as pd
 import numpy as np
-from io import BytesIO
-from fastapi import APIRouter, Query
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
 from state.session import get_session
-from utils.filters import apply_hierarchy_filters, apply_extra_filters
-from core.aggregates import compute_aggregates
-from core.risk_scoring_v2 import apply_risk_scoring_v2, _is_empty_eo, is_empty_eo_mask, EMPTY_EO_VALUES
-from config.constants import METHODS_RISK, ВНЕПЛАНОВЫЕ_ВИДЫ
+from core.pipeline import filter_and_score, parse_filters, merge_thresholds, filter_state
+from utils.cancellation import begin, checkpoint, run_cancellable
+from core.grouping import grouped_frame, SUM_MEASURES
+from core.risk_scoring_v2 import eo_valid_mask, EMPTY_EO_VALUES
+from core.eo_series import heatmap_cells
+from config.constants import ВНЕПЛАНОВЫЕ_ВИДЫ
+from utils.export import export_to_tempfile, EXPORT_FORMATS, CSV_ENCODINGS
+from utils.profiling import profiled
+from api.routes_export import parse_columns, streaming_file_response
 
 router = APIRouter()
-DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
 
 MONTH_SHORT = {1:'Янв',2:'Фев',3:'Мар',4:'Апр',5:'Май',6:'Июн',7:'Июл',8:'Авг',9:'Сен',10:'Окт',11:'Ноя',12:'Дек'}
 
@@ -54,40 +57,26 @@ def classify_equipment(text):
     return 'Прочее'
 
 
-def _get_df(session_id, filters_str, thresholds_str):
-    """Получить отфильтрованный DataFrame."""
+def _get_data(session_id, filters_str, thresholds_str):
+    """Результат filter_and_score по сессии (None — нет сессии)."""
     session = get_session(session_id)
     if not session:
         return None
-    df = session['df']
-    try:
-        f = json.loads(filters_str)
-    except Exception:
-        f = {}
-    try:
-        thresh = {**DEFAULT_THRESHOLDS, **json.loads(thresholds_str)}
-    except Exception:
-        thresh = DEFAULT_THRESHOLDS
-    hierarchy = f.get('hierarchy', {})
-    extra = {k: v for k, v in f.items() if k != 'hierarchy'}
-    df_f = apply_hierarchy_filters(df, hierarchy)
-    df_f = apply_extra_filters(df_f, extra)
-    agg = compute_aggregates(df_f)
-    df_f, _ = apply_risk_scoring_v2(df_f, agg, thresh)
-    return df_f
+    return filter_and_score(session['df'], parse_filters(filters_str), merge_thresholds(thresholds_str), session['agg'])
 
 
-@router.get("/api/tab/equipment")
-async def get_equipment(
-    session_id: str = Query(...),
-    filters: str = Query("{}"),
-    thresholds: str = Query("{}")
-):
-    """Данные для вкладки Оборудование."""
-    df_f = _get_df(session_id, filters, thresholds)
-    if df_f is None:
-        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+def _get_df(session_id, filters_str, thresholds_str):
+    """Получить отфильтрованный DataFrame."""
+    data = _get_data(session_id, filters_str, thresholds_str)
+    return None if data is None else data['scored']
+
+
+def build_equipment(df_f, eo_month=None):
+    """Данные для вкладки Оборудование — по уже отфильтрованной выборке.
 
+    eo_month — матрица «ЕО × месяц» сессии (core/eo_series.py): тепловая
+    карта берётся из неё, без группировки выборки.
+    """
     # Определяем колонку ЕО
     eo_col = 'EQUNR_Код' if 'EQUNR_Код' in df_f.columns else 'ЕО'
     eo_name_col = 'ЕО' if 'ЕО' in df_f.columns else eo_col
@@ -95,7 +84,7 @@ async def get_equipment(
     # Фильтруем заказы с реальным ЕО — жёсткая фильтрация
     df_f = df_f.copy()
     if eo_col in df_f.columns:
-        has_eo = ~is_empty_eo_mask(df_f[eo_col])
+        has_eo = eo_valid_mask(df_f)
     else:
         has_eo = pd.Series(False, index=df_f.index)
 
@@ -111,14 +100,14 @@ async def get_equipment(
     # === 1. Метрики по классам ===
     classes_data = []
     if len(df_with_eo) > 0:
-        cls_grp = df_with_eo.groupby('Класс_ЕО').agg(
+        cls_grp = df_with_eo.groupby('Класс_ЕО', observed=True).agg(
             n_eo=(eo_col, 'nunique'),
             n_orders=('ID', 'count'),
             plan=('Plan_N', 'sum'),
             fact=('Fact_N', 'sum'),
         ).reset_index()
         cls_grp['dev'] = cls_grp['fact'] - cls_grp['plan']
-        cls_grp = cls_grp.sort_values('fact', ascending=False)
+        cls_grp = cls_grp.sort_values('fact', ascending=False, kind='stable')
         for _, r in cls_grp.iterrows():
             classes_data.append({
                 "class_name": str(r['Класс_ЕО']),
@@ -144,7 +133,7 @@ async def get_equipment(
     # === 3. TOP-50 ЕО по затратам ===
     top50 = []
     if len(df_with_eo) > 0:
-        eo_stats = df_with_eo.groupby(eo_col).agg(
+        eo_stats = df_with_eo.groupby(eo_col, observed=True).agg(
             n_orders=('ID', 'count'),
             fact=('Fact_N', 'sum'),
             plan=('Plan_N', 'sum'),
@@ -175,10 +164,10 @@ async def get_equipment(
         else:
             df_unpl = df_ab[df_ab['Вид'].str.contains('неплан|аварий|срочн', case=False, na=False)]
         if len(df_unpl) > 0:
-            unpl_grp = df_unpl.groupby('Класс_ЕО').agg(
+            unpl_grp = df_unpl.groupby('Класс_ЕО', observed=True).agg(
                 n_orders=('ID', 'count'),
                 fact=('Fact_N', 'sum'),
-            ).reset_index().sort_values('n_orders', ascending=False)
+            ).reset_index().sort_values('n_orders', ascending=False, kind='stable')
             for _, r in unpl_grp.iterrows():
                 unplanned_leaders.append({
                     "class_name": str(r['Класс_ЕО']),
@@ -198,16 +187,16 @@ async def get_equipment(
 
     if date_col and len(df_with_eo) > 0:
         # Считаем кол-во заказов и сумму затрат для каждого ЕО
-        eo_agg = df_with_eo.groupby(eo_col).agg(
+        eo_agg = df_with_eo.groupby(eo_col, observed=True).agg(
             n_orders=('ID', 'count'),
             total_fact=('Fact_N', 'sum'),
         ).reset_index()
         # ТОП-100 по количеству заказов (убывание)
-        eo_agg_sorted = eo_agg.sort_values('n_orders', ascending=False).head(100)
+        eo_agg_sorted = eo_agg.sort_values('n_orders', ascending=False, kind='stable').head(100)
         top100_eo = eo_agg_sorted[eo_col].tolist()
         # Маппинг ЕО код → наименование
         if eo_name_col in df_with_eo.columns and eo_name_col != eo_col:
-            names = df_with_eo.groupby(eo_col)[eo_name_col].first()
+            names = df_with_eo.groupby(eo_col, observed=True)[eo_name_col].first()
             eo_names_map = {str(k): str(v)[:40] for k, v in names.items()}
         # Статистика для фронтенда
         for _, ea in eo_agg_sorted.iterrows():
@@ -218,21 +207,25 @@ async def get_equipment(
                 "n_orders": int(ea['n_orders']),
                 "total_fact": _sf(ea['total_fact']),
             }
-        df_heat = df_with_eo[df_with_eo[eo_col].isin(top100_eo)].copy()
-        df_heat['_month'] = df_heat[date_col].dt.month
-        df_heat['_year'] = df_heat[date_col].dt.year
-        df_valid = df_heat[df_heat['_month'].notna()]
-        if len(df_valid) > 0:
-            heat_grp = df_valid.groupby([eo_col, '_year', '_month'])['Fact_N'].sum().reset_index()
-            for _, r in heat_grp.iterrows():
-                eo_code = str(r[eo_col])
-                eo_name = eo_names_map.get(eo_code, '')
-                eo_label = f"{eo_code} {eo_name}".strip() if eo_name else eo_code
-                heatmap.append({
-                    "eo": eo_label,
-                    "label": f"{MONTH_SHORT.get(int(r['_month']), '?')} {int(r['_year'])}",
-                    "value": _sf(r['Fact_N']),
-                })
+        if eo_month is not None and eo_month['date_col'] == date_col and eo_month['eo_col'] == eo_col:
+            heat_cells = heatmap_cells(eo_month, df_with_eo, top100_eo)
+        else:
+            df_heat = df_with_eo[df_with_eo[eo_col].isin(top100_eo)].copy()
+            df_heat['_month'] = df_heat[date_col].dt.month
+            df_heat['_year'] = df_heat[date_col].dt.year
+            df_valid = df_heat[df_heat['_month'].notna()]
+            # observed=True: у категориальной колонки ЕО — только встречающиеся ячейки
+            heat_grp = df_valid.groupby([eo_col, '_year', '_month'], observed=True)['Fact_N'].sum()
+            heat_cells = [(eo, int(year), int(month), fact) for (eo, year, month), fact in heat_grp.items()]
+        for eo, year, month, fact in heat_cells:
+            eo_code = str(eo)
+            eo_name = eo_names_map.get(eo_code, '')
+            eo_label = f"{eo_code} {eo_name}".strip() if eo_name else eo_code
+            heatmap.append({
+                "eo": eo_label,
+                "label": f"{MONTH_SHORT.get(month, '?')} {year}",
+                "value": _sf(fact),
+            })
 
     # === 6. Частота обслуживания ===
     frequency = []
@@ -244,7 +237,7 @@ async def get_equipment(
         df_freq = df_freq.sort_values([eo_col, date_col])
         # Средний интервал между заказами на ЕО
         intervals = []
-        for eo_id, grp in df_freq.groupby(eo_col):
+        for eo_id, grp in df_freq.groupby(eo_col, observed=True):
             if len(grp) < 2:
                 continue
             dates = grp[date_col].sort_values()
@@ -268,9 +261,7 @@ async def get_equipment(
     # === 7. ABC-распределение ===
     abc_data = []
     if 'ABC' in df_f.columns:
-        abc_stats = df_f.groupby('ABC').agg(
-            count=('ID', 'count'), sum=('Fact_N', 'sum')
-        ).reset_index()
+        abc_stats = grouped_frame(df_f, 'ABC', SUM_MEASURES)
         total_abc = abc_stats['sum'].sum()
         for _, r in abc_stats.sort_values('sum', ascending=False).iterrows():
             pct = r['sum'] / max(total_abc, 1) * 100
@@ -333,31 +324,65 @@ async def get_equipment(
     }
 
 
+@router.get("/api/tab/equipment")
+async def get_equipment(
+    request: Request,
+    session_id: str = Query(...),
+    filters: str = Query("{}"),
+    thresholds: str = Query("{}")
+):
+    """Данные для вкладки Оборудование."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    f, thresh = parse_filters(filters), merge_thresholds(thresholds)
+
+    def _build():
+        data = filter_and_score(session['df'], f, thresh, session['agg'])
+        checkpoint()
+        return build_equipment(data['scored'], data['agg'].get('eo_month'))
+
+    return await run_cancellable(begin(session_id, filter_state(f, thresh)), request, _build)
+
+
 @router.get("/api/export/equipment-excel")
 async def export_equipment_excel(
     session_id: str = Query(...),
     filters: str = Query("{}"),
     thresholds: str = Query("{}"),
     eo: str = Query(""),
+    format: str = Query("xlsx"),
+    columns: str = Query(""),
+    encoding: str = Query("utf-8-sig"),
 ):
-    """Выгрузка заказов по конкретному ЕО в Excel."""
-    df_f = _get_df(session_id, filters, thresholds)
-    if df_f is None:
+    """Выгрузка заказов по конкретному ЕО (xlsx / csv / parquet)."""
+    if format not in EXPORT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"Неизвестный формат: {format}"})
+    if format == 'csv' and encoding not in CSV_ENCODINGS:
+        return JSONResponse(status_code=400, content={"error": f"Неподдерживаемая кодировка: {encoding}"})
+
+    def _build():
+        df_f = _get_df(session_id, filters, thresholds)
+        if df_f is None:
+            return None
+        eo_col = 'EQUNR_Код' if 'EQUNR_Код' in df_f.columns else 'ЕО'
+        if eo and eo_col in df_f.columns:
+            df_export = df_f[df_f[eo_col].astype(str) == eo]
+        else:
+            df_export = df_f.head(0)
+        cols = parse_columns(columns) or [
+            c for c in ['ID', 'Текст', 'Вид', 'STAT', 'ABC', 'Plan_N', 'Fact_N', 'ТМ', 'ЕО', 'Начало', 'Конец']
+            if c in df_export.columns
+        ]
+        return export_to_tempfile(df_export, format, columns=cols, encoding=encoding,
+                                  sheet_name=f'ЕО_{eo[:20]}')
+
+    try:
+        path = await run_in_threadpool(profiled(_build))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if path is None:
         return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
 
-    eo_col = 'EQUNR_Код' if 'EQUNR_Код' in df_f.columns else 'ЕО'
-    if eo and eo_col in df_f.columns:
-        df_export = df_f[df_f[eo_col].astype(str) == eo]
-    else:
-        df_export = df_f.head(0)
-
-    cols = [c for c in ['ID', 'Текст', 'Вид', 'STAT', 'ABC', 'Plan_N', 'Fact_N', 'ТМ', 'ЕО', 'Начало', 'Конец'] if c in df_export.columns]
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df_export[cols].to_excel(writer, index=False, sheet_name=f'ЕО_{eo[:20]}')
-    output.seek(0)
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=EO_{eo[:20]}.xlsx"}
-    )
+    return streaming_file_response(path, format, f"EO_{eo[:20]}")
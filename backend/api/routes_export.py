@@ -1,52 +1,55 @@
 # -*- coding: utf-8 -*-
 """
-api/routes_export.py — GET /api/export/excel
+api/routes_export.py — GET /api/export/excel, /api/export/jobs (фоновый экспорт)
 """
 
 import json
 import pandas as pd
 from fastapi import APIRouter, Query
 from fastapi.responses import StreamingResponse, JSONResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 
 from state.session import get_session
-from utils.filters import apply_hierarchy_filters, apply_extra_filters
-from core.aggregates import compute_aggregates
-from core.risk_scoring_v2 import apply_risk_scoring_v2, is_empty_eo_mask
-from utils.export import create_excel_download
+from state.export_jobs import (
+    submit_export_job, get_job, cancel_job, job_status, ExportQueueFull
+)
+from core.risk_scoring_v2 import eo_valid_mask
+from core.pipeline import filter_and_score
+from utils.export import export_to_tempfile, iter_file, EXPORT_FORMATS, CSV_ENCODINGS
+from utils.profiling import profiled
 from config.constants import METHODS_RISK
 
 router = APIRouter()
 DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
 
 
-@router.get("/api/export/excel")
-async def export_excel(
-    session_id: str = Query(...),
-    filters: str = Query("{}"),
-    thresholds: str = Query("{}")
-):
-    """Скачать Excel."""
-    session = get_session(session_id)
-    if not session:
-        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
-
-    df = session['df']
-    try:
-        f = json.loads(filters)
-    except Exception:
-        f = {}
+def parse_columns(columns_str):
+    """Список колонок для проекции (JSON-массив или через запятую)."""
+    if not columns_str:
+        return []
     try:
-        thresh = {**DEFAULT_THRESHOLDS, **json.loads(thresholds)}
+        cols = json.loads(columns_str)
+        return [str(c) for c in cols] if isinstance(cols, list) else [str(cols)]
     except Exception:
-        thresh = DEFAULT_THRESHOLDS
+        return [c.strip() for c in columns_str.split(',') if c.strip()]
 
-    hierarchy = f.get('hierarchy', {})
-    extra = {k: v for k, v in f.items() if k != 'hierarchy'}
-    df_f = apply_hierarchy_filters(df, hierarchy)
-    df_f = apply_extra_filters(df_f, extra)
-    agg = compute_aggregates(df_f)
-    df_f, _ = apply_risk_scoring_v2(df_f, agg, thresh)
+
+def streaming_file_response(path, fmt, filename_prefix, delete=True):
+    """Отдать готовый файл экспорта кусками (по умолчанию — с удалением после отправки)."""
+    info = EXPORT_FORMATS[fmt]
+    filename = f"{filename_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{info['ext']}"
+    return StreamingResponse(
+        iter_file(path, delete=delete),
+        media_type=info['media_type'],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def prepare_export_df(df, f, thresh, session_agg=None):
+    """Фильтры + скоринг + быстрые фильтры вкладки Заказы — итоговый DataFrame экспорта."""
+    df_f = filter_and_score(df, f, thresh, session_agg)['scored']
 
     # Быстрые фильтры (из вкладки Заказы)
     quick = f.get('quick_filters', {})
@@ -77,14 +80,117 @@ async def export_excel(
     c2m2_flag = 'S_C2-M2: Проблемное оборудование'
     eo_col = 'EQUNR_Код' if 'EQUNR_Код' in df_f.columns else 'ЕО'
     if c2m2_flag in df_f.columns and eo_col in df_f.columns:
-        empty_eo = is_empty_eo_mask(df_f[eo_col])
-        df_f = df_f[~(df_f[c2m2_flag] & empty_eo)]
+        df_f = df_f[~(df_f[c2m2_flag] & ~eo_valid_mask(df_f))]
 
-    output = create_excel_download(df_f, "titan_export")
-    filename = f"titan_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return df_f
 
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+
+@router.get("/api/export/excel")
+async def export_excel(
+    session_id: str = Query(...),
+    filters: str = Query("{}"),
+    thresholds: str = Query("{}"),
+    format: str = Query("xlsx"),
+    columns: str = Query(""),
+    encoding: str = Query("utf-8-sig"),
+):
+    """Скачать выгрузку (xlsx / csv / parquet) с проекцией колонок."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+    if format not in EXPORT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"Неизвестный формат: {format}"})
+    if format == 'csv' and encoding not in CSV_ENCODINGS:
+        return JSONResponse(status_code=400, content={"error": f"Неподдерживаемая кодировка: {encoding}"})
+
+    df = session['df']
+    agg = session['agg']
+    try:
+        f = json.loads(filters)
+    except Exception:
+        f = {}
+    try:
+        thresh = {**DEFAULT_THRESHOLDS, **json.loads(thresholds)}
+    except Exception:
+        thresh = DEFAULT_THRESHOLDS
+
+    def _build():
+        df_f = prepare_export_df(df, f, thresh, agg)
+        return export_to_tempfile(df_f, format, columns=parse_columns(columns), encoding=encoding)
+
+    try:
+        path = await run_in_threadpool(profiled(_build))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    return streaming_file_response(path, format, "titan_export")
+
+
+# ── Фоновые задания экспорта ──
+
+class ExportJobRequest(BaseModel):
+    session_id: str
+    filters: dict = {}
+    thresholds: dict = {}
+    format: str = 'xlsx'
+    columns: list[str] = []
+    encoding: str = 'utf-8-sig'
+
+
+@router.post("/api/export/jobs")
+async def create_export_job(req: ExportJobRequest):
+    """Поставить экспорт в очередь — возвращает id задания."""
+    session = get_session(req.session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+    if req.format not in EXPORT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"Неизвестный формат: {req.format}"})
+    if req.format == 'csv' and req.encoding not in CSV_ENCODINGS:
+        return JSONResponse(status_code=400, content={"error": f"Неподдерживаемая кодировка: {req.encoding}"})
+
+    df = session['df']
+    agg = session['agg']
+    f = req.filters
+    thresh = {**DEFAULT_THRESHOLDS, **req.thresholds}
+    key = json.dumps(
+        [req.session_id, session.get('version', 1), f, thresh, req.format, req.columns, req.encoding if req.format == 'csv' else ''],
+        sort_keys=True, ensure_ascii=False, default=str
     )
+
+    try:
+        job = submit_export_job(
+            req.session_id, key, lambda: prepare_export_df(df, f, thresh, agg), req.format,
+            columns=req.columns, encoding=req.encoding,
+        )
+    except ExportQueueFull:
+        return JSONResponse(status_code=429, content={"error": "Очередь экспорта заполнена, повторите позже"})
+    return job_status(job)
+
+
+@router.get("/api/export/jobs/{job_id}")
+async def get_export_job(job_id: str):
+    """Статус задания экспорта (строк записано, этап, ссылка на файл)."""
+    job = get_job(job_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"error": "Задание не найдено"})
+    return job_status(job)
+
+
+@router.get("/api/export/jobs/{job_id}/download")
+async def download_export_job(job_id: str):
+    """Скачать готовый файл задания."""
+    job = get_job(job_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"error": "Задание не найдено"})
+    if job['status'] != 'done' or not job['path']:
+        return JSONResponse(status_code=409, content={"error": "Файл ещё не готов", "status": job['status']})
+    return streaming_file_response(job['path'], job['format'], job['filename_prefix'], delete=False)
+
+
+@router.delete("/api/export/jobs/{job_id}")
+async def delete_export_job(job_id: str):
+    """Отменить задание (или удалить готовый файл)."""
+    job = cancel_job(job_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"error": "Задание не найдено"})
+    return job_status(job)
@@ -3,16 +3,14 @@
 api/routes_finance.py — GET /api/tab/finance
 """
 
-import json
 import pandas as pd
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import JSONResponse
 
 from state.session import get_session
-from utils.filters import apply_hierarchy_filters, apply_extra_filters
-from core.aggregates import compute_aggregates
-from core.risk_scoring_v2 import apply_risk_scoring_v2
-from config.constants import METHODS_RISK
+from core.pipeline import filter_and_score, parse_filters, merge_thresholds, filter_state
+from utils.cancellation import begin, checkpoint, run_cancellable
+from core.grouping import grouped_frame, COST_MEASURES, SUM_MEASURES
 
 router = APIRouter()
 
@@ -22,9 +20,6 @@ MONTH_SHORT = {
     9: 'Сен', 10: 'Окт', 11: 'Ноя', 12: 'Дек'
 }
 
-DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
-
-
 def _sf(val):
     """Safe float."""
     if pd.isna(val):
@@ -32,48 +27,8 @@ def _sf(val):
     return float(val)
 
 
-def _get_df(session_id, filters_str, thresholds_str):
-    """Общая логика получения отфильтрованного DataFrame."""
-    session = get_session(session_id)
-    if not session:
-        return None, None
-
-    df = session['df']
-
-    try:
-        f = json.loads(filters_str)
-    except Exception:
-        f = {}
-
-    try:
-        thresh = json.loads(thresholds_str)
-        merged = {**DEFAULT_THRESHOLDS, **thresh}
-    except Exception:
-        merged = DEFAULT_THRESHOLDS
-
-    hierarchy = f.get('hierarchy', {})
-    extra = {k: v for k, v in f.items() if k != 'hierarchy'}
-
-    df_filtered = apply_hierarchy_filters(df, hierarchy)
-    df_filtered = apply_extra_filters(df_filtered, extra)
-
-    agg = compute_aggregates(df_filtered)
-    df_scored, _ = apply_risk_scoring_v2(df_filtered, agg, merged)
-
-    return df_scored, agg
-
-
-@router.get("/api/tab/finance")
-async def get_finance(
-    session_id: str = Query(...),
-    filters: str = Query("{}"),
-    thresholds: str = Query("{}")
-):
-    """Данные для вкладки Финансы."""
-    df_f, agg = _get_df(session_id, filters, thresholds)
-    if df_f is None:
-        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
-
+def build_finance(df_f):
+    """Данные для вкладки Финансы — по уже отфильтрованной выборке."""
     result = {}
 
     # 1. Помесячные данные
@@ -110,9 +65,7 @@ async def get_finance(
     # 2. Цеха
     ceh_data = []
     if 'ЦЕХ' in df_f.columns:
-        ceh_stats = df_f.groupby('ЦЕХ').agg(
-            count=('ID', 'count'), fact=('Fact_N', 'sum'), plan=('Plan_N', 'sum')
-        ).reset_index()
+        ceh_stats = grouped_frame(df_f, 'ЦЕХ', COST_MEASURES)
         ceh_stats['dev'] = ceh_stats['fact'] - ceh_stats['plan']
         ceh_stats = ceh_stats[ceh_stats['ЦЕХ'] != 'Н/Д']
         ceh_stats = ceh_stats.sort_values('dev', ascending=False)
@@ -130,14 +83,12 @@ async def get_finance(
     # 3. ТМ
     tm_data = []
     if 'ТМ_Код' in df_f.columns:
-        df_tm = df_f[df_f['ТМ_Код'].astype(str).str.len() >= 12]
+        tm_mask = (df_f['ТМ_Код'].astype(str).str.len() >= 12).to_numpy()
     else:
-        df_tm = df_f[df_f['ТМ'].astype(str).str.match(r'^ST\d{2}\.\d{4}\.\w+', na=False)]
+        tm_mask = df_f['ТМ'].astype(str).str.match(r'^ST\d{2}\.\d{4}\.\w+', na=False).to_numpy()
 
-    if len(df_tm) > 0:
-        tm_stats = df_tm.groupby('ТМ').agg(
-            count=('ID', 'count'), fact=('Fact_N', 'sum'), plan=('Plan_N', 'sum')
-        ).reset_index()
+    if tm_mask.any():
+        tm_stats = grouped_frame(df_f, 'ТМ', COST_MEASURES, mask=tm_mask)
         tm_stats['dev'] = tm_stats['fact'] - tm_stats['plan']
 
         tm_over = tm_stats[tm_stats['dev'] > 0].sort_values('dev', ascending=False).head(15)
@@ -156,9 +107,7 @@ async def get_finance(
 
     # 4. ABC
     abc_data = []
-    abc_stats = df_f.groupby('ABC').agg(
-        count=('ID', 'count'), sum=('Fact_N', 'sum')
-    ).reset_index()
+    abc_stats = grouped_frame(df_f, 'ABC', SUM_MEASURES)
     total_abc = abc_stats['sum'].sum()
 
     for _, r in abc_stats.sort_values('sum', ascending=False).iterrows():
@@ -236,3 +185,25 @@ async def get_finance(
     }
 
     return result
+
+
+@router.get("/api/tab/finance")
+async def get_finance(
+    request: Request,
+    session_id: str = Query(...),
+    filters: str = Query("{}"),
+    thresholds: str = Query("{}")
+):
+    """Данные для вкладки Финансы."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    f, thresh = parse_filters(filters), merge_thresholds(thresholds)
+
+    def _build():
+        data = filter_and_score(session['df'], f, thresh, session['agg'])
+        checkpoint()
+        return build_finance(data['scored'])
+
+    return await run_cancellable(begin(session_id, filter_state(f, thresh)), request, _build)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+api/routes_hierarchy.py — GET /api/hierarchy/tree
+"""
+
+import json
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+
+from state.session import get_session
+from core.hierarchy_tree import get_hierarchy_tree, get_subtree
+from config.constants import METHODS_RISK, HIERARCHY_LEVELS
+
+router = APIRouter()
+DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
+
+
+@router.get("/api/hierarchy/tree")
+async def get_tree(
+    session_id: str = Query(...),
+    path: str = Query("[]"),
+    depth: int = Query(1, ge=0, le=len(HIERARCHY_LEVELS)),
+    thresholds: str = Query("{}")
+):
+    """Поддерево иерархии с суммами план/факт/перерасход/риск на каждом узле."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    try:
+        node_path = json.loads(path)
+        if not isinstance(node_path, list):
+            node_path = [node_path]
+    except Exception:
+        node_path = []
+    try:
+        thresh = {**DEFAULT_THRESHOLDS, **json.loads(thresholds)}
+    except Exception:
+        thresh = DEFAULT_THRESHOLDS
+
+    tree = get_hierarchy_tree(session, thresh)
+    node = get_subtree(tree, node_path, depth)
+    if node is None:
+        return JSONResponse(status_code=404, content={"error": "Узел иерархии не найден"})
+
+    levels = session['hierarchy']['index']['levels']
+    return {
+        "levels": [lvl for lvl in HIERARCHY_LEVELS if lvl['key'] in levels],
+        "path": [str(p) for p in node_path],
+        "node": node,
+    }
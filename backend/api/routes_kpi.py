@@ -3,22 +3,17 @@
 api/routes_kpi.py — GET /api/kpi
 """
 
-import json
 import pandas as pd
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import JSONResponse
 
 from state.session import get_session
-from utils.filters import apply_hierarchy_filters, apply_extra_filters
-from core.aggregates import compute_aggregates
-from core.risk_scoring_v2 import apply_risk_scoring_v2
+from core.pipeline import filter_and_score, parse_filters, merge_thresholds, filter_state
+from utils.cancellation import begin, checkpoint, run_cancellable
 from utils.formatters import fmt_short, fmt
-from config.constants import METHODS_RISK
 
 router = APIRouter()
 
-DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
-
 
 def _safe_float(val):
     """Безопасное преобразование в float для JSON."""
@@ -27,41 +22,8 @@ def _safe_float(val):
     return float(val)
 
 
-@router.get("/api/kpi")
-async def get_kpi(
-    session_id: str = Query(...),
-    filters: str = Query("{}"),
-    thresholds: str = Query("{}")
-):
-    """KPI-блок (6 карточек + 3 макс-карточки + статистика по выгрузке)."""
-    session = get_session(session_id)
-    if not session:
-        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
-
-    df = session['df']
-
-    try:
-        f = json.loads(filters)
-    except Exception:
-        f = {}
-
-    try:
-        thresh = json.loads(thresholds)
-        merged_thresholds = {**DEFAULT_THRESHOLDS, **thresh}
-    except Exception:
-        merged_thresholds = DEFAULT_THRESHOLDS
-
-    # Применяем фильтры
-    hierarchy = f.get('hierarchy', {})
-    extra = {k: v for k, v in f.items() if k != 'hierarchy'}
-
-    df_filtered = apply_hierarchy_filters(df, hierarchy)
-    df_filtered = apply_extra_filters(df_filtered, extra)
-
-    # Агрегаты и скоринг v2
-    agg = compute_aggregates(df_filtered)
-    df_scored, _ = apply_risk_scoring_v2(df_filtered, agg, merged_thresholds)
-
+def build_kpi(df_scored):
+    """KPI-блок (6 карточек + 3 макс-карточки + статистика по выгрузке) — по уже отфильтрованной выборке."""
     total = len(df_scored)
     plan = _safe_float(df_scored['Plan_N'].sum())
     fact = _safe_float(df_scored['Fact_N'].sum())
@@ -123,3 +85,25 @@ async def get_kpi(
         "fact_fmt": fmt_short(fact),
         "dev_fmt": fmt_short(abs(dev)),
     }
+
+
+@router.get("/api/kpi")
+async def get_kpi(
+    request: Request,
+    session_id: str = Query(...),
+    filters: str = Query("{}"),
+    thresholds: str = Query("{}")
+):
+    """KPI-блок (6 карточек + 3 макс-карточки + статистика по выгрузке)."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    f, thresh = parse_filters(filters), merge_thresholds(thresholds)
+
+    def _build():
+        data = filter_and_score(session['df'], f, thresh, session['agg'])
+        checkpoint()
+        return build_kpi(data['scored'])
+
+    return await run_cancellable(begin(session_id, filter_state(f, thresh)), request, _build)
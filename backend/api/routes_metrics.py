@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+api/routes_metrics.py — GET /api/metrics (Prometheus), GET /api/metrics/slow
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from utils.metrics import render_prometheus, slow_requests, SLOW_REQUEST_SEC
+
+router = APIRouter()
+
+
+@router.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Гистограммы длительности этапов по маршрутам в текстовом формате Prometheus."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/api/metrics/slow")
+async def get_slow_requests():
+    """Последние медленные запросы с разбивкой по этапам."""
+    return {"threshold_sec": SLOW_REQUEST_SEC, "requests": slow_requests()}
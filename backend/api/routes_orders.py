@@ -3,56 +3,24 @@
 api/routes_orders.py — GET /api/tab/orders
 """
 
-import json
 import pandas as pd
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import JSONResponse
 
 from state.session import get_session
-from utils.filters import apply_hierarchy_filters, apply_extra_filters
-from core.aggregates import compute_aggregates
-from core.risk_scoring_v2 import apply_risk_scoring_v2, _is_empty_eo, is_empty_eo_mask
+from core.pipeline import filter_and_score, parse_filters, merge_thresholds, filter_state
+from utils.cancellation import begin, checkpoint, run_cancellable
+from core.risk_scoring_v2 import eo_valid_mask, row_eo_code, row_eo_name
 from config.constants import METHODS_RISK
 
 router = APIRouter()
-DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
 
 def _sf(v):
     return 0.0 if pd.isna(v) else float(v)
 
 
-@router.get("/api/tab/orders")
-async def get_orders(
-    session_id: str = Query(...),
-    filters: str = Query("{}"),
-    thresholds: str = Query("{}"),
-    page: int = Query(1, ge=1),
-    page_size: int = Query(50, ge=10, le=200),
-    sort: str = Query("Risk_Sum"),
-    order: str = Query("desc")
-):
-    """Реестр заказов с пагинацией."""
-    session = get_session(session_id)
-    if not session:
-        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
-
-    df = session['df']
-    try:
-        f = json.loads(filters)
-    except Exception:
-        f = {}
-    try:
-        thresh = {**DEFAULT_THRESHOLDS, **json.loads(thresholds)}
-    except Exception:
-        thresh = DEFAULT_THRESHOLDS
-
-    hierarchy = f.get('hierarchy', {})
-    extra = {k: v for k, v in f.items() if k != 'hierarchy'}
-    df_f = apply_hierarchy_filters(df, hierarchy)
-    df_f = apply_extra_filters(df_f, extra)
-    agg = compute_aggregates(df_f)
-    df_f, _ = apply_risk_scoring_v2(df_f, agg, thresh)
-
+def build_orders(df_f, f, df_all, page=1, page_size=50, sort='Risk_Sum', order='desc'):
+    """Реестр заказов с пагинацией — по уже отфильтрованной выборке."""
     # Быстрые фильтры вкладки Заказы
     quick = f.get('quick_filters', {})
     if quick:
@@ -77,7 +45,7 @@ async def get_orders(
             if any('C2-M2' in v for v in method_vals):
                 eo_col_filt = 'EQUNR_Код' if 'EQUNR_Код' in df_f.columns else 'ЕО'
                 if eo_col_filt in df_f.columns:
-                    df_f = df_f[~is_empty_eo_mask(df_f[eo_col_filt])]
+                    df_f = df_f[eo_valid_mask(df_f)]
         # Поиск по нескольким номерам заказов
         order_ids = quick.get('order_ids', [])
         if order_ids and 'ID' in df_f.columns:
@@ -118,10 +86,6 @@ async def get_orders(
     end = start + page_size
     df_page = df_f.iloc[start:end]
 
-    # Определяем колонки оборудования
-    eo_col = 'EQUNR_Код' if 'EQUNR_Код' in df_f.columns else None
-    eo_name_col = 'ЕО' if 'ЕО' in df_f.columns else None
-
     # Формируем данные
     columns_order = [
         'ID', 'Текст', 'ТМ', 'Вид', 'STAT', 'ABC',
@@ -147,20 +111,14 @@ async def get_orders(
             else:
                 item[col] = None
         # Код ЕО и Наименование ЕО — отдельными полями
-        eo_code_val = str(row.get(eo_col, '')) if eo_col and eo_col in row.index else ''
-        if _is_empty_eo(eo_code_val):
-            eo_code_val = ''
-        item['equipment_code'] = eo_code_val
-        eo_name_val = str(row.get(eo_name_col, '')) if eo_name_col and eo_name_col in row.index else ''
-        if _is_empty_eo(eo_name_val):
-            eo_name_val = ''
-        item['equipment_name'] = eo_name_val
+        item['equipment_code'] = row_eo_code(row)
+        item['equipment_name'] = row_eo_name(row)
         data.append(item)
 
     # Опции для быстрых фильтров (уникальные значения в текущей выборке до quick_filters)
     def _opts(col, limit=50):
-        if col in session['df'].columns:
-            vals = session['df'][col].dropna().astype(str)
+        if col in df_all.columns:
+            vals = df_all[col].dropna().astype(str)
             vals = vals[~vals.isin(['Н/Д', 'nan', 'None', '', 'Не присвоено'])]
             return sorted(vals.unique().tolist())[:limit]
         return []
@@ -183,3 +141,29 @@ async def get_orders(
         "page_size": page_size,
         "quick_options": quick_options,
     }
+
+
+@router.get("/api/tab/orders")
+async def get_orders(
+    request: Request,
+    session_id: str = Query(...),
+    filters: str = Query("{}"),
+    thresholds: str = Query("{}"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=10, le=200),
+    sort: str = Query("Risk_Sum"),
+    order: str = Query("desc")
+):
+    """Реестр заказов с пагинацией."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    f, thresh = parse_filters(filters), merge_thresholds(thresholds)
+
+    def _build():
+        data = filter_and_score(session['df'], f, thresh, session['agg'])
+        checkpoint()
+        return build_orders(data['scored'], f, session['df'], page, page_size, sort, order)
+
+    return await run_cancellable(begin(session_id, filter_state(f, thresh)), request, _build)
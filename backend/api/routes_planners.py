@@ -3,58 +3,28 @@
 api/routes_planners.py — GET /api/tab/planners
 """
 
-import json
 import pandas as pd
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import JSONResponse
 
 from state.session import get_session
-from utils.filters import apply_hierarchy_filters, apply_extra_filters
-from core.aggregates import compute_aggregates
-from core.risk_scoring_v2 import apply_risk_scoring_v2
+from core.pipeline import filter_and_score, parse_filters, merge_thresholds, filter_state
+from utils.cancellation import begin, checkpoint, run_cancellable
+from core.grouping import grouped_stats, grouped_frame, COST_MEASURES
 from config.constants import METHODS_RISK
 
 router = APIRouter()
-DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
 
 def _sf(v):
     return 0.0 if pd.isna(v) else float(v)
 
 
-@router.get("/api/tab/planners")
-async def get_planners(
-    session_id: str = Query(...),
-    filters: str = Query("{}"),
-    thresholds: str = Query("{}")
-):
-    """Данные для вкладки Плановики."""
-    session = get_session(session_id)
-    if not session:
-        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
-
-    df = session['df']
-    try:
-        f = json.loads(filters)
-    except Exception:
-        f = {}
-    try:
-        thresh = {**DEFAULT_THRESHOLDS, **json.loads(thresholds)}
-    except Exception:
-        thresh = DEFAULT_THRESHOLDS
-
-    hierarchy = f.get('hierarchy', {})
-    extra = {k: v for k, v in f.items() if k != 'hierarchy'}
-    df_f = apply_hierarchy_filters(df, hierarchy)
-    df_f = apply_extra_filters(df_f, extra)
-    agg = compute_aggregates(df_f)
-    df_f, _ = apply_risk_scoring_v2(df_f, agg, thresh)
-
+def build_planners(df_f):
+    """Данные для вкладки Плановики — по уже отфильтрованной выборке."""
     # Группы плановиков
     ingrp_data = []
     if 'INGRP' in df_f.columns:
-        stats = df_f.groupby('INGRP').agg(
-            count=('ID', 'count'), fact=('Fact_N', 'sum'), plan=('Plan_N', 'sum')
-        ).reset_index()
+        stats = grouped_frame(df_f, 'INGRP', COST_MEASURES)
         stats['dev'] = stats['fact'] - stats['plan']
         stats = stats.sort_values('dev', ascending=False)
 
@@ -70,9 +40,7 @@ async def get_planners(
     # Авторы
     users_data = []
     if 'USER' in df_f.columns:
-        u_stats = df_f.groupby('USER').agg(
-            count=('ID', 'count'), fact=('Fact_N', 'sum'), plan=('Plan_N', 'sum')
-        ).reset_index()
+        u_stats = grouped_frame(df_f, 'USER', COST_MEASURES)
         u_stats['dev'] = u_stats['fact'] - u_stats['plan']
         u_stats = u_stats.sort_values('dev', ascending=False).head(20)
 
@@ -140,11 +108,12 @@ async def get_planners(
     # Heatmap плановик × метод
     heatmap = []
     if 'INGRP' in df_f.columns:
-        for method_name in METHODS_RISK.keys():
-            flag = f"S_{method_name}"
-            if flag in df_f.columns:
-                method_by_ingrp = df_f.groupby('INGRP')[flag].sum().to_dict()
-                for ingrp_name, count in method_by_ingrp.items():
+        # Все флаги методов — одним проходом по кодам INGRP
+        flags = {m: (f"S_{m}", 'sum') for m in METHODS_RISK.keys() if f"S_{m}" in df_f.columns}
+        if flags:
+            by_ingrp = grouped_stats(df_f, ['INGRP'], flags)['INGRP']
+            for method_name in flags:
+                for ingrp_name, count in zip(by_ingrp['keys'], by_ingrp[method_name]):
                     if count > 0:
                         heatmap.append({
                             "ingrp": str(ingrp_name),
@@ -169,3 +138,25 @@ async def get_planners(
             "overrun_count": overrun,
         }
     }
+
+
+@router.get("/api/tab/planners")
+async def get_planners(
+    request: Request,
+    session_id: str = Query(...),
+    filters: str = Query("{}"),
+    thresholds: str = Query("{}")
+):
+    """Данные для вкладки Плановики."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    f, thresh = parse_filters(filters), merge_thresholds(thresholds)
+
+    def _build():
+        data = filter_and_score(session['df'], f, thresh, session['agg'])
+        checkpoint()
+        return build_planners(data['scored'])
+
+    return await run_cancellable(begin(session_id, filter_state(f, thresh)), request, _build)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+api/routes_profiling.py — GET /api/profiles (профили запросов с ?profile=1|sample)
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, FileResponse
+
+from utils.profiling import PROFILING_ENABLED, PROFILE_DIR, list_profiles, load_profile, profile_file
+
+router = APIRouter()
+
+
+@router.get("/api/profiles")
+async def get_profiles():
+    """Список сохранённых профилей (новые первыми)."""
+    return {"enabled": PROFILING_ENABLED, "dir": PROFILE_DIR, "profiles": list_profiles()}
+
+
+@router.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Сводка профиля: топ функций по cumtime/tottime или по сэмплам."""
+    summary = load_profile(profile_id)
+    if summary is None:
+        return JSONResponse(status_code=404, content={"error": "Профиль не найден"})
+    return summary
+
+
+@router.get("/api/profiles/{profile_id}/{kind}")
+async def download_profile(profile_id: str, kind: str):
+    """Файл профиля: prof (pstats, snakeviz) или folded (flamegraph.pl, speedscope)."""
+    path = profile_file(profile_id, kind)
+    if path is None:
+        return JSONResponse(status_code=404, content={"error": "Профиль не найден"})
+    return FileResponse(path, filename=f"titan_{profile_id}.{kind}", media_type="application/octet-stream")
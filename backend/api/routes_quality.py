@@ -3,19 +3,16 @@
 api/routes_quality.py — GET /api/tab/quality
 """
 
-import json
 import pandas as pd
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import JSONResponse
 
 from state.session import get_session
-from utils.filters import apply_hierarchy_filters, apply_extra_filters
-from core.aggregates import compute_aggregates
-from core.risk_scoring_v2 import apply_risk_scoring_v2
-from config.constants import METHODS_RISK, FIELD_MAPPING, RENAMED_TO_ORIGINAL, EMPTY_VALUES
+from core.pipeline import filter_df, parse_filters, merge_thresholds, filter_state
+from utils.cancellation import begin, checkpoint, run_cancellable
+from config.constants import FIELD_MAPPING, RENAMED_TO_ORIGINAL, EMPTY_VALUES
 
 router = APIRouter()
-DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
 
 
 def _is_empty(val) -> bool:
@@ -46,32 +43,8 @@ def _find_columns_to_check(df_columns):
     return result
 
 
-@router.get("/api/tab/quality")
-async def get_quality(
-    session_id: str = Query(...),
-    filters: str = Query("{}"),
-    thresholds: str = Query("{}")
-):
-    """Данные для вкладки C4 Качество."""
-    session = get_session(session_id)
-    if not session:
-        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
-
-    df = session['df']
-    try:
-        f = json.loads(filters)
-    except Exception:
-        f = {}
-    try:
-        thresh = {**DEFAULT_THRESHOLDS, **json.loads(thresholds)}
-    except Exception:
-        thresh = DEFAULT_THRESHOLDS
-
-    hierarchy = f.get('hierarchy', {})
-    extra = {k: v for k, v in f.items() if k != 'hierarchy'}
-    df_f = apply_hierarchy_filters(df, hierarchy)
-    df_f = apply_extra_filters(df_f, extra)
-
+def build_quality(df_f):
+    """Данные для вкладки C4 Качество — по уже отфильтрованной выборке."""
     columns_map = _find_columns_to_check(df_f.columns.tolist())
     total_rows = len(df_f)
 
@@ -108,3 +81,26 @@ async def get_quality(
             "fill_rate": round(fill_rate, 1),
         }
     }
+
+
+@router.get("/api/tab/quality")
+async def get_quality(
+    request: Request,
+    session_id: str = Query(...),
+    filters: str = Query("{}"),
+    thresholds: str = Query("{}")
+):
+    """Данные для вкладки C4 Качество."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    # Пороги вкладке не нужны, но входят в состояние фильтров сессии
+    f, thresh = parse_filters(filters), merge_thresholds(thresholds)
+
+    def _build():
+        df_f = filter_df(session['df'], f)
+        checkpoint()
+        return build_quality(df_f)
+
+    return await run_cancellable(begin(session_id, filter_state(f, thresh)), request, _build)
@@ -1,60 +1,40 @@
 # -*- coding: utf-8 -*-
 """
-api/routes_risks.py — GET /api/tab/risks
+api/routes_risks.py — GET /api/tab/risks, POST /api/risks/sweep
 """
 
-import json
 import pandas as pd
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from state.session import get_session
-from utils.filters import apply_hierarchy_filters, apply_extra_filters
-from core.aggregates import compute_aggregates
-from core.risk_scoring_v2 import apply_risk_scoring_v2, _is_empty_eo, is_empty_eo_mask
+from core.pipeline import filter_and_score, parse_filters, merge_thresholds, filter_state
+from utils.cancellation import begin, checkpoint, run_cancellable
+from core.risk_scoring_v2 import eo_valid_mask, row_eo_code, row_eo_name
+from core.risk_sweep import session_metrics, sweep, SWEEP_MAX_POINTS
+from utils.profiling import profiled
 from config.constants import METHODS_RISK
 
 router = APIRouter()
-DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
 
 def _sf(v):
     return 0.0 if pd.isna(v) else float(v)
 
 
-@router.get("/api/tab/risks")
-async def get_risks(
-    session_id: str = Query(...),
-    filters: str = Query("{}"),
-    thresholds: str = Query("{}"),
-    page: int = Query(1, ge=1),
-    page_size: int = Query(50, ge=10, le=200),
-):
-    """Данные для вкладки Приоритеты аудита."""
-    session = get_session(session_id)
-    if not session:
-        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
-
-    df = session['df']
-    try:
-        f = json.loads(filters)
-    except Exception:
-        f = {}
-    try:
-        thresh = {**DEFAULT_THRESHOLDS, **json.loads(thresholds)}
-    except Exception:
-        thresh = DEFAULT_THRESHOLDS
-
-    hierarchy = f.get('hierarchy', {})
-    extra = {k: v for k, v in f.items() if k != 'hierarchy'}
-    df_f = apply_hierarchy_filters(df, hierarchy)
-    df_f = apply_extra_filters(df_f, extra)
-    agg = compute_aggregates(df_f)
-    df_f, scoring_info = apply_risk_scoring_v2(df_f, agg, thresh)
+def build_risks(df_f, scoring_info, thresh, page=1, page_size=50):
+    """Данные для вкладки Приоритеты аудита — по уже отфильтрованной выборке."""
     orders_without_eo = scoring_info.get('orders_without_eo', 0)
+    skipped = scoring_info.get('skipped_methods', {})
 
     total = len(df_f)
     risk_orders = df_f[df_f['Priority_Score'] > 0]
 
+    # Валидность ЕО — предвычислена при загрузке
+    eo_col = 'EQUNR_Код' if 'EQUNR_Код' in df_f.columns else 'ЕО'
+    has_eo = eo_valid_mask(df_f)
+
     # Методы
     methods = []
     for method_name, method_info in METHODS_RISK.items():
@@ -62,9 +42,8 @@ async def get_risks(
         score_col = f"Score_{method_name}"
         # Для C2-M2 исключаем заказы без ЕО
         if 'C2-M2' in method_name and flag in df_f.columns:
-            eo_c = 'EQUNR_Код' if 'EQUNR_Код' in df_f.columns else 'ЕО'
-            if eo_c in df_f.columns:
-                valid = ~is_empty_eo_mask(df_f[eo_c])
+            if eo_col in df_f.columns:
+                valid = has_eo
                 triggered_count = int((df_f[flag] & valid).sum())
                 triggered_sum = _sf(df_f[(df_f[flag] == True) & valid]['Fact_N'].sum())
             else:
@@ -93,6 +72,9 @@ async def get_risks(
         # Добавляем orders_without_eo для C2-M2
         if 'C2-M2' in method_name:
             method_data['orders_without_eo'] = orders_without_eo
+        # Метод не считался — в выборке нет его колонок
+        if method_name in skipped:
+            method_data['missing_fields'] = skipped[method_name]
         methods.append(method_data)
 
     # Radar данные
@@ -106,11 +88,9 @@ async def get_risks(
         })
 
     # Фильтрация C2-M2: исключаем заказы с пустым ЕО где сработал C2-M2
-    eo_col = 'EQUNR_Код' if 'EQUNR_Код' in df_f.columns else 'ЕО'
     c2m2_flag = 'S_C2-M2: Проблемное оборудование'
     if c2m2_flag in df_f.columns and eo_col in df_f.columns:
-        empty_eo = is_empty_eo_mask(df_f[eo_col])
-        df_f = df_f[~(df_f[c2m2_flag] & empty_eo)]
+        df_f = df_f[~(df_f[c2m2_flag] & ~has_eo)]
 
     top_priority = []
     total_risk_orders = len(df_f)
@@ -129,13 +109,9 @@ async def get_risks(
                 if flag in r and r[flag]:
                     triggered.append(mn.split(':')[0])
 
-            # Код и наименование оборудования — полная проверка через _is_empty_eo
-            eo_code = str(r.get('EQUNR_Код', '')) if 'EQUNR_Код' in r.index else ''
-            if _is_empty_eo(eo_code):
-                eo_code = ''
-            eo_name = str(r.get('ЕО', '')) if 'ЕО' in r.index else ''
-            if _is_empty_eo(eo_name):
-                eo_name = ''
+            # Код и наименование оборудования — по предвычисленной валидности
+            eo_code = row_eo_code(r)
+            eo_name = row_eo_name(r)
 
             top_priority.append({
                 "id": str(r.get('ID', '')),
@@ -182,3 +158,63 @@ async def get_risks(
             "avg_score": round(float(df_f['Priority_Score'].mean()), 2) if total > 0 else 0,
         }
     }
+
+
+@router.get("/api/tab/risks")
+async def get_risks(
+    request: Request,
+    session_id: str = Query(...),
+    filters: str = Query("{}"),
+    thresholds: str = Query("{}"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=10, le=200),
+):
+    """Данные для вкладки Приоритеты аудита."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    f, thresh = parse_filters(filters), merge_thresholds(thresholds)
+
+    def _build():
+        data = filter_and_score(session['df'], f, thresh, session['agg'])
+        checkpoint()
+        return build_risks(data['scored'], data['scoring_info'], thresh, page, page_size)
+
+    return await run_cancellable(begin(session_id, filter_state(f, thresh)), request, _build)
+
+
+# ── Чувствительность к порогам ──
+
+class SweepRequest(BaseModel):
+    session_id: str
+    filters: dict = {}
+    thresholds: dict = {}
+    # {метод: [пороги]} — один метод (кривая) или два (2-D сетка)
+    grid: dict[str, list[float]]
+
+
+@router.post("/api/risks/sweep")
+async def sweep_thresholds(req: SweepRequest):
+    """Помеченные заказы, Σ факта и категории риска для каждой точки сетки порогов."""
+    session = get_session(req.session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    unknown = [m for m in req.grid if m not in METHODS_RISK]
+    if unknown:
+        return JSONResponse(status_code=400, content={"error": f"Неизвестные методы: {', '.join(unknown)}"})
+    if not 1 <= len(req.grid) <= 2 or not all(req.grid.values()):
+        return JSONResponse(status_code=400, content={"error": "Сетка — непустые пороги для одного или двух методов"})
+    n_points = 1
+    for values in req.grid.values():
+        n_points *= len(values)
+    if n_points > SWEEP_MAX_POINTS:
+        return JSONResponse(status_code=400, content={"error": f"Слишком много точек сетки: {n_points} > {SWEEP_MAX_POINTS}"})
+
+    thresh = merge_thresholds(req.thresholds)
+
+    def _run():
+        return sweep(session_metrics(session, req.filters), thresh, req.grid)
+
+    return await run_in_threadpool(profiled(_run))
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+api/routes_session.py — Дозагрузка и статистика сессий
+
+POST /api/session/{id}/append — дозагрузка выгрузки
+POST /api/session/{id}/score  — скоринг внешнего пакета заказов по базе сессии
+GET  /api/session/{id}/stats  — память по колонкам, размеры кэшей, этапы загрузки
+GET  /api/sessions/stats      — сводка по всем сессиям хранилища
+"""
+
+import json
+import time
+from fastapi import APIRouter, UploadFile, File, Request, Query
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+from config.constants import METHODS_RISK
+from core.data_loader import load_file, load_batch, batch_format, BATCH_MEDIA_TYPES, pa
+from core.data_processor import process_data, upsert_orders, prepare_batch
+from core.pipeline import score_batch, merge_thresholds
+from core.aggregates import update_aggregates
+from core.hierarchy_tree import update_hierarchy_index
+from core.baseline_store import ingest
+from utils.export import public_columns
+from utils.profiling import profiled
+from core.schema import column_stats
+from state.session import get_session, peek_session, update_session_data, session_stats, store_stats
+
+router = APIRouter()
+
+# Колонки ответа внешнего скоринга (после ID и баллов методов)
+SCORE_COLUMNS = ['Methods_Total', 'Methods_Count', 'DQ_Risk', 'Priority_Score', 'Risk_Category']
+
+
+@router.post("/api/session/{session_id}/append")
+async def append_file(session_id: str, file: UploadFile = File(...)):
+    """Дозагрузка новой выгрузки SAP в существующую сессию (upsert заказов по ID)."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    contents = await file.read()
+
+    def _append():
+        df_new = process_data(load_file(contents, file.filename))
+
+        df_old = session['df']
+        df_all, kept_mask, df_removed, df_added = upsert_orders(df_old, df_new)
+        agg = update_aggregates(session['agg'], df_removed, df_added, df_all)
+
+        derived = {}
+        if 'hierarchy' in session:
+            index = update_hierarchy_index(session['hierarchy']['index'], kept_mask, df_removed, df_added)
+            derived['hierarchy'] = {'index': index, 'trees': {}}
+
+        update_session_data(session, df_all, agg, **derived)
+        return df_all, df_removed, df_added, ingest(df_new)
+
+    start = time.time()
+    try:
+        # Разбор, upsert, агрегаты и историческая база — в пуле потоков, не в цикле событий
+        df_all, df_removed, df_added, baseline = await run_in_threadpool(profiled(_append))
+        session.setdefault('timings', {})['append'] = round(time.time() - start, 3)
+
+        return {
+            "session_id": session_id,
+            "rows": len(df_all),
+            "added": len(df_added) - len(df_removed),
+            "updated": len(df_removed),
+            "columns": len(public_columns(df_all)),
+            "version": session['version'],
+            "processing_time": round(time.time() - start, 2),
+            "format": df_all.attrs.get('export_format', 'UNKNOWN'),
+            "baseline": baseline,
+        }
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+
+def _render_batch(df, fmt):
+    """Результат скоринга в формате запроса."""
+    if fmt == 'jsonl':
+        return df.to_json(orient='records', lines=True, force_ascii=False, date_format='iso').encode('utf-8')
+    if fmt == 'csv':
+        return df.to_csv(sep=';', index=False).encode('utf-8')
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+@router.post("/api/session/{session_id}/score")
+async def score_orders(session_id: str, request: Request, thresholds: str = Query("{}"),
+                       baseline: str = Query("session")):
+    """Скоринг пакета внешних заказов по базе сессии (сессия не меняется).
+
+    Тело — заказы в схеме обработанных данных: JSON Lines, CSV (;) или Arrow
+    IPC, формат — по Content-Type; ответ — в том же формате: ID, Score_<метод>,
+    Methods_Total, Methods_Count, DQ_Risk, Priority_Score, Risk_Category.
+    Медианы ТМ, счётчики ЕО и помесячная история ЕО — агрегаты сессии.
+    baseline=history — медианы ТМ и счётчики ЕО из исторической базы загрузок.
+    Методы без входных колонок — в заголовке X-Titan-Skipped-Methods.
+    """
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+    fmt = batch_format(request.headers.get('content-type'))
+    if fmt is None or (fmt == 'arrow' and pa is None):
+        return JSONResponse(status_code=415, content={
+            "error": "Поддерживаемые форматы: " + ", ".join(BATCH_MEDIA_TYPES.values())})
+    contents = await request.body()
+    thresh = merge_thresholds(thresholds)
+
+    def _score():
+        df = prepare_batch(load_batch(contents, fmt))
+        scored, info = score_batch(df, thresh, session['df'], session['agg'], {'baseline': baseline})
+        columns = [f"Score_{m}" for m in METHODS_RISK] + SCORE_COLUMNS
+        if 'ID' in scored.columns:
+            columns.insert(0, 'ID')
+        return _render_batch(scored[columns], fmt), info, len(scored)
+
+    start = time.time()
+    try:
+        body, info, rows = await run_in_threadpool(profiled(_score))
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return Response(body, media_type=BATCH_MEDIA_TYPES[fmt], headers={
+        "X-Titan-Rows": str(rows),
+        "X-Titan-Skipped-Methods": json.dumps(sorted(info['skipped_methods'])),
+        "X-Titan-Scoring-Time": f"{time.time() - start:.3f}",
+    })
+
+
+@router.get("/api/session/{session_id}/stats")
+async def get_session_stats(session_id: str):
+    """Статистика сессии: память и кардинальность по колонкам, размеры agg и кэшей, обращения.
+
+    Выгруженная на диск сессия не поднимается — колонки для неё не считаются.
+    """
+    session = peek_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    stats = session_stats(session)
+    df = session.get('df')
+    stats['column_stats'] = column_stats(df) if df is not None else None
+    return stats
+
+
+@router.get("/api/sessions/stats")
+async def get_sessions_stats():
+    """Сводка по всем сессиям: бюджет памяти, занято, размеры и обращения по сессиям."""
+    return store_stats()
@@ -10,7 +10,11 @@ from fastapi.responses import JSONResponse
 from core.data_loader import load_file
 from core.data_processor import process_data
 from core.aggregates import compute_aggregates
-from state.session import create_session
+from core.hierarchy_tree import get_hierarchy_tree
+from core.baseline_store import ingest
+from utils.export import public_columns
+from state.session import create_session, peek_session
+from config.constants import DEFAULT_THRESHOLDS
 
 router = APIRouter()
 
@@ -19,28 +23,46 @@ router = APIRouter()
 async def upload_file(file: UploadFile = File(...)):
     """Загрузка файла SAP (.xlsx, .csv)."""
     start = time.time()
+    timings = {}
+
+    def _stage(name, t0):
+        timings[name] = round(time.time() - t0, 3)
+        return time.time()
 
     try:
+        t = time.time()
         contents = await file.read()
+        t = _stage('read', t)
         df_raw = load_file(contents, file.filename)
+        t = _stage('load_file', t)
+        # Типы колонок (category / Arrow-строки) задаются схемой внутри process_data
         df = process_data(df_raw)
-
-        # Оптимизация памяти: object → category
-        for col in df.select_dtypes(include=['object']).columns:
-            if df[col].nunique() / len(df) < 0.5:
-                df[col] = df[col].astype('category')
+        t = _stage('process_data', t)
 
         agg = compute_aggregates(df)
-        session_id = create_session(df, agg)
+        t = _stage('compute_aggregates', t)
+        session_id = create_session(df, agg, timings)
+        session = peek_session(session_id)
+
+        # Дерево свёрток иерархии (пороги по умолчанию)
+        get_hierarchy_tree(session, DEFAULT_THRESHOLDS)
+        t = _stage('hierarchy_tree', t)
+
+        # Историческая база C1-M6 / C2-M2 (новые по ID заказы)
+        baseline = ingest(df)
+        _stage('baseline', t)
 
         elapsed = round(time.time() - start, 2)
+        timings['total'] = elapsed
+        session['timings'] = timings
 
         return {
             "session_id": session_id,
             "rows": len(df),
-            "columns": len(df.columns),
+            "columns": len(public_columns(df)),
             "processing_time": elapsed,
-            "format": df.attrs.get('export_format', 'UNKNOWN')
+            "format": df.attrs.get('export_format', 'UNKNOWN'),
+            "baseline": baseline,
         }
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": str(e)})
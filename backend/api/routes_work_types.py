@@ -3,61 +3,31 @@
 api/routes_work_types.py — GET /api/tab/work-types
 """
 
-import json
 import pandas as pd
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import JSONResponse
 
 from state.session import get_session
-from utils.filters import apply_hierarchy_filters, apply_extra_filters
-from core.aggregates import compute_aggregates
-from core.risk_scoring_v2 import apply_risk_scoring_v2
-from config.constants import METHODS_RISK, ВНЕПЛАНОВЫЕ_ВИДЫ
+from core.pipeline import filter_and_score, parse_filters, merge_thresholds, filter_state
+from utils.cancellation import begin, checkpoint, run_cancellable
+from core.grouping import grouped_frame, COST_MEASURES
+from config.constants import ВНЕПЛАНОВЫЕ_ВИДЫ
 
 router = APIRouter()
-DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
 MONTH_SHORT = {1:'Янв',2:'Фев',3:'Мар',4:'Апр',5:'Май',6:'Июн',7:'Июл',8:'Авг',9:'Сен',10:'Окт',11:'Ноя',12:'Дек'}
 
 def _sf(v):
     return 0.0 if pd.isna(v) else float(v)
 
 
-@router.get("/api/tab/work-types")
-async def get_work_types(
-    session_id: str = Query(...),
-    filters: str = Query("{}"),
-    thresholds: str = Query("{}")
-):
-    """Данные для вкладки Виды работ."""
-    session = get_session(session_id)
-    if not session:
-        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
-
-    df = session['df']
-    try:
-        f = json.loads(filters)
-    except Exception:
-        f = {}
-    try:
-        thresh = {**DEFAULT_THRESHOLDS, **json.loads(thresholds)}
-    except Exception:
-        thresh = DEFAULT_THRESHOLDS
-
-    hierarchy = f.get('hierarchy', {})
-    extra = {k: v for k, v in f.items() if k != 'hierarchy'}
-    df_f = apply_hierarchy_filters(df, hierarchy)
-    df_f = apply_extra_filters(df_f, extra)
-    agg = compute_aggregates(df_f)
-    df_f, _ = apply_risk_scoring_v2(df_f, agg, thresh)
-
+def build_work_types(df_f):
+    """Данные для вкладки Виды работ — по уже отфильтрованной выборке."""
     # Статистика по видам
-    vid_stats = df_f.groupby('Вид').agg(
-        count=('ID', 'count'), fact=('Fact_N', 'sum'), plan=('Plan_N', 'sum')
-    ).reset_index()
+    vid_stats = grouped_frame(df_f, 'Вид', COST_MEASURES)
     vid_stats['dev'] = vid_stats['fact'] - vid_stats['plan']
 
     if 'Вид_Код' in df_f.columns:
-        vid_codes = df_f.groupby('Вид')['Вид_Код'].first().to_dict()
+        vid_codes = df_f.groupby('Вид', observed=True)['Вид_Код'].first().to_dict()
         vid_stats['is_unplanned'] = vid_stats['Вид'].map(vid_codes).isin(ВНЕПЛАНОВЫЕ_ВИДЫ)
     else:
         vid_stats['is_unplanned'] = False
@@ -117,3 +87,25 @@ async def get_work_types(
             "total_dev": _sf(vid_stats['dev'].sum()),
         }
     }
+
+
+@router.get("/api/tab/work-types")
+async def get_work_types(
+    request: Request,
+    session_id: str = Query(...),
+    filters: str = Query("{}"),
+    thresholds: str = Query("{}")
+):
+    """Данные для вкладки Виды работ."""
+    session = get_session(session_id)
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "Сессия не найдена"})
+
+    f, thresh = parse_filters(filters), merge_thresholds(thresholds)
+
+    def _build():
+        data = filter_and_score(session['df'], f, thresh, session['agg'])
+        checkpoint()
+        return build_work_types(data['scored'])
+
+    return await run_cancellable(begin(session_id, filter_state(f, thresh)), request, _build)
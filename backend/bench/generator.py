@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+bench/generator.py — Синтетические выгрузки SAP для бенчмарков
+
+Два формата, которые понимает process_data:
+- LEGACY — одна строка на заказ, русские заголовки (Заказ, Общие затраты/факт, …),
+  числа в виде '1 234,56', даты дд.мм.гггг;
+- NEW_STATUS_HISTORY — строка на каждую смену статуса (AUFNR, ISTAT, PMCOALLF, …),
+  даты ISO, возвраты статусов.
+Распределения скошены как в реальных данных: немногие ТМ и ЕО дают
+большую часть заказов (Zipf), часть ЕО пустые. К выгрузкам прилагается
+согласованный tm_structure.json (ТМ → производство/цех/установка, ЕО → ТМ).
+
+python -m bench.generator --rows 10k,100k,1M --out bench/data
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+# Размер справочников: производства × цеха × установки × ТМ на установке
+N_PRODUCTIONS = 4
+N_WORKSHOPS = 6
+N_UNITS = 8
+N_TM_PER_UNIT = 12
+# ЕО на одно ТМ в среднем
+EO_PER_TM = 3
+# Доля заказов без ЕО (пустые / 'Н/Д' / '0')
+EMPTY_EO_SHARE = 0.08
+
+ORDER_TYPES = [
+    ('LK01', 'Плановый ремонт'), ('LK02', 'Внеплановый ремонт'), ('LK03', 'Капитальный ремонт'),
+    ('LK04', 'Аварийный ремонт'), ('MN01', 'Техобслуживание'), ('MN02', 'Диагностика'),
+]
+ORDER_TYPE_P = [0.35, 0.25, 0.05, 0.05, 0.2, 0.1]
+
+TEXTS = [
+    'Ремонт насоса', 'Замена подшипника', 'ТО компрессора', 'Диагностика вибрации',
+    'Замена задвижки', 'Ревизия теплообменника', 'Ремонт двигателя', 'Замена уплотнения',
+    'Очистка резервуара', 'Поверка КИП',
+]
+EO_NAMES = ['Насос центробежный', 'Компрессор', 'Теплообменник', 'Задвижка', 'Двигатель', 'Резервуар', 'Вентилятор']
+WORK_TYPES = [('001', 'Текущий ремонт'), ('002', 'Средний ремонт'), ('003', 'Капремонт'), ('004', 'ТО'), ('005', 'Аварийные работы')]
+# Жизненный цикл заказа: ОТКР → ДЕБЛ → ТЗКР → ЗАКР
+STATUSES = [('I0001', 'ОТКР'), ('I0002', 'ДЕБЛ'), ('I0045', 'ТЗКР'), ('I0046', 'ЗАКР')]
+ABC = ['A', 'B', 'C']
+ABC_P = [0.15, 0.35, 0.5]
+COMPANIES = [('1000', 'БЕ Север'), ('2000', 'БЕ Юг')]
+PLANTS = [('1010', 'Завод А'), ('1020', 'Завод Б'), ('2010', 'Завод В')]
+
+START_DATE = pd.Timestamp('2023-01-01')
+DAYS_SPAN = 730
+
+
+def parse_size(text):
+    """'10k' → 10000, '1M' → 1000000."""
+    text = str(text).strip().lower()
+    mult = 1
+    if text.endswith('k'):
+        mult, text = 1_000, text[:-1]
+    elif text.endswith('m'):
+        mult, text = 1_000_000, text[:-1]
+    return int(float(text) * mult)
+
+
+def _zipf_choice(rng, n_items, size, a=1.3):
+    """Индексы 0..n_items-1 со скошенным (Zipf) распределением."""
+    ranks = np.arange(1, n_items + 1)
+    p = 1.0 / ranks ** a
+    p /= p.sum()
+    # Перемешать, чтобы «тяжёлые» элементы не шли подряд по кодам
+    return rng.permutation(n_items)[rng.choice(n_items, size=size, p=p)]
+
+
+def build_structure(seed=0):
+    """Справочник структуры: ТМ с уровнями иерархии и ЕО, привязанные к ТМ.
+
+    Возвращает (tm_structure — как в tm_structure.json, tm_codes, eo_codes, eo_tm).
+    """
+    rng = np.random.default_rng(seed)
+    tm_hierarchy = {}
+    tm_codes = []
+    for p in range(1, N_PRODUCTIONS + 1):
+        prod_code = f"ST{p:02d}"
+        prod_name = f"Производство №{p}"
+        for w in range(1, N_WORKSHOPS + 1):
+            ws_code = f"{prod_code}.{w:02d}"
+            ws_name = f"Цех {p}-{w}"
+            for u in range(1, N_UNITS + 1):
+                unit_code = f"{ws_code}{u:02d}"
+                unit_name = f"Установка {p}-{w}-{u}"
+                levels = {
+                    'производство_код': prod_code, 'производство_название': prod_name,
+                    'цех_код': ws_code, 'цех_название': ws_name,
+                    'установка_код': unit_code, 'установка_название': unit_name,
+                }
+                tm_hierarchy[unit_code] = {**levels, 'название': unit_name}
+                for t in range(1, N_TM_PER_UNIT + 1):
+                    tm_code = f"{unit_code}.{t:03d}"
+                    tm_hierarchy[tm_code] = {**levels, 'название': f"{EO_NAMES[t % len(EO_NAMES)]} поз. {t}"}
+                    tm_codes.append(tm_code)
+
+    n_eo = len(tm_codes) * EO_PER_TM
+    eo_codes = np.array([f"{10000000 + i:018d}" for i in range(n_eo)])
+    eo_tm = np.array(tm_codes)[_zipf_choice(rng, len(tm_codes), n_eo, a=0.6)]
+    eo_to_tm = {code.lstrip('0'): tm for code, tm in zip(eo_codes, eo_tm)}
+    structure = {'tm_hierarchy': tm_hierarchy, 'eo_to_tm': eo_to_tm}
+    return structure, np.array(tm_codes), eo_codes, eo_tm
+
+
+def _orders(n, seed, structure):
+    """Общие для обоих форматов атрибуты заказов (по одному значению на заказ)."""
+    rng = np.random.default_rng(seed)
+    tm_structure, tm_codes, eo_codes, eo_tm = structure
+    hierarchy = tm_structure['tm_hierarchy']
+
+    eo_idx = _zipf_choice(rng, len(eo_codes), n)
+    eo = eo_codes[eo_idx]
+    tm = eo_tm[eo_idx]
+    # Часть заказов без ЕО — ТМ тогда выбирается отдельно
+    no_eo = rng.random(n) < EMPTY_EO_SHARE
+    eo = np.where(no_eo, rng.choice(['', 'Н/Д', '0'], n), eo)
+    tm = np.where(no_eo, tm_codes[_zipf_choice(rng, len(tm_codes), n)], tm)
+    eo_name = np.array(EO_NAMES)[np.array([int(c[-2:]) if c.isdigit() and len(c) > 3 else 0 for c in eo]) % len(EO_NAMES)]
+
+    plan = rng.lognormal(11, 1.1, n).round(2)
+    # Факт: в основном около плана, хвост перерасхода
+    fact = (plan * rng.lognormal(0, 0.35, n) * np.where(rng.random(n) < 0.05, 2.5, 1.0)).round(2)
+    fact[rng.random(n) < 0.03] = 0.0
+    plan_t = rng.gamma(2.0, 20.0, n).round(1)
+    fact_t = (plan_t * rng.lognormal(0, 0.3, n)).round(1)
+
+    start = START_DATE + pd.to_timedelta(rng.integers(0, DAYS_SPAN, n), 'D')
+    dur = rng.integers(1, 90, n)
+    fstart = start + pd.to_timedelta(rng.integers(-5, 15, n), 'D')
+    fdur = np.maximum((dur * rng.uniform(0.1, 1.6, n)).astype(int), 0)
+    # Часть заказов не закрыта фактически
+    open_fact = rng.random(n) < 0.1
+
+    type_idx = rng.choice(len(ORDER_TYPES), n, p=ORDER_TYPE_P)
+    return {
+        'id': (4_000_000_000 + np.arange(n)).astype(str),
+        'text': np.array(TEXTS)[rng.integers(0, len(TEXTS), n)],
+        'type_code': np.array([t[0] for t in ORDER_TYPES])[type_idx],
+        'type_name': np.array([t[1] for t in ORDER_TYPES])[type_idx],
+        'plan': plan, 'fact': fact, 'plan_t': plan_t, 'fact_t': fact_t,
+        'tm': tm,
+        'tm_name': np.array([hierarchy[t]['название'] for t in tm]),
+        'unit': np.array([t[:9] for t in tm]),
+        'eo': eo, 'eo_name': eo_name,
+        'start': start, 'end': start + pd.to_timedelta(dur, 'D'),
+        'fstart': pd.Series(fstart).where(~open_fact),
+        'fend': pd.Series(fstart + pd.to_timedelta(fdur, 'D')).where(~open_fact),
+        'status': np.where(open_fact, rng.choice([1, 2], n), rng.choice([2, 3], n, p=[0.3, 0.7])),
+        'abc': rng.choice(ABC + [''], n, p=[p * 0.95 for p in ABC_P] + [0.05]),
+        'rm': rng.choice([f'РМ{i:03d}' for i in range(60)], n),
+        'ingrp': np.array([f'G{i:02d}' for i in range(25)])[_zipf_choice(rng, 25, n, a=0.9)],
+        'user': np.array([f'USER{i:03d}' for i in range(120)])[_zipf_choice(rng, 120, n, a=0.9)],
+        'company': rng.integers(0, len(COMPANIES), n),
+        'plant': rng.integers(0, len(PLANTS), n),
+        'work_type': rng.integers(0, len(WORK_TYPES), n),
+        'rng': rng,
+    }
+
+
+def _ru_number(values):
+    """1234.5 → '1 234,50' (как в выгрузке SAP)."""
+    return pd.Series(values).map('{:,.2f}'.format).str.replace(',', ' ', regex=False).str.replace('.', ',', regex=False)
+
+
+def _format_dates(values, fmt):
+    """strftime по уникальным датам (их сотни на миллион строк); NaT → ''."""
+    codes, uniques = pd.factorize(pd.Series(values))
+    labels = np.append(pd.DatetimeIndex(uniques).strftime(fmt).to_numpy(dtype=object), '')
+    return labels[codes]
+
+
+def _ru_date(values):
+    return _format_dates(values, '%d.%m.%Y')
+
+
+def generate_legacy(n, seed=0, structure=None):
+    """Выгрузка LEGACY: одна строка на заказ, заголовки как в SAP-отчёте."""
+    structure = structure or build_structure(seed)
+    o = _orders(n, seed + 1, structure)
+    return pd.DataFrame({
+        'Заказ': o['id'],
+        'Краткий текст': o['text'],
+        'Вид заказа': pd.Series(o['type_code']) + ' ' + o['type_name'],
+        'Общие затраты/план': _ru_number(o['plan']),
+        'Общие затраты/факт': _ru_number(o['fact']),
+        'Техническое место': pd.Series(o['tm']) + ' ' + o['tm_name'],
+        'Базисный срок начала': _ru_date(o['start']),
+        'Базисный срок конца': _ru_date(o['end']),
+        'Фактический срок начала': _ru_date(o['fstart']),
+        'Фактический срок конца заказа': _ru_date(o['fend']),
+        'Системный статус': np.array([s[1] for s in STATUSES])[o['status']],
+        'Индикатор ABC': o['abc'],
+        'Рабочее место': o['rm'],
+        'Группа плановиков': o['ingrp'],
+        'Единица оборудования': (pd.Series(o['eo']) + ' ' + o['eo_name']).where(
+            pd.Series(o['eo']).str.len() > 3, pd.Series(o['eo'])),
+        'Балансовая единица': np.array([c[1] for c in COMPANIES])[o['company']],
+        'Завод': np.array([p[1] for p in PLANTS])[o['plant']],
+        'Ввел': o['user'],
+        'План_трудозатраты': _ru_number(o['plan_t']),
+        'Факт_трудозатраты': _ru_number(o['fact_t']),
+    })
+
+
+def _iso(values):
+    return _format_dates(values, '%Y-%m-%d')
+
+
+def generate_history(n, seed=0, structure=None):
+    """Выгрузка NEW_STATUS_HISTORY: строка на каждую смену статуса заказа.
+
+    n — число заказов; строк в среднем ~3 на заказ. Статусы идут по
+    жизненному циклу до текущего, у части заказов есть возвраты
+    (повтор уже пройденного статуса).
+    """
+    structure = structure or build_structure(seed)
+    o = _orders(n, seed + 2, structure)
+    rng = o['rng']
+
+    # Сколько статусов прошёл заказ + возвраты
+    n_steps = o['status'] + 1
+    n_returns = np.where(rng.random(n) < 0.12, rng.integers(1, 4, n), 0)
+    per_order = n_steps + n_returns
+    order_idx = np.repeat(np.arange(n), per_order)
+    step = np.arange(len(order_idx)) - np.repeat(np.cumsum(per_order) - per_order, per_order)
+    # Возвраты: после прямого хода повторяются уже пройденные статусы
+    forward = step < n_steps[order_idx]
+    status_idx = np.where(forward, step, rng.integers(0, np.maximum(n_steps[order_idx] - 1, 1)))
+    # Последним остаётся текущий статус заказа
+    is_last = step == per_order[order_idx] - 1
+    status_idx = np.where(is_last, o['status'][order_idx], status_idx)
+
+    created = o['start'] - pd.to_timedelta(rng.integers(1, 30, n), 'D')
+    changed = pd.Series(created[order_idx]) + pd.to_timedelta(step * 3 + rng.integers(0, 3, len(order_idx)), 'D')
+
+    def per_row(values):
+        return np.asarray(values)[order_idx]
+
+    tm = per_row(o['tm'])
+    unit = per_row(o['unit'])
+    eo = per_row(o['eo'])
+    type_code = per_row(o['type_code'])
+    work = per_row(o['work_type'])
+    company = per_row(o['company'])
+    plant = per_row(o['plant'])
+    users = np.array([f'USER{i:03d}' for i in range(120)])
+    return pd.DataFrame({
+        'AUFNR': per_row(o['id']),
+        'AUFNR_TXT': per_row(o['text']),
+        'BUKRS': np.array([c[0] for c in COMPANIES])[company],
+        'BUKRS_TXT': np.array([c[1] for c in COMPANIES])[company],
+        'ISTAT': np.array([s[0] for s in STATUSES])[status_idx],
+        'ISTAT_TXT': np.array([s[1] for s in STATUSES])[status_idx],
+        'ERDAT': _iso(pd.Series(created[order_idx])),
+        'AEDAT': _iso(changed),
+        'ERNAM': per_row(o['user']),
+        'AENAM': users[rng.integers(0, len(users), len(order_idx))],
+        'GSTRP': _iso(per_row(o['start'])),
+        'GLTRP': _iso(per_row(o['end'])),
+        'ZZFACTBEG': _iso(o['fstart'].to_numpy()[order_idx]),
+        'ZZFACTEND': _iso(o['fend'].to_numpy()[order_idx]),
+        'AUART': type_code,
+        'AUART_TXT': per_row(o['type_name']),
+        'EQUNR': eo,
+        'EQUNR_TXT': np.where(pd.Series(eo).str.len() > 3, per_row(o['eo_name']), ''),
+        'IWERK': np.array([p[0] for p in PLANTS])[plant],
+        'IWERK_TXT': np.array([p[1] for p in PLANTS])[plant],
+        'GEWRK': per_row(o['rm']),
+        'GEWRK_TXT': pd.Series(per_row(o['rm'])).str.replace('РМ', 'Рабочее место ', regex=False),
+        'ILART': np.array([w[0] for w in WORK_TYPES])[work],
+        'ILART_TXT': np.array([w[1] for w in WORK_TYPES])[work],
+        'TPLNR8': unit,
+        'TPLNR8_TXT': '',
+        'ABCKZ': per_row(o['abc']),
+        'ABCKZ_TXT': pd.Series(per_row(o['abc'])).map({'A': 'Критичное', 'B': 'Важное', 'C': 'Прочее'}).fillna(''),
+        'PMCOALLP': per_row(o['plan']),
+        'PMCOALLF': per_row(o['fact']),
+        'PMCO001P': per_row(o['plan_t']),
+        'PMCO001F': per_row(o['fact_t']),
+        'INGPR': per_row(o['ingrp']),
+        'INGPR_TXT': pd.Series(per_row(o['ingrp'])).str.replace('G', 'Группа ', regex=False),
+        'TPLNR': tm,
+        'TPLNR_TXT': per_row(o['tm_name']),
+    })
+
+
+def write_export(df, path):
+    """CSV (';', utf-8) или xlsx — по расширению файла."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if path.endswith('.xlsx'):
+        df.to_excel(path, index=False, engine='xlsxwriter')
+    else:
+        df.to_csv(path, sep=';', index=False, encoding='utf-8')
+    return path
+
+
+def generate_all(sizes, out_dir, seed=0, fmt='csv'):
+    """Выгрузки обоих форматов для каждого размера + tm_structure.json.
+
+    Возвращает {'tm_structure': путь, 'files': [{'format', 'orders', 'path'}]}.
+    """
+    structure = build_structure(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    tm_path = os.path.join(out_dir, 'tm_structure.json')
+    with open(tm_path, 'w', encoding='utf-8') as f:
+        json.dump(structure[0], f, ensure_ascii=False)
+
+    files = []
+    for n in sizes:
+        for kind, gen in (('legacy', generate_legacy), ('history', generate_history)):
+            path = os.path.join(out_dir, f"{kind}_{n}.{fmt}")
+            write_export(gen(n, seed=seed, structure=structure), path)
+            files.append({'format': kind, 'orders': n, 'path': path})
+    return {'tm_structure': tm_path, 'files': files}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Синтетические выгрузки SAP для бенчмарков')
+    parser.add_argument('--rows', default='10k,100k,1M', help='Число заказов через запятую (10k,100k,1M)')
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'data'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.rows.split(',') if s.strip()]
+    result = generate_all(sizes, args.out, seed=args.seed, fmt=args.format)
+    print(f"tm_structure: {result['tm_structure']}")
+    for item in result['files']:
+        print(f"{item['format']:<8}{item['orders']:>10}  {item['path']}")
+
+
+if __name__ == '__main__':
+    main()
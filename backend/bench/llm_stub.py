@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+bench/llm_stub.py — Локальная заглушка LLM-провайдеров для проверки чата
+
+Повторяет формат обмена Ollama (GET /api/tags, POST /api/chat — JSON или
+NDJSON-поток) и DeepSeek (POST /chat/completions — JSON или SSE-поток).
+Ответ — эхо вопроса пользователя по словам с задержкой на токен. Если
+в запросе есть tools, заглушка сначала вызывает инструмент summary (в потоке —
+как провайдеры: Ollama одним фрагментом, DeepSeek — аргументы кусками), затем
+отвечает его результатом:
+
+python -m bench.llm_stub --port 11434 --delay 0.02
+
+и для backend:
+TITAN_OLLAMA_URL=http://127.0.0.1:11434
+TITAN_DEEPSEEK_URL=http://127.0.0.1:11434/chat/completions DEEPSEEK_API_KEY=stub
+"""
+
+import json
+import time
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+TOKEN_DELAY = 0.02
+
+app = FastAPI(title="LLM stub")
+
+
+def _tokens(messages):
+    question = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+    words = f"Заглушка LLM. Вопрос: {question}".split(' ')
+    return [w + ' ' for w in words[:-1]] + words[-1:]
+
+
+def _tool_step(body):
+    """Вызов инструмента (имя, аргументы) или None, если пора отвечать."""
+    messages = body.get('messages', [])
+    if not body.get('tools') or (messages and messages[-1].get('role') == 'tool'):
+        return None
+    return 'summary', {}
+
+
+def _tool_answer(messages):
+    """Ответ по результату инструмента — токенами по словам, или None."""
+    last = messages[-1] if messages else {}
+    if last.get('role') != 'tool':
+        return None
+    words = f"Заглушка LLM. Результат инструмента: {last.get('content', '')}".split(' ')
+    return [w + ' ' for w in words[:-1]] + words[-1:]
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": "qwen3:4b"}]}
+
+
+@app.post("/api/chat")
+async def ollama_chat(request: Request):
+    body = await request.json()
+    tokens = _tokens(body.get('messages', []))
+    model = body.get('model', 'stub')
+    step = _tool_step(body)
+    if step:
+        call = {"function": {"name": step[0], "arguments": step[1]}}
+        message = {"model": model, "message": {"role": "assistant", "content": "", "tool_calls": [call]}, "done": True}
+        if not body.get('stream', True):
+            return message
+        return StreamingResponse(iter([json.dumps(message, ensure_ascii=False) + '\n']),
+                                 media_type='application/x-ndjson')
+    tokens = _tool_answer(body.get('messages', [])) or tokens
+    if not body.get('stream', True):
+        return {"model": model, "message": {"role": "assistant", "content": ''.join(tokens)}, "done": True}
+
+    async def lines():
+        for t in tokens:
+            await asyncio.sleep(TOKEN_DELAY)
+            yield json.dumps({"model": model, "message": {"role": "assistant", "content": t}, "done": False},
+                             ensure_ascii=False) + '\n'
+        yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True}) + '\n'
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+
+@app.post("/chat/completions")
+async def deepseek_chat(request: Request):
+    body = await request.json()
+    tokens = _tokens(body.get('messages', []))
+    model = body.get('model', 'stub')
+    created = int(time.time())
+    step = _tool_step(body)
+    if step and body.get('stream'):
+        arguments = json.dumps(step[1])
+        deltas = [{"role": "assistant", "content": None,
+                   "tool_calls": [{"index": 0, "id": "call_stub", "type": "function",
+                                   "function": {"name": step[0], "arguments": ""}}]}]
+        deltas += [{"tool_calls": [{"index": 0, "function": {"arguments": arguments[i:i + 2]}}]}
+                   for i in range(0, len(arguments), 2)]
+
+        async def call_events():
+            for delta in deltas:
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(call_events(), media_type='text/event-stream')
+    if step:
+        call = {"id": "call_stub", "type": "function",
+                "function": {"name": step[0], "arguments": json.dumps(step[1])}}
+        return {
+            "id": "stub", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": None, "tool_calls": [call]},
+                         "finish_reason": "tool_calls"}],
+        }
+    tokens = _tool_answer(body.get('messages', [])) or tokens
+    if not body.get('stream'):
+        return {
+            "id": "stub", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": ''.join(tokens)},
+                         "finish_reason": "stop"}],
+        }
+
+    async def events():
+        for t in tokens:
+            await asyncio.sleep(TOKEN_DELAY)
+            chunk = {"id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": t}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(events(), media_type='text/event-stream')
+
+
+def main(argv=None):
+    global TOKEN_DELAY
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Заглушка Ollama/DeepSeek для проверки чата')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--delay', type=float, default=TOKEN_DELAY, help='Задержка на токен, сек')
+    args = parser.parse_args(argv)
+    TOKEN_DELAY = args.delay
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+bench/run_bench.py — Бенчмарк загрузки и вкладок на синтетических выгрузках
+
+Для каждой выгрузки (bench.generator) замеряются load_file, process_data,
+compute_aggregates, apply_risk_scoring_v2, затем через TestClient —
+POST /api/upload и все GET /api/tab/* (+ /api/kpi). Результат — JSON
+с окружением и коммитом, чтобы сравнивать версии:
+
+python -m bench.run_bench --rows 10k,100k --repeats 3
+python -m bench.run_bench --compare bench/results/old.json bench/results/new.json
+
+--scoring-workers 1,2,4 добавляет замеры apply_risk_scoring_v2 с заданным
+числом потоков на методы (этапы apply_risk_scoring_v2[workers=N]) —
+масштабирование скоринга по ядрам, например на 1M заказов:
+python -m bench.run_bench --rows 1M --format legacy --no-api --scoring-workers 1,2,4
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+CORE_STAGES = ['load_file', 'process_data', 'compute_aggregates', 'apply_risk_scoring_v2']
+
+
+def _timed_runs(func, repeats):
+    """Вызвать func repeats раз; вернуть (сводка времён, результат последнего вызова)."""
+    runs = []
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - t0)
+    return _summary(runs), result
+
+
+def _summary(runs):
+    return {
+        'min': round(min(runs), 4),
+        'median': round(statistics.median(runs), 4),
+        'runs': [round(r, 4) for r in runs],
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _environment(repeats):
+    import numpy as np
+    import pandas as pd
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'scoring_workers': os.environ.get('TITAN_SCORING_WORKERS'),
+        'repeats': repeats,
+    }
+
+
+def bench_core(path, repeats, scoring_workers=()):
+    """Этапы загрузки и скоринга напрямую, без HTTP."""
+    from core.data_loader import load_file
+    from core.data_processor import process_data
+    from core.aggregates import compute_aggregates
+    from core.risk_scoring_v2 import apply_risk_scoring_v2
+    from config.constants import DEFAULT_THRESHOLDS
+
+    with open(path, 'rb') as f:
+        contents = f.read()
+    name = os.path.basename(path)
+
+    stages = {}
+    stages['load_file'], df_raw = _timed_runs(lambda: load_file(contents, name), repeats)
+    stages['process_data'], df = _timed_runs(lambda: process_data(df_raw), repeats)
+    stages['compute_aggregates'], agg = _timed_runs(lambda: compute_aggregates(df), repeats)
+    stages['apply_risk_scoring_v2'], _ = _timed_runs(
+        lambda: apply_risk_scoring_v2(df, agg, DEFAULT_THRESHOLDS), repeats)
+    for workers in scoring_workers:
+        stages[f'apply_risk_scoring_v2[workers={workers}]'], _ = _timed_runs(
+            lambda: apply_risk_scoring_v2(df, agg, DEFAULT_THRESHOLDS, workers=workers), repeats)
+    info = {
+        'bytes_file': len(contents),
+        'rows_raw': len(df_raw),
+        'rows': len(df),
+        'bytes_df': int(df.memory_usage(index=True, deep=True).sum()),
+        'export_format': df.attrs.get('export_format'),
+    }
+    return stages, info
+
+
+def tab_paths(app):
+    """Все GET /api/tab/* приложения и /api/kpi."""
+    # По схеме OpenAPI: подключённые роутеры не всегда видны в app.routes напрямую
+    paths = sorted(p for p, ops in app.openapi()['paths'].items()
+                   if p.startswith('/api/tab/') and 'get' in ops)
+    return ['/api/kpi'] + paths
+
+
+def bench_api(path, repeats):
+    """Загрузка и вкладки через FastAPI TestClient (с сериализацией JSON)."""
+    from fastapi.testclient import TestClient
+    from main import app
+
+    client = TestClient(app)
+    with open(path, 'rb') as f:
+        contents = f.read()
+    name = os.path.basename(path)
+
+    endpoints = {}
+    upload_runs = []
+    session_id = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        resp = client.post('/api/upload', files={'file': (name, contents)})
+        upload_runs.append(time.perf_counter() - t0)
+        resp.raise_for_status()
+        session_id = resp.json()['session_id']
+    endpoints['POST /api/upload'] = _summary(upload_runs)
+
+    for tab in tab_paths(app):
+        runs = []
+        size = 0
+        status = None
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            resp = client.get(tab, params={'session_id': session_id})
+            runs.append(time.perf_counter() - t0)
+            status = resp.status_code
+            size = len(resp.content)
+        endpoints[f'GET {tab}'] = {**_summary(runs), 'status': status, 'bytes': size}
+    return endpoints
+
+
+def ensure_data(sizes, data_dir, seed=0):
+    """Сгенерировать недостающие выгрузки; вернуть список {'format', 'orders', 'path'}."""
+    from bench.generator import generate_all
+
+    files = []
+    missing = []
+    for n in sizes:
+        for kind in ('legacy', 'history'):
+            path = os.path.join(data_dir, f"{kind}_{n}.csv")
+            files.append({'format': kind, 'orders': n, 'path': path})
+            if not os.path.exists(path):
+                missing.append(n)
+    if missing or not os.path.exists(os.path.join(data_dir, 'tm_structure.json')):
+        generate_all(sorted(set(missing)), data_dir, seed=seed)
+    return files
+
+
+def run(sizes, data_dir=DATA_DIR, repeats=3, kinds=('legacy', 'history'), api=True, scoring_workers=()):
+    files = [f for f in ensure_data(sizes, data_dir) if f['format'] in kinds]
+    results = []
+    for item in files:
+        print(f"{item['format']:<8}{item['orders']:>10}  ...", flush=True)
+        stages, info = bench_core(item['path'], repeats, scoring_workers)
+        entry = {**item, **info, 'stages': stages}
+        if api:
+            entry['endpoints'] = bench_api(item['path'], repeats)
+        results.append(entry)
+        for name, s in list(stages.items()) + list(entry.get('endpoints', {}).items()):
+            print(f"    {name:<32}{s['median']:>10.3f} с")
+    return {'environment': _environment(repeats), 'results': results}
+
+
+def _flatten(report):
+    flat = {}
+    for entry in report['results']:
+        for group in ('stages', 'endpoints'):
+            for name, s in entry.get(group, {}).items():
+                flat[(entry['format'], entry['orders'], name)] = s['median']
+    return flat
+
+
+def compare(old_path, new_path):
+    """Таблица медиан двух прогонов: было / стало / отношение."""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    a, b = _flatten(old), _flatten(new)
+    print(f"было: {old['environment'].get('commit')}  стало: {new['environment'].get('commit')}")
+    print(f"{'выгрузка':<18}{'этап':<34}{'было, с':>10}{'стало, с':>10}{'×':>8}")
+    for key in sorted(set(a) & set(b)):
+        kind, orders, name = key
+        ratio = a[key] / b[key] if b[key] else float('inf')
+        print(f"{kind + ' ' + str(orders):<18}{name:<34}{a[key]:>10.3f}{b[key]:>10.3f}{ratio:>8.2f}")
+
+
+def main(argv=None):
+    from bench.generator import parse_size
+
+    parser = argparse.ArgumentParser(description='Бенчмарк загрузки и вкладок ТИТАН')
+    parser.add_argument('--rows', default='10k,100k,1M', help='Размеры выгрузок (заказов) через запятую')
+    parser.add_argument('--data', default=DATA_DIR, help='Каталог выгрузок (недостающие генерируются)')
+    parser.add_argument('--out', default=None, help='Файл результата JSON')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--format', choices=['legacy', 'history', 'all'], default='all')
+    parser.add_argument('--no-api', action='store_true', help='Только этапы ядра, без TestClient')
+    parser.add_argument('--scoring-workers', default='',
+                        help='Числа потоков скоринга через запятую (например 1,2,4)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Сравнить два результата')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # Справочник структуры ТМ — сгенерированный, а не рабочий
+    os.environ['TITAN_TM_STRUCTURE'] = os.path.join(args.data, 'tm_structure.json')
+    kinds = ('legacy', 'history') if args.format == 'all' else (args.format,)
+    sizes = [parse_size(s) for s in args.rows.split(',') if s.strip()]
+    scoring_workers = [int(w) for w in args.scoring_workers.split(',') if w.strip()]
+    report = run(sizes, args.data, args.repeats, kinds, api=not args.no_api, scoring_workers=scoring_workers)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"bench_{report['environment']['commit'] or 'local'}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результат: {out}")
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, BACKEND_DIR)
+    main()
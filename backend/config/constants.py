@@ -2,7 +2,7 @@
 """
 config/constants.py — Константы и справочники
 
-METHODS_RISK — 6 методов риск-скоринга
+METHODS_RISK — 8 методов риск-скоринга
 HIERARCHY_LEVELS — уровни иерархии объектов
 ВНЕПЛАНОВЫЕ_ВИДЫ — коды внеплановых заказов
 """
@@ -40,8 +40,12 @@ HIERARCHY_LEVELS = [
 }
 
 # ============================================
-# 6 МЕТОДОВ РИСК-СКОРИНГА
+# 7 МЕТОДОВ РИСК-СКОРИНГА
 # ============================================
+# requires_fields — колонки метода (кортеж — любая из колонок); метод без
+# них не считается. Реализации — реестр core/risk_methods.py.
+# Множитель Priority_Score по числу сработавших методов (MULTIPLIERS в
+# core/risk_scoring_v2.py) насыщается на 6 — 7-й и 8-й метод его не растят.
 METHODS_RISK = {
     "C1-M1: Перерасход бюджета": {
         "desc": "Выявление заказов с перерасходом бюджета более 20%",
@@ -84,7 +88,7 @@ METHODS_RISK = {
         "threshold_default": 5,
         "threshold_range": [2, 20],
         "threshold_label": "Мин. кол-во заказов",
-        "requires_fields": ['ЕО'],
+        "requires_fields": [('EQUNR_Код', 'ЕО')],
         "weight": 2,
         "color": "#fb923c",
         "full": "Количество заказов по ЕО > Порог. Заказы без ЕО не помечаются."
@@ -96,7 +100,7 @@ METHODS_RISK = {
         "threshold_default": 50,
         "threshold_range": [30, 70],
         "threshold_label": "Коэфф. быстроты (%)",
-        "requires_fields": ['Конец', 'Факт_Конец'],
+        "requires_fields": ['Конец', 'Факт_Конец', 'План_Длит', 'Факт_Длит'],
         "weight": 2,
         "color": "#22d3ee",
         "full": "Факт_Конец = декабрь, План_Конец != декабрь, Факт_Длит < План_Длит * Коэфф."
@@ -112,6 +116,33 @@ METHODS_RISK = {
         "weight": 1,
         "color": "#34d399",
         "full": "Количество возвратов на пройденные статусы > Порог."
+    },
+    "NEW-11: Дубли заказов": {
+        "desc": "Почти одинаковые заказы на одно ЕО/ТМ в близкие даты",
+        "icon": "⧉",
+        "has_threshold": True,
+        "threshold_default": 85,
+        "threshold_range": [50, 99],
+        "threshold_label": "Сходство текста (%)",
+        "requires_fields": ['Текст', 'Начало', ('EQUNR_Код', 'ЕО', 'ТМ')],
+        "weight": 1,
+        "color": "#e879f9",
+        "full": "Сходство текста (MinHash-LSH, проверка по Жаккару) с заказом того же ЕО (без ЕО — ТМ) "
+                "в окне ±30 дней ≥ Порог. Балл 5 на пороге, 10 — одинаковый текст."
+    },
+    "NEW-12: Всплеск затрат ЕО": {
+        "desc": "Месячные затраты/число заказов ЕО резко выше своей истории",
+        "icon": "⇗",
+        "has_threshold": True,
+        "threshold_default": 3.5,
+        "threshold_range": [2, 10],
+        "threshold_label": "Робастный z (MAD)",
+        "requires_fields": ['Fact_N', ('Начало', 'Конец', 'Факт_Начало'), ('EQUNR_Код', 'ЕО', 'ТМ')],
+        "weight": 1,
+        "color": "#38bdf8",
+        "full": "Затраты или число заказов ЕО (без ЕО — ТМ) за месяц заказа против медианы "
+                "предыдущих 12 месяцев: (значение − медиана) / (1.4826·MAD) ≥ Порог. "
+                "Нужно ≥ 6 месяцев истории, из них ≥ 3 с заказами. Балл 5 на пороге, 10 — на 2×пороге."
     }
 }
 
@@ -122,7 +153,9 @@ DEFAULT_THRESHOLDS = {
     "C1-M9: Незавершённые работы": 0,
     "C2-M2: Проблемное оборудование": 5,
     "NEW-9: Формальное закрытие в декабре": 50,
-    "NEW-10: Возвраты статусов": 3
+    "NEW-10: Возвраты статусов": 3,
+    "NEW-11: Дубли заказов": 85,
+    "NEW-12: Всплеск затрат ЕО": 3.5
 }
 
 # ============================================
@@ -3,58 +3,240 @@
 core/aggregates.py — Расчёт агрегатов
 """
 
-import pandas as pd
+from core.risk_scoring_v2 import eo_valid_mask
+from core.grouping import grouped_stats, stats_to_dict
+from utils.metrics import timed
 
-from core.risk_scoring_v2 import is_empty_eo_mask
+# Счётчики заказов: ключ агрегата → колонка группировки
+COUNT_KEYS = {
+    'count_by_tm': 'ТМ',
+    'count_by_ingrp': 'INGRP',
+    'count_by_user': 'USER',
+    'count_by_rm': 'РМ',
+}
 
+# Меры по видам работ: сумма и число непустых Fact_N
+VID_MEASURES = {'fact_sum': ('Fact_N', 'sum'), 'fact_n': ('Fact_N', 'count')}
 
-def compute_aggregates(df):
-    """Расчёт агрегатов для методов риск-скоринга."""
+
+def _eo_column(df):
+    if 'EQUNR_Код' in df.columns:
+        return 'EQUNR_Код'
+    if 'ЕО' in df.columns:
+        return 'ЕО'
+    return None
+
+
+# Все ключи агрегатов (compute_aggregates без keys считает их все)
+VID_KEYS = ('sum_by_vid', 'count_by_vid', 'mean_by_vid')
+PLAN_KEYS = ('sum_plan', 'n_plan', 'mean_plan')
+AGG_KEYS = VID_KEYS + PLAN_KEYS + ('median_by_tm',) + tuple(COUNT_KEYS) + ('count_by_eo',)
+# Агрегаты по всем данным сессии, а не по выборке: дорогие, строятся при первом
+# обращении (session_aggregates) и живут в session['agg'] до изменения данных.
+# В AGG_KEYS не входят — compute_aggregates считает их только по явному keys.
+SESSION_AGG_KEYS = ('duplicate_pairs', 'eo_month')
+
+
+@timed()
+def compute_aggregates(df, keys=None):
+    """Расчёт агрегатов для методов риск-скоринга.
+
+    Все группировки (Вид, ТМ, INGRP, USER, РМ) считаются одним проходом
+    core.grouping.grouped_stats по кодам категорий. keys — какие агрегаты
+    нужны (по умолчанию все AGG_KEYS); скоринг выборки передаёт только
+    объявленные выбранными методами (required_aggregates).
+    """
+    want = set(AGG_KEYS if keys is None else keys)
     agg = {}
+    has_id = 'ID' in df.columns
+    has_fact = 'Fact_N' in df.columns
+
+    # Ключ группировки → меры; медиана нужна только по ТМ, суммы — только по видам
+    group_keys = {}
+    measures = {}
+    if has_id:
+        for key, col in COUNT_KEYS.items():
+            if key in want:
+                group_keys.setdefault(col, []).append('count')
+                measures['count'] = ('ID', 'count')
+    if has_fact and want.intersection(VID_KEYS):
+        group_keys['Вид'] = list(VID_MEASURES)
+        measures.update(VID_MEASURES)
+    if has_fact and 'median_by_tm' in want:
+        group_keys.setdefault('ТМ', []).append('fact_median')
+        measures['fact_median'] = ('Fact_N', 'median')
+    stats = grouped_stats(df, group_keys, measures) if measures else {}
+
+    if want.intersection(VID_KEYS):
+        vid = stats.get('Вид') if has_fact else None
+        if vid is not None:
+            agg['sum_by_vid'] = stats_to_dict(vid, 'fact_sum', skip_zero='fact_n')
+            agg['count_by_vid'] = stats_to_dict(vid, 'fact_n', skip_zero='fact_n')
+            agg['mean_by_vid'] = {k: agg['sum_by_vid'][k] / n for k, n in agg['count_by_vid'].items()}
+        else:
+            agg['sum_by_vid'] = {}
+            agg['count_by_vid'] = {}
+            agg['mean_by_vid'] = {}
 
-    if 'Вид' in df.columns and 'Fact_N' in df.columns:
-        agg['mean_by_vid'] = df.groupby('Вид')['Fact_N'].mean().to_dict()
-    else:
-        agg['mean_by_vid'] = {}
-
-    if 'Plan_N' in df.columns:
-        agg['mean_plan'] = float(df['Plan_N'].mean())
-    else:
-        agg['mean_plan'] = 0.0
-
-    if 'ТМ' in df.columns and 'Fact_N' in df.columns:
-        agg['median_by_tm'] = df.groupby('ТМ')['Fact_N'].median().to_dict()
-    else:
-        agg['median_by_tm'] = {}
-
-    if 'ТМ' in df.columns and 'ID' in df.columns:
-        agg['count_by_tm'] = df.groupby('ТМ')['ID'].count().to_dict()
-    else:
-        agg['count_by_tm'] = {}
-
-    # Подсчёт заказов по ЕО — векторизованная фильтрация (без .apply)
-    if 'EQUNR_Код' in df.columns and 'ID' in df.columns:
-        df_valid_eo = df[~is_empty_eo_mask(df['EQUNR_Код'])]
-        agg['count_by_eo'] = df_valid_eo.groupby('EQUNR_Код')['ID'].count().to_dict()
-    elif 'ЕО' in df.columns and 'ID' in df.columns:
-        df_valid_eo = df[~is_empty_eo_mask(df['ЕО'])]
-        agg['count_by_eo'] = df_valid_eo.groupby('ЕО')['ID'].count().to_dict()
-    else:
-        agg['count_by_eo'] = {}
-
-    if 'INGRP' in df.columns and 'ID' in df.columns:
-        agg['count_by_ingrp'] = df.groupby('INGRP')['ID'].count().to_dict()
-    else:
-        agg['count_by_ingrp'] = {}
-
-    if 'USER' in df.columns and 'ID' in df.columns:
-        agg['count_by_user'] = df.groupby('USER')['ID'].count().to_dict()
-    else:
-        agg['count_by_user'] = {}
-
-    if 'РМ' in df.columns and 'ID' in df.columns:
-        agg['count_by_rm'] = df.groupby('РМ')['ID'].count().to_dict()
-    else:
-        agg['count_by_rm'] = {}
+    if want.intersection(PLAN_KEYS):
+        if 'Plan_N' in df.columns:
+            agg['sum_plan'] = float(df['Plan_N'].sum())
+            agg['n_plan'] = int(df['Plan_N'].count())
+            agg['mean_plan'] = float(df['Plan_N'].mean())
+        else:
+            agg['sum_plan'] = 0.0
+            agg['n_plan'] = 0
+            agg['mean_plan'] = 0.0
+
+    if 'median_by_tm' in want:
+        tm = stats.get('ТМ')
+        agg['median_by_tm'] = stats_to_dict(tm, 'fact_median') if tm is not None and has_fact else {}
+
+    for key, col in COUNT_KEYS.items():
+        if key in want:
+            grp = stats.get(col)
+            agg[key] = stats_to_dict(grp, 'count') if grp is not None and has_id else {}
+
+    # Подсчёт заказов по ЕО — предвычисленная маска валидности
+    if 'count_by_eo' in want:
+        eo_col = _eo_column(df)
+        if eo_col and has_id:
+            valid_eo = eo_valid_mask(df).to_numpy()
+            eo = grouped_stats(df, [eo_col], {'count': ('ID', 'count')}, mask=valid_eo)[eo_col]
+            agg['count_by_eo'] = stats_to_dict(eo, 'count')
+        else:
+            agg['count_by_eo'] = {}
+
+    if 'duplicate_pairs' in want:
+        from core.duplicates import build_duplicate_index
+        agg['duplicate_pairs'] = build_duplicate_index(df)
+    if 'eo_month' in want:
+        from core.eo_series import build_eo_month_matrix
+        agg['eo_month'] = build_eo_month_matrix(df)
 
     return agg
+
+
+def session_aggregates(session_agg, df_all, keys):
+    """Агрегаты SESSION_AGG_KEYS из keys — из агрегатов сессии (недостающие строятся по df_all и сохраняются)."""
+    result = {}
+    for key in keys:
+        if key not in SESSION_AGG_KEYS:
+            continue
+        if key not in session_agg:
+            session_agg[key] = compute_aggregates(df_all, [key])[key]
+        result[key] = session_agg[key]
+    return result
+
+
+def frozen_aggregates(session_agg, df_all, df, keys):
+    """Агрегаты keys для внешних заказов df с базой — данными сессии (session_agg не меняется).
+
+    Агрегаты выборки (AGG_KEYS) — из session_agg, недостающие — по df_all;
+    'eo_month' — матрица сессии, продолженная заказами df. Индекса дублей
+    в результате нет: скоринг строит его по df (пары внутри пакета).
+    """
+    result = {k: session_agg[k] for k in keys if k not in SESSION_AGG_KEYS and k in session_agg}
+    missing = [k for k in keys if k not in SESSION_AGG_KEYS and k not in session_agg]
+    if missing:
+        result.update(compute_aggregates(df_all, missing))
+    if 'eo_month' in keys:
+        from core.eo_series import extend_eo_month_matrix
+        if 'eo_month' in session_agg:
+            series = session_agg['eo_month']
+        else:
+            series = compute_aggregates(df_all, ['eo_month'])['eo_month']
+        result['eo_month'] = None if series is None else extend_eo_month_matrix(series, df)
+    return result
+
+
+def _merge_counts(counts, removed, added):
+    """counts - removed + added (словари ключ → кол-во), нулевые ключи удаляются."""
+    result = dict(counts)
+    for key, n in removed.items():
+        left = result.get(key, 0) - n
+        if left > 0:
+            result[key] = left
+        else:
+            result.pop(key, None)
+    for key, n in added.items():
+        if n > 0:
+            result[key] = result.get(key, 0) + n
+    return result
+
+
+def _group_counts(df, col):
+    if len(df) == 0 or col not in df.columns or 'ID' not in df.columns:
+        return {}
+    stats = grouped_stats(df, [col], {'count': ('ID', 'count')}, observed=True)[col]
+    return stats_to_dict(stats, 'count', skip_zero='count')
+
+
+@timed()
+def update_aggregates(agg, df_removed, df_added, df_all):
+    """Инкрементальное обновление агрегатов при дозагрузке.
+
+    df_removed — строки, ушедшие из сессии (заменённые по ID),
+    df_added — новые строки, df_all — итоговый DataFrame сессии.
+    Счётчики и средние обновляются по разнице; медианы по ТМ
+    пересчитываются только для затронутых ТМ.
+    """
+    if 'sum_by_vid' not in agg:
+        # Агрегаты старого формата — без накопленных сумм
+        return compute_aggregates(df_all)
+
+    # Агрегаты по всей сессии устарели — построятся заново при обращении
+    new = {k: v for k, v in agg.items() if k not in SESSION_AGG_KEYS}
+
+    for key, col in COUNT_KEYS.items():
+        new[key] = _merge_counts(agg.get(key, {}), _group_counts(df_removed, col), _group_counts(df_added, col))
+
+    eo_col = _eo_column(df_all)
+    if eo_col:
+        rem = df_removed[eo_valid_mask(df_removed)] if len(df_removed) else df_removed
+        add = df_added[eo_valid_mask(df_added)] if len(df_added) else df_added
+        new['count_by_eo'] = _merge_counts(agg.get('count_by_eo', {}), _group_counts(rem, eo_col), _group_counts(add, eo_col))
+
+    if 'Вид' in df_all.columns and 'Fact_N' in df_all.columns:
+        sums = dict(agg.get('sum_by_vid', {}))
+        vid_cnt = []
+        for frame, sign in ((df_removed, -1), (df_added, 1)):
+            cnt = {}
+            if len(frame):
+                vid = grouped_stats(frame, ['Вид'], VID_MEASURES, observed=True)['Вид']
+                for key, val in stats_to_dict(vid, 'fact_sum').items():
+                    sums[key] = sums.get(key, 0.0) + sign * val
+                cnt = stats_to_dict(vid, 'fact_n')
+            vid_cnt.append(cnt)
+        rem_cnt, add_cnt = vid_cnt
+        counts = _merge_counts(agg.get('count_by_vid', {}), rem_cnt, add_cnt)
+        new['count_by_vid'] = counts
+        new['sum_by_vid'] = {k: sums.get(k, 0.0) for k in counts}
+        new['mean_by_vid'] = {k: new['sum_by_vid'][k] / n for k, n in counts.items()}
+
+    if 'Plan_N' in df_all.columns:
+        sum_plan = agg.get('sum_plan', 0.0)
+        n_plan = agg.get('n_plan', 0)
+        if len(df_removed):
+            sum_plan -= float(df_removed['Plan_N'].sum())
+            n_plan -= int(df_removed['Plan_N'].count())
+        if len(df_added):
+            sum_plan += float(df_added['Plan_N'].sum())
+            n_plan += int(df_added['Plan_N'].count())
+        new['sum_plan'] = sum_plan
+        new['n_plan'] = n_plan
+        new['mean_plan'] = sum_plan / n_plan if n_plan else float('nan')
+
+    if 'ТМ' in df_all.columns and 'Fact_N' in df_all.columns:
+        touched = set()
+        for frame in (df_removed, df_added):
+            if len(frame):
+                touched.update(frame['ТМ'].unique().tolist())
+        medians = {k: v for k, v in agg.get('median_by_tm', {}).items() if k not in touched}
+        if touched:
+            df_touched = df_all[df_all['ТМ'].isin(list(touched))]
+            tm = grouped_stats(df_touched, ['ТМ'], {'fact_median': ('Fact_N', 'median')}, observed=True)['ТМ']
+            medians.update(stats_to_dict(tm, 'fact_median'))
+        new['median_by_tm'] = medians
+
+    return new
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+core/baseline_store.py — Историческая база C1-M6 / C2-M2 между загрузками
+
+Медианы ТМ (C1-M6) и счётчики заказов ЕО (C2-M2) считаются по выборке:
+база меняется от фильтров, у выгрузки за один месяц истории почти нет.
+Здесь они копятся по всем загрузкам в локальном файле SQLite
+(TITAN_BASELINE_DB):
+- tm_sketch — распределение Fact_N по ТМ: логарифмические корзины с
+  относительной точностью SKETCH_ALPHA (DDSketch); слияние — сложение
+  счётчиков корзин, медиана — по накопленным счётчикам;
+- eo_counts — число заказов по ЕО;
+- orders — учтённые заказы и их вклад (ТМ и корзина Fact_N, ЕО):
+  повторная загрузка той же выгрузки (или пересекающегося периода) базу
+  не удваивает, а заказ с изменившимся вкладом (новый Fact_N в выгрузке
+  истории статусов) заменяет прежний вклад. Заказы из базы прежнего
+  формата (без вклада, tracked = 0) при повторной загрузке не меняются.
+Обновление — UPSERT по первичному ключу (ТМ, корзина) / ЕО с разностью
+вкладов (опустевшие строки удаляются), поиск — по ключу. Прочитанные значения кэшируются в процессе до следующей записи
+(версия базы в таблице meta). Включается фильтром baseline='history'.
+"""
+
+import os
+import math
+import sqlite3
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from core.risk_scoring_v2 import eo_valid_mask, eo_code_column
+from utils.metrics import timed
+
+# Файл базы; TITAN_BASELINE=0 — не накапливать и не использовать
+BASELINE_DB = os.environ.get('TITAN_BASELINE_DB', os.path.join(tempfile.gettempdir(), 'titan_baseline.sqlite'))
+BASELINE_ENABLED = os.environ.get('TITAN_BASELINE', '1') != '0'
+# Относительная точность квантилей (1% — корзины шириной ±1%)
+SKETCH_ALPHA = 0.01
+_GAMMA = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+_LOG_GAMMA = math.log(_GAMMA)
+# Код корзины: 0 — нулевые затраты, ±(индекс + _BIAS) — положительные/отрицательные,
+# так что порядок кодов совпадает с порядком значений
+_BIAS = 1 << 20
+# Параметров в одном запросе IN (...)
+_CHUNK = 900
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tm_sketch (tm TEXT NOT NULL, bucket INTEGER NOT NULL, n INTEGER NOT NULL,
+                                      PRIMARY KEY (tm, bucket)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS eo_counts (eo TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS orders (id TEXT PRIMARY KEY, tm TEXT, bucket INTEGER, eo TEXT,
+                                   tracked INTEGER NOT NULL DEFAULT 1) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+INSERT OR IGNORE INTO meta VALUES ('version', 0);
+"""
+
+# Заказы пакета с изменившимся вкладом (только записанные с вкладом)
+_CHANGED = 'o.tracked = 1 AND (o.tm IS NOT b.tm OR o.bucket IS NOT b.bucket OR o.eo IS NOT b.eo)'
+# Разность вкладов пакета: +1 — вклад новых и изменившихся заказов, −1 — прежний вклад изменившихся
+_DELTA = f"""
+SELECT b.tm AS tm, b.bucket AS bucket, b.eo AS eo, 1 AS d FROM batch b LEFT JOIN orders o ON o.id = b.id
+ WHERE o.id IS NULL OR ({_CHANGED})
+UNION ALL
+SELECT o.tm, o.bucket, o.eo, -1 FROM batch b JOIN orders o ON o.id = b.id WHERE {_CHANGED}
+"""
+
+_lock = threading.RLock()
+_conn = None
+# Кэш прочитанных значений: версия базы, медианы ТМ, счётчики ЕО
+_cache = {'version': None, 'median_by_tm': {}, 'count_by_eo': {}}
+
+
+def _connect():
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(os.path.abspath(BASELINE_DB)), exist_ok=True)
+        conn = sqlite3.connect(BASELINE_DB, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        if 'tracked' not in {row[1] for row in conn.execute('PRAGMA table_info(orders)')}:
+            # База прежнего формата: вклад учтённых заказов неизвестен
+            conn.executescript('ALTER TABLE orders ADD COLUMN tm TEXT;'
+                               'ALTER TABLE orders ADD COLUMN bucket INTEGER;'
+                               'ALTER TABLE orders ADD COLUMN eo TEXT;'
+                               'ALTER TABLE orders ADD COLUMN tracked INTEGER NOT NULL DEFAULT 0;')
+        _conn = conn
+    return _conn
+
+
+def bucket_codes(values):
+    """Коды корзин для значений (NaN не допускается)."""
+    values = np.asarray(values, dtype=float)
+    magnitude = np.abs(values)
+    with np.errstate(divide='ignore'):
+        index = np.ceil(np.log(np.where(magnitude > 0, magnitude, 1.0)) / _LOG_GAMMA).astype(np.int64) + _BIAS
+    return np.where(values > 0, index, np.where(values < 0, -index, 0))
+
+
+def bucket_values(codes):
+    """Оценка значения корзины (середина корзины в относительной мере)."""
+    codes = np.asarray(codes, dtype=np.int64)
+    value = 2 * np.power(_GAMMA, np.abs(codes) - _BIAS) / (_GAMMA + 1)
+    return np.where(codes > 0, value, np.where(codes < 0, -value, 0.0))
+
+
+def sketch_quantiles(keys, codes, counts, q=0.5):
+    """Квантиль q по корзинам: строки (ключ, код, счётчик) в порядке (ключ, код) → {ключ: значение}."""
+    if not len(keys):
+        return {}
+    frame = pd.DataFrame({'key': keys, 'code': codes, 'n': counts})
+    grp = frame.groupby('key', sort=False)['n']
+    rank = q * (grp.transform('sum') - 1)
+    cum = grp.cumsum()
+    frame['value'] = bucket_values(frame['code'].to_numpy())
+    # Корзины соседних рангов floor/ceil(q·(n − 1)) — среднее, как у медианы pandas
+    lower = frame[cum > np.floor(rank)].drop_duplicates('key').set_index('key')['value']
+    upper = frame[cum > np.ceil(rank)].drop_duplicates('key').set_index('key')['value']
+    weight = (rank - np.floor(rank)).groupby(frame['key'], sort=False).first()
+    result = lower + (upper.reindex(lower.index) - lower) * weight.reindex(lower.index)
+    return result.to_dict()
+
+
+def store_version():
+    """Версия базы (растёт с каждой записью); None — база отключена."""
+    if not BASELINE_ENABLED:
+        return None
+    with _lock:
+        return _connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+
+def _text_keys(series):
+    """Ключи базы — строки; у category — строки категорий без прохода по строкам."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.rename_categories([str(c) for c in series.cat.categories])
+    return series.astype(str)
+
+
+@timed()
+def ingest(df):
+    """Учесть в базе заказы df: новые — добавить, изменившиеся — заменить прежний вклад.
+
+    Возвращает {'new_orders', 'updated_orders'}, None (база отключена)
+    или {'error': ...} — ошибка базы загрузку не прерывает.
+    """
+    if not BASELINE_ENABLED or 'ID' not in df.columns or not len(df):
+        return None
+    try:
+        return _ingest(df)
+    except sqlite3.Error as e:
+        return {'error': str(e)}
+
+
+def _contributions(df):
+    """Вклад заказов в базу: ключ ТМ, корзина Fact_N, ключ ЕО (None — нет вклада)."""
+    n = len(df)
+    tm = np.full(n, None, dtype=object)
+    bucket = np.full(n, None, dtype=object)
+    if 'ТМ' in df.columns and 'Fact_N' in df.columns:
+        fact = df['Fact_N'].to_numpy(dtype=float, na_value=np.nan)
+        has = ~np.isnan(fact) & df['ТМ'].notna().to_numpy()
+        tm[has] = _text_keys(df['ТМ']).to_numpy(dtype=object)[has]
+        # astype(object) — целые Python (sqlite3 не принимает numpy.int64)
+        bucket[has] = bucket_codes(fact[has]).astype(object)
+    eo = np.full(n, None, dtype=object)
+    eo_col = eo_code_column(df)
+    if eo_col in df.columns:
+        valid = eo_valid_mask(df).to_numpy(dtype=bool) & df[eo_col].notna().to_numpy()
+        eo[valid] = _text_keys(df[eo_col]).to_numpy(dtype=object)[valid]
+    return tm, bucket, eo
+
+
+def _ingest(df):
+    ids = df['ID'].astype(str)
+    # Повторы ID в пакете — последнее вхождение (самое свежее состояние заказа)
+    last = ~ids.duplicated(keep='last').to_numpy()
+    tm, bucket, eo = _contributions(df[last])
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS batch '
+                         '(id TEXT PRIMARY KEY, tm TEXT, bucket INTEGER, eo TEXT) WITHOUT ROWID')
+            conn.execute('DELETE FROM batch')
+            conn.executemany('INSERT INTO batch VALUES (?, ?, ?, ?)',
+                             zip(ids[last].to_numpy(dtype=object), tm, bucket, eo))
+            new = conn.execute('SELECT COUNT(*) FROM batch b LEFT JOIN orders o ON o.id = b.id '
+                               'WHERE o.id IS NULL').fetchone()[0]
+            updated = conn.execute(f'SELECT COUNT(*) FROM batch b JOIN orders o ON o.id = b.id '
+                                   f'WHERE {_CHANGED}').fetchone()[0]
+            if new or updated:
+                conn.execute(
+                    f'INSERT INTO tm_sketch SELECT tm, bucket, SUM(d) FROM ({_DELTA}) WHERE tm IS NOT NULL '
+                    'GROUP BY tm, bucket HAVING SUM(d) != 0 '
+                    'ON CONFLICT (tm, bucket) DO UPDATE SET n = n + excluded.n')
+                conn.execute(
+                    f'INSERT INTO eo_counts SELECT eo, SUM(d) FROM ({_DELTA}) WHERE eo IS NOT NULL '
+                    'GROUP BY eo HAVING SUM(d) != 0 '
+                    'ON CONFLICT (eo) DO UPDATE SET n = n + excluded.n')
+                conn.execute('DELETE FROM tm_sketch WHERE n <= 0')
+                conn.execute('DELETE FROM eo_counts WHERE n <= 0')
+                conn.execute(
+                    'INSERT INTO orders SELECT id, tm, bucket, eo, 1 FROM batch WHERE true '
+                    'ON CONFLICT (id) DO UPDATE SET tm = excluded.tm, bucket = excluded.bucket, eo = excluded.eo '
+                    'WHERE orders.tracked = 1')
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            conn.execute('DELETE FROM batch')
+    return {'new_orders': new, 'updated_orders': updated}
+
+
+def _lookup(kind, keys):
+    """Значения базы для ключей keys: {ключ: значение}, только найденные."""
+    with _lock:
+        conn = _connect()
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        if _cache['version'] != version:
+            _cache.update({'version': version, 'median_by_tm': {}, 'count_by_eo': {}})
+        cache = _cache[kind]
+        missing = [k for k in keys if k not in cache]
+        for start in range(0, len(missing), _CHUNK):
+            chunk = missing[start:start + _CHUNK]
+            marks = ','.join('?' * len(chunk))
+            if kind == 'median_by_tm':
+                rows = conn.execute(f'SELECT tm, bucket, n FROM tm_sketch WHERE tm IN ({marks}) '
+                                    'ORDER BY tm, bucket', chunk).fetchall()
+                found = sketch_quantiles(*zip(*rows)) if rows else {}
+            else:
+                found = dict(conn.execute(f'SELECT eo, n FROM eo_counts WHERE eo IN ({marks})', chunk).fetchall())
+            for k in chunk:
+                # Ненайденные тоже кэшируются (None) — повторно не запрашиваются
+                cache[k] = found.get(k)
+        return {k: cache[k] for k in keys if cache[k] is not None}
+
+
+@timed()
+def history_aggregates(df):
+    """Агрегаты для скоринга df по исторической базе (пусто — база отключена).
+
+    median_by_tm — медианы ТМ выборки; history_count_by_eo — число заказов
+    ЕО выборки по всем загрузкам (C2-M2 берёт его вместо счёта по выборке).
+    """
+    if not BASELINE_ENABLED:
+        return {}
+    result = {}
+    if 'ТМ' in df.columns:
+        result['median_by_tm'] = _lookup('median_by_tm', [str(v) for v in pd.unique(df['ТМ'].dropna())])
+    eo_col = eo_code_column(df)
+    if eo_col in df.columns:
+        eo = df.loc[eo_valid_mask(df), eo_col].dropna()
+        result['history_count_by_eo'] = _lookup('count_by_eo', [str(v) for v in pd.unique(eo)])
+    return result
+
+
+def store_stats():
+    """Размер базы: заказов, ТМ, ЕО, корзин; None — база отключена."""
+    if not BASELINE_ENABLED:
+        return None
+    with _lock:
+        conn = _connect()
+
+        def one(sql):
+            return conn.execute(sql).fetchone()[0]
+
+        return {
+            "path": BASELINE_DB,
+            "version": one("SELECT value FROM meta WHERE key = 'version'"),
+            "orders": one('SELECT COUNT(*) FROM orders'),
+            "tm": one('SELECT COUNT(DISTINCT tm) FROM tm_sketch'),
+            "tm_buckets": one('SELECT COUNT(*) FROM tm_sketch'),
+            "eo": one('SELECT COUNT(*) FROM eo_counts'),
+        }
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+core/chat_tools.py — Инструменты аналитика для чата (вызовы функций LLM)
+
+Вместо полной сводки в промпте модель получает описание нескольких
+запросов к данным сессии и вызывает их сама:
+- list_values — значения измерения (чтобы найти «цех X» среди реальных имён);
+- aggregate   — фильтр → группировка (+ период) → метрики → топ-N;
+- top_orders  — крупнейшие заказы выборки;
+- summary     — итоги выборки.
+Запросы выполняются локально (категориальные группировки pandas),
+результаты кэшируются в сессии по (версия данных, инструмент, аргументы).
+"""
+
+import os
+import json
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from config.constants import HIERARCHY_LEVELS
+from utils.metrics import record
+
+# Сколько результатов инструментов хранить на сессию
+TOOL_CACHE_SIZE = int(os.environ.get('TITAN_CHAT_TOOL_CACHE', '256'))
+# Предел строк в ответе инструмента (промпт остаётся маленьким)
+MAX_ROWS = 50
+
+# Измерения: ключ аргумента → колонка DataFrame
+DIMENSIONS = {level['key']: level['key'] for level in HIERARCHY_LEVELS}
+DIMENSIONS.update({
+    'ТМ': 'ТМ', 'Вид': 'Вид', 'ABC': 'ABC', 'STAT': 'STAT', 'РМ': 'РМ',
+    'INGRP': 'INGRP', 'USER': 'USER', 'КЛАСС': 'КЛАСС',
+})
+
+METRICS = ('count', 'plan', 'fact', 'overrun', 'overrun_pct')
+TIME_BUCKETS = {'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+_FILTERS_SCHEMA = {
+    "type": "object",
+    "description": (
+        "Фильтры выборки: измерение → список значений (точное совпадение, иначе — "
+        "по подстроке без учёта регистра), date_from/date_to — по плановому началу (YYYY-MM-DD)"
+    ),
+    "properties": {
+        **{dim: {"type": "array", "items": {"type": "string"}} for dim in DIMENSIONS},
+        "date_from": {"type": "string"},
+        "date_to": {"type": "string"},
+    },
+}
+
+TOOL_SPECS = [
+    {"type": "function", "function": {
+        "name": "list_values",
+        "description": "Значения измерения с числом заказов (поиск по подстроке contains).",
+        "parameters": {"type": "object", "properties": {
+            "dimension": {"type": "string", "enum": list(DIMENSIONS)},
+            "contains": {"type": "string"},
+            "filters": _FILTERS_SCHEMA,
+            "limit": {"type": "integer", "default": 20},
+        }, "required": ["dimension"]},
+    }},
+    {"type": "function", "function": {
+        "name": "aggregate",
+        "description": (
+            "Сводка по группам: фильтр → группировка по 1–2 измерениям и/или периоду → "
+            "метрики (count, plan, fact, overrun = факт − план, overrun_pct) → топ-N по sort_by."
+        ),
+        "parameters": {"type": "object", "properties": {
+            "filters": _FILTERS_SCHEMA,
+            "group_by": {"type": "array", "items": {"type": "string", "enum": list(DIMENSIONS)}},
+            "time_bucket": {"type": "string", "enum": list(TIME_BUCKETS)},
+            "metrics": {"type": "array", "items": {"type": "string", "enum": list(METRICS)}},
+            "sort_by": {"type": "string", "enum": list(METRICS)},
+            "order": {"type": "string", "enum": ["desc", "asc"]},
+            "top_n": {"type": "integer", "default": 10},
+        }},
+    }},
+    {"type": "function", "function": {
+        "name": "top_orders",
+        "description": "Крупнейшие заказы выборки по fact, plan, overrun или overrun_pct.",
+        "parameters": {"type": "object", "properties": {
+            "filters": _FILTERS_SCHEMA,
+            "sort_by": {"type": "string", "enum": ["fact", "plan", "overrun", "overrun_pct"]},
+            "top_n": {"type": "integer", "default": 10},
+        }},
+    }},
+    {"type": "function", "function": {
+        "name": "summary",
+        "description": "Итоги выборки: число заказов, план, факт, отклонение, период.",
+        "parameters": {"type": "object", "properties": {"filters": _FILTERS_SCHEMA}},
+    }},
+]
+
+
+def _num(v, digits=2):
+    if v is None or pd.isna(v):
+        return None
+    return round(float(v), digits)
+
+
+def _resolve(series, values):
+    """Значения фильтра → реальные значения колонки (точно, иначе по подстроке)."""
+    values = [str(v) for v in values]
+    options = series.cat.categories if isinstance(series.dtype, pd.CategoricalDtype) else series.dropna().unique()
+    options = [str(o) for o in options]
+    wanted = set(values)
+    exact = [o for o in options if o in wanted]
+    if exact:
+        return exact
+    lowered = [v.lower() for v in values]
+    return [o for o in options if any(v in o.lower() for v in lowered)]
+
+
+def _apply_filters(df, filters):
+    """Фильтры инструмента → (выборка, {измерение: найденные значения})."""
+    filters = filters or {}
+    mask = pd.Series(True, index=df.index)
+    resolved = {}
+    for dim, values in filters.items():
+        col = DIMENSIONS.get(dim)
+        if col is None or col not in df.columns or not values:
+            continue
+        if not isinstance(values, list):
+            values = [values]
+        matched = _resolve(df[col], values)
+        resolved[dim] = matched[:MAX_ROWS]
+        series = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype(str)
+        mask &= series.isin(matched)
+    if (filters.get('date_from') or filters.get('date_to')) and 'Начало' in df.columns:
+        dates = pd.to_datetime(df['Начало'], errors='coerce')
+        for key, op in (('date_from', dates.__ge__), ('date_to', dates.__le__)):
+            if filters.get(key):
+                try:
+                    mask &= op(pd.Timestamp(filters[key]))
+                except (ValueError, TypeError):
+                    pass
+    return df[mask], resolved
+
+
+def tool_list_values(df, dimension, contains='', filters=None, limit=20):
+    col = DIMENSIONS.get(dimension)
+    if col is None or col not in df.columns:
+        return {"error": f"Нет измерения {dimension}"}
+    df_f, resolved = _apply_filters(df, filters)
+    counts = df_f[col].value_counts()
+    counts = counts[counts > 0]
+    if contains:
+        counts = counts[counts.index.astype(str).str.contains(contains, case=False, regex=False)]
+    limit = max(1, min(int(limit or 20), MAX_ROWS))
+    return {
+        "dimension": dimension,
+        "total_values": int(len(counts)),
+        "values": [{"value": str(k), "orders": int(v)} for k, v in counts.head(limit).items()],
+        "filters_resolved": resolved,
+    }
+
+
+def tool_aggregate(df, filters=None, group_by=None, time_bucket=None, metrics=None,
+                   sort_by='fact', order='desc', top_n=10):
+    df_f, resolved = _apply_filters(df, filters)
+    keys = [DIMENSIONS[g] for g in (group_by or []) if g in DIMENSIONS and DIMENSIONS[g] in df_f.columns][:2]
+    metrics = [m for m in (metrics or ['count', 'plan', 'fact', 'overrun']) if m in METRICS] or ['fact']
+    if sort_by not in METRICS:
+        sort_by = 'fact'
+
+    frame = df_f[keys + ['Plan_N', 'Fact_N']].copy()
+    if time_bucket in TIME_BUCKETS and 'Начало' in df_f.columns:
+        frame['Период'] = pd.to_datetime(df_f['Начало'], errors='coerce').dt.to_period(TIME_BUCKETS[time_bucket]).astype(str)
+        frame = frame[frame['Период'] != 'NaT']
+        keys = keys + ['Период']
+
+    if keys:
+        g = frame.groupby(keys, observed=True, sort=False)
+        table = pd.DataFrame({'count': g.size(), 'plan': g['Plan_N'].sum(), 'fact': g['Fact_N'].sum()})
+    else:
+        table = pd.DataFrame({'count': [len(frame)], 'plan': [frame['Plan_N'].sum()], 'fact': [frame['Fact_N'].sum()]})
+    table['overrun'] = table['fact'] - table['plan']
+    table['overrun_pct'] = (table['overrun'] / table['plan'].where(table['plan'] != 0) * 100)
+
+    top_n = max(1, min(int(top_n or 10), MAX_ROWS))
+    table = table.sort_values(sort_by, ascending=(order == 'asc'), na_position='last')
+    rows = []
+    for key, r in table.head(top_n).iterrows():
+        key = key if isinstance(key, tuple) else (key,)
+        row = {k: str(v) for k, v in zip(keys, key)} if keys else {}
+        for m in metrics:
+            row[m] = int(r[m]) if m == 'count' else _num(r[m])
+        rows.append(row)
+    return {
+        "group_by": keys,
+        "groups": int(len(table)),
+        "sort_by": sort_by,
+        "rows": rows,
+        "filters_resolved": resolved,
+    }
+
+
+def tool_top_orders(df, filters=None, sort_by='fact', top_n=10):
+    df_f, resolved = _apply_filters(df, filters)
+    top_n = max(1, min(int(top_n or 10), MAX_ROWS))
+    overrun = df_f['Fact_N'] - df_f['Plan_N']
+    key = {
+        'plan': df_f['Plan_N'],
+        'overrun': overrun,
+        'overrun_pct': overrun / df_f['Plan_N'].where(df_f['Plan_N'] != 0) * 100,
+    }.get(sort_by, df_f['Fact_N'])
+    idx = key.dropna().nlargest(top_n).index
+    cols = [c for c in ('ID', 'Текст', 'ТМ', 'ЕО', 'Вид', 'Начало') if c in df_f.columns]
+    top = df_f.loc[idx, cols + ['Plan_N', 'Fact_N']]
+    rows = []
+    for rec in top.to_dict('records'):
+        row = {c: (str(rec[c]) if pd.notna(rec[c]) else None) for c in cols}
+        row['plan'] = _num(rec['Plan_N'])
+        row['fact'] = _num(rec['Fact_N'])
+        row['overrun'] = _num(rec['Fact_N'] - rec['Plan_N']) if pd.notna(rec['Plan_N']) else None
+        rows.append(row)
+    return {"orders": int(len(df_f)), "sort_by": sort_by, "rows": rows, "filters_resolved": resolved}
+
+
+def tool_summary(df, filters=None):
+    df_f, resolved = _apply_filters(df, filters)
+    plan, fact = df_f['Plan_N'].sum(), df_f['Fact_N'].sum()
+    dates = pd.to_datetime(df_f['Начало'], errors='coerce') if 'Начало' in df_f.columns else pd.Series(dtype='datetime64[ns]')
+    return {
+        "orders": int(len(df_f)),
+        "plan": _num(plan),
+        "fact": _num(fact),
+        "overrun": _num(fact - plan),
+        "overrun_pct": _num((fact - plan) / plan * 100) if plan else None,
+        "date_from": str(dates.min().date()) if dates.notna().any() else None,
+        "date_to": str(dates.max().date()) if dates.notna().any() else None,
+        "filters_resolved": resolved,
+    }
+
+
+TOOLS = {
+    'list_values': tool_list_values,
+    'aggregate': tool_aggregate,
+    'top_orders': tool_top_orders,
+    'summary': tool_summary,
+}
+
+
+def run_tool(session, name, args):
+    """Выполнить инструмент по данным сессии (с кэшем по версии данных)."""
+    func = TOOLS.get(name)
+    if func is None:
+        return {"error": f"Неизвестный инструмент {name}"}
+    args = args if isinstance(args, dict) else {}
+    key = (session.get('version', 1), name, json.dumps(args, sort_keys=True, ensure_ascii=False, default=str))
+    cache = session.setdefault('chat_tool_cache', OrderedDict())
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+
+    t0 = time.perf_counter()
+    try:
+        result = func(session['df'], **args)
+    except TypeError as e:
+        # Лишние/неверные аргументы от модели — сообщить ей, а не падать
+        return {"error": f"Неверные аргументы: {e}"}
+    record(f"chat_tool.{name}", time.perf_counter() - t0, len(session['df']))
+
+    cache[key] = result
+    while len(cache) > TOOL_CACHE_SIZE:
+        cache.popitem(last=False)
+    return result
@@ -6,7 +6,32 @@ core/data_loader.py — Загрузка данных
 import pandas as pd
 from io import BytesIO
 
+from core.schema import COLUMN_SCHEMA
+from utils.metrics import timed
 
+try:
+    import pyarrow as pa
+    import pyarrow.json as pa_json
+except ImportError:
+    pa = None
+
+# Форматы пакета заказов для внешнего скоринга: формат → Content-Type
+BATCH_MEDIA_TYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+# Другие названия тех же форматов в Content-Type
+BATCH_MEDIA_ALIASES = {
+    'application/jsonl': 'jsonl',
+    'application/json-lines': 'jsonl',
+    'application/json': 'jsonl',
+    'application/csv': 'csv',
+    'application/vnd.apache.arrow.file': 'arrow',
+}
+
+
+@timed()
 def load_file(file_bytes: bytes, file_name: str) -> pd.DataFrame:
     """Загрузка Excel/CSV файла из байтов."""
     buf = BytesIO(file_bytes)
@@ -24,6 +49,49 @@ def load_file(file_bytes: bytes, file_name: str) -> pd.DataFrame:
         return pd.read_excel(buf, engine='calamine')
 
 
+def batch_format(content_type):
+    """Формат пакета по Content-Type (None — не поддерживается)."""
+    media = (content_type or '').split(';')[0].strip().lower()
+    for fmt, media_type in BATCH_MEDIA_TYPES.items():
+        if media == media_type:
+            return fmt
+    return BATCH_MEDIA_ALIASES.get(media)
+
+
+@timed()
+def load_batch(file_bytes: bytes, fmt: str) -> pd.DataFrame:
+    """Пакет заказов в схеме обработанных данных: JSON Lines, CSV (;) или Arrow IPC.
+
+    Текстовые колонки схемы читаются строками — коды ЕО/ТМ совпадут с сессией.
+    """
+    buf = BytesIO(file_bytes)
+    if fmt == 'jsonl':
+        if pa is not None:
+            # Разбор pyarrow в разы быстрее построчного pd.read_json
+            try:
+                return pa_json.read_json(buf).to_pandas()
+            except pa.ArrowInvalid:
+                buf.seek(0)
+        return pd.read_json(buf, lines=True, dtype=False, convert_dates=False)
+    if fmt == 'csv':
+        text_cols = {c: str for c, kind in COLUMN_SCHEMA.items() if kind in ('category', 'string')}
+        try:
+            return pd.read_csv(buf, encoding='utf-8-sig', sep=';', dtype=text_cols)
+        except UnicodeDecodeError:
+            buf.seek(0)
+            return pd.read_csv(buf, encoding='cp1251', sep=';', dtype=text_cols)
+    if fmt == 'arrow':
+        if pa is None:
+            raise ValueError("Формат arrow недоступен: не установлен pyarrow")
+        try:
+            table = pa.ipc.open_stream(buf).read_all()
+        except pa.ArrowInvalid:
+            table = pa.ipc.open_file(pa.BufferReader(file_bytes)).read_all()
+        return table.to_pandas()
+    raise ValueError(f"Неизвестный формат пакета: {fmt}")
+
+
+@timed()
 def detect_export_format(df):
     """Определение формата выгрузки SAP."""
     new_format_cols = ['ISTAT', 'ISTAT_TXT', 'PMCOALLP', 'PMCOALLF', 'AUFNR']
@@ -6,7 +6,10 @@ core/data_processor.py — Обработка данных SAP
 import pandas as pd
 import numpy as np
 
-from utils.parsers import fast_parse_series, safe_parse_datetime
+from utils.parsers import fast_parse_series, safe_parse_datetime, parse_dates
+from core.risk_scoring_v2 import add_eo_columns
+from core.schema import normalize_text, apply_schema, COLUMN_SCHEMA, DATETIME_COLUMNS
+from utils.metrics import timed, stage_laps
 
 
 def calculate_data_completeness(row, required_fields):
@@ -20,6 +23,7 @@ def calculate_data_completeness(row, required_fields):
     return (filled / total * 100) if total > 0 else 0
 
 
+@timed()
 def aggregate_status_history(df):
     """Агрегация истории статусов для нового формата."""
     static_cols = [
@@ -82,12 +86,16 @@ def aggregate_status_history(df):
     return df_agg
 
 
+@timed()
 def process_data(df_raw):
     """Обработка сырых данных SAP."""
     from core.data_loader import detect_export_format
 
+    # Подэтапы — в метриках как process_data.<этап>
+    lap = stage_laps('process_data', len(df_raw))
     df = df_raw.copy()
     export_format = detect_export_format(df)
+    lap('detect_format')
 
     if export_format == 'NEW_STATUS_HISTORY':
         df = aggregate_status_history(df)
@@ -148,11 +156,13 @@ def process_data(df_raw):
         }
 
     df = df.rename(columns={k: v for k, v in map_cols.items() if k in df.columns})
+    lap('rename')
 
     df['Plan_N'] = fast_parse_series(df['P']) if 'P' in df.columns else 0.0
     df['Fact_N'] = fast_parse_series(df['F']) if 'F' in df.columns else 0.0
     df['Plan_T'] = fast_parse_series(df['PT']) if 'PT' in df.columns else 0.0
     df['Fact_T'] = fast_parse_series(df['FT']) if 'FT' in df.columns else 0.0
+    lap('parse_numbers')
 
     for col, src in [('Начало', 'S'), ('Конец', 'E')]:
         if src in df.columns:
@@ -192,18 +202,20 @@ def process_data(df_raw):
         df['План_Длит'] = np.nan
         df['Факт_Длит'] = np.nan
         df['Превыш_Длит'] = np.nan
+    lap('dates')
 
     str_fields = ['ID', 'Текст', 'Вид', 'ТМ', 'STAT', 'ABC', 'РМ', 'БЕ', 'ЗАВОД', 'УСТАНОВКА', 'ПРОИЗВОДСТВО', 'ЦЕХ', 'ЕО', 'INGRP', 'КЛАСС', 'USER']
     for c in str_fields:
         if c in df.columns:
-            df[c] = df[c].astype(str).replace(['nan', 'None', '', '0', 'Не присвоено', 'Не присв', 'Пусто'], 'Н/Д')
+            df[c] = normalize_text(df[c], COLUMN_SCHEMA[c])
         else:
             df[c] = 'Н/Д'
 
     if 'Вид_Код' in df.columns:
-        df['Вид_Код'] = df['Вид_Код'].astype(str).replace(['nan', 'None', ''], 'Н/Д')
+        df['Вид_Код'] = normalize_text(df['Вид_Код'], empty_values=('nan', 'None', ''))
     else:
         df['Вид_Код'] = df['Вид'].str.extract(r'^([A-Z]{2}\d{2})', expand=False).fillna('Н/Д')
+    lap('normalize_text')
 
     # Иерархия из tm_structure.json
     try:
@@ -326,9 +338,77 @@ def process_data(df_raw):
             df['ПРОИЗВОДСТВО'] = 'Н/Д'
             df['ЦЕХ_Код'] = 'Н/Д'
             df['ЦЕХ'] = 'Н/Д'
+    lap('hierarchy')
 
     required_fields = ['ID', 'Текст', 'ТМ', 'Вид', 'Plan_N', 'Fact_N', 'Начало', 'Конец', 'STAT', 'ABC']
     df['Data_Completeness'] = df.apply(lambda row: calculate_data_completeness(row, required_fields), axis=1)
+    lap('completeness')
+
+    # Типы по схеме (category / Arrow-строки / float), затем валидность ЕО —
+    # один раз на загрузку, дальше читается всеми вкладками
+    apply_schema(df)
+    lap('schema')
+    add_eo_columns(df)
+    lap('eo_columns')
 
     df.attrs['export_format'] = export_format
     return df
+
+
+@timed()
+def prepare_batch(df):
+    """Пакет заказов уже в схеме обработанных данных → типы как у сессии.
+
+    Без разбора выгрузки SAP (process_data): текст нормализуется так же
+    (пустые → 'Н/Д'), даты и меры приводятся к схеме, добавляются колонки
+    валидности ЕО. Индекс — 0..n-1.
+    """
+    df = df.reset_index(drop=True)
+    for col in df.columns:
+        kind = COLUMN_SCHEMA.get(col)
+        if kind in ('category', 'string'):
+            s = df[col]
+            # JSON без кавычек: 10000001 → '10000001', а не '10000001.0'
+            if pd.api.types.is_float_dtype(s) and (s.dropna() % 1 == 0).all():
+                s = s.astype('Int64')
+            df[col] = normalize_text(s, kind)
+        elif col in DATETIME_COLUMNS:
+            df[col] = parse_dates(df[col])
+    apply_schema(df)
+    add_eo_columns(df)
+    return df
+
+
+def _align_categoricals(df_old, df_new):
+    """Привести категориальные колонки двух кадров к общим категориям для concat."""
+    df_new = df_new.copy()
+    for col in df_old.columns:
+        if col in df_new.columns and isinstance(df_old[col].dtype, pd.CategoricalDtype):
+            cats = df_old[col].cat.categories
+            extra = pd.Index(df_new[col].dropna().unique()).difference(cats)
+            if len(extra):
+                df_old[col] = df_old[col].cat.add_categories(extra)
+            df_new[col] = pd.Categorical(df_new[col], categories=df_old[col].cat.categories)
+    return df_old, df_new
+
+
+def upsert_orders(df_old, df_new):
+    """Дозагрузка: заменить заказы с совпадающим ID, добавить новые.
+
+    Возвращает (df_all, kept_mask, df_removed, df_added), где kept_mask —
+    bool-массив по строкам df_old. Порядок строк сохраняется: оставшиеся
+    старые строки, затем все строки новой выгрузки.
+    """
+    df_new = df_new.drop_duplicates(subset='ID', keep='last')
+    kept_mask = ~df_old['ID'].isin(df_new['ID']).to_numpy()
+    df_removed = df_old[~kept_mask]
+    df_kept = df_old[kept_mask]
+
+    df_kept, df_added = _align_categoricals(df_kept.copy(), df_new)
+    df_all = pd.concat([df_kept, df_added], ignore_index=True)
+    df_added = df_all.iloc[len(df_kept):]
+
+    old_format = df_old.attrs.get('export_format', 'UNKNOWN')
+    new_format = df_new.attrs.get('export_format', 'UNKNOWN')
+    df_all.attrs['export_format'] = old_format if old_format == new_format else 'MIXED'
+    return df_all, kept_mask, df_removed, df_added
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+core/duplicates.py — NEW-11: почти одинаковые заказы (MinHash-LSH)
+
+Одна и та же работа, заказанная дважды: близкий Текст, то же ЕО (без ЕО —
+ТМ), плановые даты рядом. Попарное сравнение на 500k заказов невозможно,
+поэтому:
+1. Текст нормализуется (регистр, ё, пунктуация) и режется на символьные
+   шинглы; MinHash-подписи считаются по уникальным текстам (у выгрузок
+   это категории — текстов в разы меньше, чем заказов).
+2. LSH: подпись делится на полосы; кандидаты — заказы одного блока
+   (ЕО/ТМ) с совпадающей полосой и датами в окне DUP_WINDOW_DAYS.
+3. Кандидаты проверяются точным сходством Жаккара по шинглам.
+Индекс пар строится один раз на данные сессии (агрегат 'duplicate_pairs'
+в session['agg'], сбрасывается при дозагрузке) и переиспользуется при
+любых фильтрах: метод берёт пары, оба заказа которых в выборке.
+"""
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from core.risk_methods import register_method
+from core.risk_scoring_v2 import _finish, eo_valid_mask, EO_CODE_COL, eo_code_column
+from utils.metrics import timed
+
+# Длина шингла (символов нормализованного текста)
+SHINGLE = 4
+# MinHash: число перестановок = полосы × строки в полосе
+DUP_BANDS = int(os.environ.get('TITAN_DUP_BANDS', '16'))
+DUP_ROWS = int(os.environ.get('TITAN_DUP_ROWS', '4'))
+# Окно плановых дат пары, дней
+DUP_WINDOW_DAYS = int(os.environ.get('TITAN_DUP_WINDOW_DAYS', '30'))
+# Соседей по дате на заказ в одной корзине (ограничивает крупные кластеры)
+DUP_MAX_NEIGHBOURS = int(os.environ.get('TITAN_DUP_MAX_NEIGHBOURS', '100'))
+# Минимальное сходство пары в индексе (нижняя граница порога метода)
+DUP_MIN_SIMILARITY = 0.5
+
+_NON_WORD = re.compile(r'[^0-9a-zа-я]+')
+_PRIME = np.uint64(1000003)
+
+
+def normalize_text(text):
+    """Текст заказа → нижний регистр, ё → е, только буквы/цифры через пробел."""
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return ''
+    return _NON_WORD.sub(' ', str(text).lower().replace('ё', 'е')).strip()
+
+
+def _shingles(texts):
+    """Хэши шинглов всех текстов: (хэши, номер текста) — по возрастанию номера."""
+    padded = [t.ljust(SHINGLE) for t in texts]
+    lengths = np.array([len(t) for t in padded], dtype=np.int64)
+    chars = np.frombuffer(''.join(padded).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    chars = np.concatenate([chars, np.zeros(SHINGLE - 1, dtype=np.uint64)])
+    # Полиномиальный хэш окна из SHINGLE символов (переполнение uint64 — по модулю 2^64)
+    n = len(chars) - (SHINGLE - 1)
+    h = np.zeros(n, dtype=np.uint64)
+    for i in range(SHINGLE):
+        h = h * _PRIME + chars[i:i + n]
+    text_of = np.repeat(np.arange(len(padded)), lengths)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    offset = np.arange(n) - starts[text_of]
+    keep = offset <= lengths[text_of] - SHINGLE
+    return h[keep], text_of[keep]
+
+
+def minhash_signatures(grams, text_of, n_texts, n_perm, seed=0):
+    """MinHash-подписи (n_texts × n_perm): минимум (a·x + b) mod 2^64 по шинглам текста."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=n_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=n_perm, dtype=np.uint64)
+    starts = np.searchsorted(text_of, np.arange(n_texts))
+    sig = np.empty((n_texts, n_perm), dtype=np.uint64)
+    for k in range(n_perm):
+        sig[:, k] = np.minimum.reduceat(grams * a[k] + b[k], starts)
+    return sig
+
+
+def _band_keys(sig, bands, rows):
+    """Ключ полосы для каждого текста: (полосы × тексты) uint64."""
+    keys = np.empty((bands, len(sig)), dtype=np.uint64)
+    for band in range(bands):
+        h = np.zeros(len(sig), dtype=np.uint64)
+        for col in sig[:, band * rows:(band + 1) * rows].T:
+            h = h * _PRIME + col
+        keys[band] = h
+    return keys
+
+
+def _candidate_pairs(block, key, day, window, max_neighbours):
+    """Пары строк одной корзины (блок, ключ полосы) с датами в окне."""
+    # Корзины из одной строки пар не дают — сортируется только остальное
+    _, bucket, counts = np.unique(key * _PRIME + block.astype(np.uint64),
+                                  return_inverse=True, return_counts=True)
+    rows = np.flatnonzero(counts[bucket] > 1)
+    order = rows[np.lexsort((day[rows], bucket[rows]))]
+    bucket_s, day_s = bucket[order], day[order]
+    found = []
+    for d in range(1, max_neighbours + 1):
+        same = (bucket_s[:-d] == bucket_s[d:]) & (day_s[d:] - day_s[:-d] <= window)
+        if not same.any():
+            # Отсортировано по корзине и дате: дальше соседей нет
+            break
+        i = np.flatnonzero(same)
+        found.append((order[i], order[i + d]))
+    if not found:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    a = np.concatenate([f[0] for f in found])
+    b = np.concatenate([f[1] for f in found])
+    return np.minimum(a, b), np.maximum(a, b)
+
+
+def _sorted_unique(values):
+    """np.unique без return_*: сортировка и отбор — у np.unique для int64 путь через хэш в разы медленнее."""
+    values = np.sort(values)
+    return values[np.concatenate([[True], values[1:] != values[:-1]])] if len(values) else values
+
+
+def _block_codes(df):
+    """Блок заказа: код ЕО, для заказов без ЕО — ТМ; -1 — без блока."""
+    block = np.full(len(df), -1, dtype=np.int64)
+    offset = 0
+    eo_col = EO_CODE_COL if EO_CODE_COL in df.columns else eo_code_column(df)
+    if eo_col in df.columns:
+        valid = eo_valid_mask(df).to_numpy(dtype=bool)
+        codes, uniques = pd.factorize(df[eo_col])
+        block = np.where(valid & (codes >= 0), codes, -1)
+        offset = len(uniques)
+    if 'ТМ' in df.columns:
+        codes, _ = pd.factorize(df['ТМ'])
+        block = np.where((block < 0) & (codes >= 0), codes + offset, block)
+    return block
+
+
+@timed()
+def build_duplicate_index(df):
+    """Пары почти одинаковых заказов df: {'a', 'b' — метки индекса, 'sim' — сходство}.
+
+    Сходство — Жаккар по шинглам нормализованного текста (1.0 — одинаковый текст).
+    """
+    empty = {'a': df.index[:0].to_numpy(), 'b': df.index[:0].to_numpy(), 'sim': np.empty(0, dtype=np.float32)}
+    if len(df) < 2 or 'Текст' not in df.columns or 'Начало' not in df.columns:
+        return empty
+
+    text_codes, text_values = pd.factorize(df['Текст'])
+    normalized = [normalize_text(t) for t in text_values]
+    # Разные исходные тексты с одинаковой нормализацией — один текст
+    norm_codes, norm_values = pd.factorize(pd.Series(normalized, dtype=object))
+    text_id = np.where(text_codes >= 0, norm_codes[np.maximum(text_codes, 0)], -1)
+    has_text = np.array([bool(t) for t in norm_values])
+
+    dates = pd.to_datetime(df['Начало'], errors='coerce')
+    day = (dates.to_numpy(dtype='datetime64[D]').astype(np.int64))
+    block = _block_codes(df)
+    rows = np.flatnonzero((text_id >= 0) & (block >= 0) & dates.notna().to_numpy())
+    rows = rows[has_text[text_id[rows]]]
+    # Блоки с одним заказом пар не дают
+    if len(rows):
+        counts = np.bincount(block[rows])
+        rows = rows[counts[block[rows]] > 1]
+    if len(rows) < 2:
+        return empty
+
+    used_texts, local_text = np.unique(text_id[rows], return_inverse=True)
+    grams, text_of = _shingles([norm_values[t] for t in used_texts])
+    sig = minhash_signatures(grams, text_of, len(used_texts), DUP_BANDS * DUP_ROWS)
+    keys = _band_keys(sig, DUP_BANDS, DUP_ROWS)
+
+    pair_codes = []
+    n = len(rows)
+    for band in range(DUP_BANDS):
+        a, b = _candidate_pairs(block[rows], keys[band][local_text], day[rows],
+                                DUP_WINDOW_DAYS, DUP_MAX_NEIGHBOURS)
+        pair_codes.append(a * n + b)
+    pair_codes = _sorted_unique(np.concatenate(pair_codes))
+    if not len(pair_codes):
+        return empty
+    pa, pb = pair_codes // n, pair_codes % n
+
+    # Проверка: точный Жаккар по множествам шинглов (одинаковый текст — 1.0)
+    ta, tb = local_text[pa], local_text[pb]
+    sim = np.ones(len(pa), dtype=np.float32)
+    differ = ta != tb
+    if differ.any():
+        text_pairs, inverse = np.unique(np.stack([np.minimum(ta[differ], tb[differ]),
+                                                  np.maximum(ta[differ], tb[differ])], axis=1),
+                                        axis=0, return_inverse=True)
+        bounds = np.searchsorted(text_of, np.arange(len(used_texts) + 1))
+        sets = {}
+
+        def shingle_set(t):
+            if t not in sets:
+                sets[t] = set(grams[bounds[t]:bounds[t + 1]].tolist())
+            return sets[t]
+
+        jaccard = np.array([len(shingle_set(x) & shingle_set(y)) / len(shingle_set(x) | shingle_set(y))
+                            for x, y in text_pairs], dtype=np.float32)
+        sim[differ] = jaccard[inverse.ravel()]
+
+    keep = sim >= DUP_MIN_SIMILARITY
+    labels = df.index.to_numpy()
+    return {'a': labels[rows[pa[keep]]], 'b': labels[rows[pb[keep]]], 'sim': sim[keep]}
+
+
+def _new11_metrics(df, agg=None):
+    """Наибольшее сходство заказа с другим заказом выборки и число пар в выборке."""
+    index = agg.get('duplicate_pairs') if agg else None
+    if index is None:
+        index = build_duplicate_index(df)
+    best = np.zeros(len(df))
+    if not len(index['sim']) or not df.index.is_unique:
+        return {'similarity': best, 'duplicate_pairs': 0}
+    pa = df.index.get_indexer(index['a'])
+    pb = df.index.get_indexer(index['b'])
+    keep = (pa >= 0) & (pb >= 0)
+    sim = index['sim'][keep].astype(float)
+    np.maximum.at(best, pa[keep], sim)
+    np.maximum.at(best, pb[keep], sim)
+    return {'similarity': best, 'duplicate_pairs': int(keep.sum())}
+
+
+def _new11_kernel(m, threshold):
+    # Сходство = порогу → 5 баллов, полное совпадение → 10; без пары — 0
+    t = threshold / 100
+    raw = 5.0 + 5.0 * (m['similarity'] - t) / (1 - t)
+    return _finish(np.where(m['similarity'] > 0, raw, 0.0))
+
+
+register_method("NEW-11: Дубли заказов", _new11_metrics, _new11_kernel,
+                requires_agg=('duplicate_pairs',), extra=('duplicate_pairs',), stage='score_new11')
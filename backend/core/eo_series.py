@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+core/eo_series.py — NEW-12: всплеск затрат ЕО по месяцам (матрица ЕО × месяц)
+
+C2-M2 считает заказы ЕО за весь период, C1-M6 сравнивает с одной медианой
+по ТМ — ни один не видит насос, у которого месячные затраты вдруг выросли.
+Здесь по данным сессии один раз строится разреженная матрица «объект ×
+месяц» (затраты Fact_N и число заказов; объект — ЕО, для заказов без ЕО —
+ТМ): тройки (строка, месяц, значение) только для непустых ячеек, порядок
+строк ЕО — как у groupby по колонке ЕО. Для каждой непустой ячейки —
+робастный z относительно базы из предыдущих BASELINE_MONTHS месяцев
+(медиана / MAD, пустые месяцы — нули), блоками строк без циклов по ЕО.
+Заказ получает z своей ячейки (больший из затрат и числа заказов).
+
+Матрица — агрегат сессии 'eo_month' (SESSION_AGG_KEYS в core/aggregates.py),
+она же даёт тепловую карту вкладки Оборудование (heatmap_cells).
+"""
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core.risk_methods import register_method
+from core.risk_scoring_v2 import _finish, eo_valid_mask, eo_code_column
+from utils.metrics import timed
+
+# Колонки даты заказа по приоритету (как у тепловой карты)
+DATE_COLUMNS = ('Начало', 'Конец', 'Факт_Начало')
+# База: предыдущие месяцы (скользящее окно) и минимум месяцев в ней
+BASELINE_MONTHS = int(os.environ.get('TITAN_EO_BASELINE_MONTHS', '12'))
+MIN_BASELINE_MONTHS = int(os.environ.get('TITAN_EO_MIN_BASELINE', '6'))
+# Минимум месяцев с заказами в базе — у редко ремонтируемых ЕО базы нет
+MIN_ACTIVE_MONTHS = 3
+# Ячеек (строк × месяцев × окно) в одном блоке вычислений
+CHUNK_CELLS = 4_000_000
+
+# MAD → σ нормального распределения; среднее абсолютное отклонение → σ
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+
+
+def date_column(df):
+    """Первая из DATE_COLUMNS с датами или None."""
+    for col in DATE_COLUMNS:
+        if col in df.columns and df[col].notna().any():
+            return col
+    return None
+
+
+def _nanmedian_rows(w):
+    """Медиана строк с NaN: сортировка (NaN — в конец) и середина непустых.
+
+    Быстрее np.nanmedian (та идёт через маскированные массивы).
+    """
+    s = np.sort(w, axis=1)
+    k = (~np.isnan(w)).sum(axis=1)
+    lo = np.take_along_axis(s, np.maximum((k - 1) // 2, 0)[:, None], axis=1)[:, 0]
+    hi = np.take_along_axis(s, np.minimum(k // 2, w.shape[1] - 1)[:, None], axis=1)[:, 0]
+    return np.where(k > 0, (lo + hi) / 2, np.nan)
+
+
+def _robust_z(values, active, populated_rows, populated_months, min_scale=0.0):
+    """z непустых ячеек плотного блока values (строки × месяцы).
+
+    База ячейки (r, m) — месяцы [m − BASELINE_MONTHS, m) в пределах периода.
+    """
+    rows, months = values.shape
+    pad = np.full((rows, BASELINE_MONTHS), np.nan)
+    padded = np.concatenate([pad, values], axis=1)
+    padded_active = np.concatenate([np.zeros((rows, BASELINE_MONTHS)), active], axis=1)
+    # Окно для месяца m — padded[:, m : m + BASELINE_MONTHS] (предыдущие месяцы)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, BASELINE_MONTHS, axis=1)[:, :months]
+    n_active = np.lib.stride_tricks.sliding_window_view(padded_active, BASELINE_MONTHS, axis=1)[:, :months].sum(axis=-1)
+
+    w = windows[populated_rows, populated_months]
+    # Окна из одних NaN (начало периода) дают NaN — предупреждения не нужны
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = _nanmedian_rows(w)
+        dev = np.abs(w - median[:, None])
+        scale = MAD_SCALE * _nanmedian_rows(dev)
+        scale = np.where(scale > 0, scale, MEAN_AD_SCALE * np.nanmean(dev, axis=1))
+        scale = np.maximum(scale, min_scale)
+        z = (values[populated_rows, populated_months] - median) / np.where(scale > 0, scale, np.nan)
+    enough = ((~np.isnan(w)).sum(axis=1) >= MIN_BASELINE_MONTHS) & (n_active[populated_rows, populated_months] >= MIN_ACTIVE_MONTHS)
+    return np.where(enough, z, np.nan)
+
+
+def _month_codes(df, date_col):
+    """Месяц заказа: год·12 + месяц − 1 (float, NaN — нет даты)."""
+    dates = pd.to_datetime(df[date_col], errors='coerce')
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=float, na_value=np.nan)
+
+
+def _cells_z(cell_row, cell_month, fact, count, n_months):
+    """Робастные z непустых ячеек (z_fact, z_count) — блоками строк.
+
+    Плотный блок собирается только из строк с непустыми ячейками.
+    """
+    z_fact = np.full(len(cell_row), np.nan)
+    z_count = np.full(len(cell_row), np.nan)
+    used_rows, cell_local = np.unique(cell_row, return_inverse=True)
+    chunk = max(1, CHUNK_CELLS // max(n_months * BASELINE_MONTHS, 1))
+    for start in range(0, len(used_rows), chunk):
+        stop = min(start + chunk, len(used_rows))
+        sel = np.flatnonzero((cell_local >= start) & (cell_local < stop))
+        local_rows = cell_local[sel] - start
+        dense_fact = np.zeros((stop - start, n_months))
+        dense_count = np.zeros((stop - start, n_months))
+        dense_fact[local_rows, cell_month[sel]] = fact[sel]
+        dense_count[local_rows, cell_month[sel]] = count[sel]
+        active = dense_count > 0
+        z_fact[sel] = _robust_z(dense_fact, active, local_rows, cell_month[sel])
+        # Число заказов целое — масштаб не меньше одного заказа
+        z_count[sel] = _robust_z(dense_count, active, local_rows, cell_month[sel], min_scale=1.0)
+    return z_fact, z_count
+
+
+@timed()
+def build_eo_month_matrix(df):
+    """Матрица «ЕО/ТМ × месяц» по df и робастные z её непустых ячеек.
+
+    Возвращает словарь (или None без дат/объектов):
+    index — индекс df (сопоставление заказов выборки), order_cell — ячейка
+    заказа (-1 — нет объекта или даты); keys / is_eo — объекты строк;
+    eo_col, date_col, month0 (год·12 + месяц − 1 первого месяца), n_months;
+    тройки ячеек cell_row, cell_month, fact, count (по строке, затем месяцу);
+    z_fact, z_count — робастные z ячеек (NaN — нет базы).
+    """
+    date_col = date_column(df)
+    if date_col is None or 'Fact_N' not in df.columns:
+        return None
+
+    # Строки: ЕО (в порядке groupby по колонке ЕО), затем ТМ заказов без ЕО
+    eo_col = eo_code_column(df)
+    row = np.full(len(df), -1, dtype=np.int64)
+    keys = []
+    n_eo = 0
+    if eo_col in df.columns:
+        valid = eo_valid_mask(df).to_numpy(dtype=bool)
+        codes, uniques = pd.factorize(df[eo_col], sort=True)
+        row = np.where(valid & (codes >= 0), codes, -1)
+        keys = list(uniques)
+        n_eo = len(keys)
+    if 'ТМ' in df.columns:
+        codes, uniques = pd.factorize(df['ТМ'], sort=True)
+        row = np.where((row < 0) & (codes >= 0), codes + n_eo, row)
+        keys += list(uniques)
+
+    month_code = _month_codes(df, date_col)
+    ok = (row >= 0) & ~np.isnan(month_code)
+    if not ok.any():
+        return None
+    month0 = int(np.nanmin(month_code[ok]))
+    n_months = int(np.nanmax(month_code[ok])) - month0 + 1
+    month = np.where(ok, np.nan_to_num(month_code) - month0, -1).astype(np.int64)
+
+    # Разреженные тройки: ключ ячейки = строка · n_months + месяц
+    flat = np.where(ok, row * n_months + month, -1)
+    cells, order_cell = np.unique(flat[ok], return_inverse=True)
+    fact_values = np.nan_to_num(df['Fact_N'].to_numpy(dtype=float, na_value=np.nan)[ok])
+    fact = np.bincount(order_cell, weights=fact_values, minlength=len(cells))
+    count = np.bincount(order_cell, minlength=len(cells)).astype(float)
+    cell_row, cell_month = cells // n_months, cells % n_months
+    full_cell = np.full(len(df), -1, dtype=np.int64)
+    full_cell[ok] = order_cell
+    z_fact, z_count = _cells_z(cell_row, cell_month, fact, count, n_months)
+
+    return {
+        'index': df.index,
+        'order_cell': full_cell,
+        'keys': np.array(keys, dtype=object),
+        'is_eo': np.arange(len(keys)) < n_eo,
+        'eo_col': eo_col,
+        'date_col': date_col,
+        'month0': month0,
+        'n_months': n_months,
+        'cell_row': cell_row,
+        'cell_month': cell_month,
+        'fact': fact,
+        'count': count,
+        'z_fact': z_fact,
+        'z_count': z_count,
+    }
+
+
+@timed()
+def extend_eo_month_matrix(series, df):
+    """Матрица для внешних заказов df поверх матрицы сессии series (она не меняется).
+
+    Заказы df считаются новыми: добавляются к ячейкам своих ЕО/ТМ (в том числе
+    в месяцах после конца периода сессии), база — история сессии. В результате
+    только строки, затронутые df; index / order_cell — по заказам df. ЕО,
+    которого нет в сессии, истории не имеет (order_cell = -1).
+    """
+    keys = series['keys']
+    n_eo = int(series['is_eo'].sum())
+    row = np.full(len(df), -1, dtype=np.int64)
+    valid = np.zeros(len(df), dtype=bool)
+    eo_col = series['eo_col']
+    if eo_col in df.columns:
+        valid = eo_valid_mask(df).to_numpy(dtype=bool)
+        pos = pd.Index(keys[:n_eo]).get_indexer(df[eo_col].astype(object))
+        row = np.where(valid & (pos >= 0), pos, -1)
+    if 'ТМ' in df.columns:
+        pos = pd.Index(keys[n_eo:]).get_indexer(df['ТМ'].astype(object))
+        row = np.where(~valid & (pos >= 0), pos + n_eo, row)
+
+    month_code = (_month_codes(df, series['date_col']) if series['date_col'] in df.columns
+                  else np.full(len(df), np.nan))
+    month = month_code - series['month0']
+    ok = (row >= 0) & (month >= 0)
+    n_months = max(series['n_months'], int(month[ok].max()) + 1 if ok.any() else 0)
+    month = np.where(ok, np.nan_to_num(month), -1).astype(np.int64)
+
+    # Ячейки сессии затронутых строк + заказы df, ключ = строка · n_months + месяц
+    own = np.isin(series['cell_row'], np.unique(row[ok]))
+    flat = np.concatenate([series['cell_row'][own] * n_months + series['cell_month'][own],
+                           row[ok] * n_months + month[ok]])
+    fact_values = (np.nan_to_num(df['Fact_N'].to_numpy(dtype=float, na_value=np.nan)[ok])
+                   if 'Fact_N' in df.columns else np.zeros(int(ok.sum())))
+    cells, inverse = np.unique(flat, return_inverse=True)
+    fact = np.bincount(inverse, weights=np.concatenate([series['fact'][own], fact_values]), minlength=len(cells))
+    count = np.bincount(inverse, weights=np.concatenate([series['count'][own], np.ones(int(ok.sum()))]),
+                        minlength=len(cells))
+    cell_row, cell_month = cells // n_months, cells % n_months
+    order_cell = np.full(len(df), -1, dtype=np.int64)
+    order_cell[ok] = inverse[int(own.sum()):]
+    z_fact, z_count = _cells_z(cell_row, cell_month, fact, count, n_months)
+
+    return {
+        **series,
+        'index': df.index,
+        'order_cell': order_cell,
+        'n_months': n_months,
+        'cell_row': cell_row,
+        'cell_month': cell_month,
+        'fact': fact,
+        'count': count,
+        'z_fact': z_fact,
+        'z_count': z_count,
+    }
+
+
+def order_cells(series, df):
+    """Ячейки матрицы для заказов df (-1 — заказа нет в матрице или у него нет ячейки)."""
+    if series['index'] is df.index:
+        return series['order_cell']
+    pos = series['index'].get_indexer(df.index)
+    return np.where(pos >= 0, series['order_cell'][pos], -1)
+
+
+def heatmap_cells(series, df, keys):
+    """Затраты ЕО keys по месяцам для заказов df: [(ЕО, год, месяц, сумма)].
+
+    Только непустые ячейки, по порядку ЕО (как у groupby), затем месяца.
+    """
+    cell = order_cells(series, df)
+    keep = cell >= 0
+    wanted = pd.Index(series['keys'][series['is_eo']]).isin(list(keys))
+    keep &= np.isin(series['cell_row'][np.maximum(cell, 0)], np.flatnonzero(wanted))
+    if not keep.any():
+        return []
+    fact = np.nan_to_num(df['Fact_N'].to_numpy(dtype=float, na_value=np.nan)[keep])
+    n_cells = len(series['cell_row'])
+    sums = np.bincount(cell[keep], weights=fact, minlength=n_cells)
+    present = np.flatnonzero(np.bincount(cell[keep], minlength=n_cells) > 0)
+    month_code = series['month0'] + series['cell_month'][present]
+    return list(zip(series['keys'][series['cell_row'][present]],
+                    (month_code // 12).tolist(), (month_code % 12 + 1).tolist(), sums[present].tolist()))
+
+
+def _new12_metrics(df, agg=None):
+    """Робастный z ячейки «объект × месяц» заказа (больший из затрат и числа заказов)."""
+    series = agg['eo_month'] if agg and 'eo_month' in agg else build_eo_month_matrix(df)
+    if series is None or not df.index.is_unique:
+        return {'z': np.zeros(len(df))}
+    cell = order_cells(series, df)
+    z = np.fmax(series['z_fact'], series['z_count'])
+    return {'z': np.where(cell >= 0, z[np.maximum(cell, 0)], np.nan)}
+
+
+def _new12_kernel(m, threshold):
+    # z = порогу → 5 баллов, 2×порог → 10; нет базы (NaN) или z ≤ 0 → 0
+    return _finish((m['z'] / threshold) * 5.0)
+
+
+register_method("NEW-12: Всплеск затрат ЕО", _new12_metrics, _new12_kernel,
+                requires_agg=('eo_month',), stage='score_new12')
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+core/grouping.py — Групповые агрегаты на целочисленных кодах
+
+Ключ группировки переводится в коды (cat.codes для category, factorize
+для остальных), меры считаются через np.bincount, медианы — по
+отсортированным сегментам. Значения мер готовятся один раз и
+переиспользуются для всех ключей. Порядок групп и состав (включая
+ненаблюдаемые категории) совпадает с df.groupby(key).
+"""
+
+import numpy as np
+import pandas as pd
+
+# Поддерживаемые функции мер
+MEASURE_FUNCS = ('count', 'sum', 'median', 'size')
+
+# Типовые наборы мер вкладок: кол-во заказов + суммы факт/план
+COST_MEASURES = {'count': ('ID', 'count'), 'fact': ('Fact_N', 'sum'), 'plan': ('Plan_N', 'sum')}
+# Кол-во заказов + сумма факта (ABC-распределение)
+SUM_MEASURES = {'count': ('ID', 'count'), 'sum': ('Fact_N', 'sum')}
+
+
+def group_codes(values, observed=False):
+    """Коды групп (-1 — пропуск) и значения ключей в порядке groupby(sort=True).
+
+    Для category без observed в группы попадают все категории — как у groupby.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy().astype(np.intp)
+        uniques = values.cat.categories
+        if observed:
+            present = np.bincount(codes[codes >= 0], minlength=len(uniques)) > 0
+            remap = np.cumsum(present) - 1
+            codes = np.where(codes >= 0, remap[codes], -1)
+            uniques = uniques[present]
+        return codes, uniques
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype(np.intp), uniques
+
+
+def _prepare_measures(df, measures, mask):
+    """Значения мер: (колонка, функция) → (float-массив с нулями вместо NaN, маска непустых)."""
+    prepared = {}
+    for col, func in measures.values():
+        if func not in MEASURE_FUNCS:
+            raise ValueError(f"Неизвестная функция меры: {func}")
+        if col is None or (col, func) in prepared:
+            continue
+        s = df[col]
+        if func == 'count':
+            # count не требует числовых значений — только непустые ячейки
+            notna = s.notna().to_numpy()
+            vals = None
+        else:
+            vals = pd.to_numeric(s, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            notna = ~np.isnan(vals)
+            vals = np.where(notna, vals, 0.0)
+        if mask is not None:
+            notna = notna[mask]
+            vals = vals[mask] if vals is not None else None
+        prepared[(col, func)] = (vals, notna)
+    return prepared
+
+
+def _segment_median(codes, vals, notna, n_groups):
+    """Медианы по группам: сортировка (код, значение) и середина каждого сегмента."""
+    sel = (codes >= 0) & notna
+    c, v = codes[sel], vals[sel]
+    order = np.lexsort((v, c))
+    c, v = c[order], v[order]
+    counts = np.bincount(c, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    result = np.full(n_groups, np.nan)
+    has = counts > 0
+    lo = starts[has] + (counts[has] - 1) // 2
+    hi = starts[has] + counts[has] // 2
+    result[has] = (v[lo] + v[hi]) / 2
+    return result
+
+
+def grouped_stats(df, keys, measures, mask=None, observed=False):
+    """Несколько ключей × несколько мер за один проход по строкам.
+
+    measures — {имя: (колонка, функция)}, функция: count / sum / median / size
+    (для size колонка не нужна). keys — список ключей (все меры для каждого)
+    или словарь {ключ: [имена мер]}. mask — необязательный bool-массив строк.
+    Возвращает {ключ: {'keys': значения ключа, имя меры: np.ndarray}};
+    ключи, которых нет в df, пропускаются.
+    """
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+    prepared = _prepare_measures(df, measures, mask)
+
+    if not isinstance(keys, dict):
+        keys = {key: list(measures) for key in keys}
+
+    result = {}
+    for key, names in keys.items():
+        if key not in df.columns:
+            continue
+        codes, uniques = group_codes(df[key], observed=observed)
+        if mask is not None:
+            codes = codes[mask]
+            if observed and len(uniques):
+                # После маски часть групп могла опустеть
+                present = np.bincount(codes[codes >= 0], minlength=len(uniques)) > 0
+                remap = np.cumsum(present) - 1
+                codes = np.where(codes >= 0, remap[codes], -1)
+                uniques = uniques[present]
+        n_groups = len(uniques)
+        valid = codes >= 0
+        safe_codes = np.where(valid, codes, 0)
+
+        out = {'keys': uniques}
+        for name in names:
+            col, func = measures[name]
+            if func == 'size':
+                out[name] = np.bincount(codes[valid], minlength=n_groups)
+                continue
+            vals, notna = prepared[(col, func)]
+            if func == 'count':
+                out[name] = np.bincount(safe_codes, weights=(valid & notna), minlength=n_groups).astype(np.int64)
+            elif func == 'sum':
+                out[name] = np.bincount(safe_codes, weights=np.where(valid, vals, 0.0), minlength=n_groups)
+            else:
+                out[name] = _segment_median(codes, vals, notna, n_groups)
+        result[key] = out
+    return result
+
+
+def grouped_frame(df, key, measures, mask=None, observed=False):
+    """То же для одного ключа в виде DataFrame — аналог groupby(key).agg(...).reset_index()."""
+    stats = grouped_stats(df, [key], measures, mask=mask, observed=observed).get(key)
+    if stats is None:
+        return pd.DataFrame(columns=[key] + list(measures))
+    frame = pd.DataFrame({name: stats[name] for name in measures})
+    frame.insert(0, key, np.asarray(stats['keys']))
+    return frame
+
+
+def stats_to_dict(stats, measure, skip_zero=None):
+    """Массив меры → словарь {значение ключа: число}.
+
+    skip_zero — имя меры-счётчика: группы с нулём по ней пропускаются.
+    """
+    keys = stats['keys']
+    vals = stats[measure]
+    if skip_zero is not None:
+        nonzero = stats[skip_zero] > 0
+        keys = keys[nonzero]
+        vals = vals[nonzero]
+    return dict(zip(keys.tolist() if hasattr(keys, 'tolist') else list(keys), vals.tolist()))
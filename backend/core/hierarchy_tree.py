@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+core/hierarchy_tree.py — Дерево свёрток по иерархии объектов
+
+БЕ → ЗАВОД → ПРОИЗВОДСТВО → ЦЕХ → УСТАНОВКА → ЕО.
+Структура дерева (листья, кол-во, Plan_N, Fact_N, перерасход) строится
+один раз при загрузке. Риск-слой считается по листьям (np.bincount)
+и сворачивается вверх; при смене порогов пересчитывается только он.
+"""
+
+import json
+import numpy as np
+import pandas as pd
+
+from config.constants import HIERARCHY_LEVELS
+
+# Сколько наборов порогов держать в кэше риск-слоя
+RISK_CACHE_SIZE = 8
+
+LEAF_MEASURES = ['count', 'plan', 'fact', 'overrun']
+
+RISK_CATEGORIES = [('Красный', 'red'), ('Жёлтый', 'yellow'), ('Серый', 'grey'), ('Зелёный', 'green')]
+
+
+def build_hierarchy_index(df):
+    """Индекс иерархии: код листа для каждой строки + базовые суммы по листьям."""
+    levels = [lvl['key'] for lvl in HIERARCHY_LEVELS if lvl['key'] in df.columns]
+    if not levels or len(df) == 0:
+        return {'levels': levels, 'leaf_codes': np.zeros(len(df), dtype=np.int64),
+                'leaves': pd.DataFrame(columns=levels + LEAF_MEASURES)}
+
+    grouped = df.groupby(levels, observed=True, dropna=False, sort=True)
+    leaf_codes = grouped.ngroup().to_numpy()
+    leaves = grouped.size().reset_index(name='count')
+    for m, vals in _leaf_measures(df, leaf_codes, len(leaves)).items():
+        leaves[m] = vals
+
+    return {'levels': levels, 'leaf_codes': leaf_codes, 'leaves': leaves}
+
+
+def _leaf_measures(df, codes, n_leaves):
+    plan = df['Plan_N'].to_numpy(dtype=float) if 'Plan_N' in df.columns else np.zeros(len(df))
+    fact = df['Fact_N'].to_numpy(dtype=float) if 'Fact_N' in df.columns else np.zeros(len(df))
+    return {
+        'count': np.bincount(codes, minlength=n_leaves).astype(float),
+        'plan': np.bincount(codes, weights=np.nan_to_num(plan), minlength=n_leaves),
+        'fact': np.bincount(codes, weights=np.nan_to_num(fact), minlength=n_leaves),
+        'overrun': np.bincount(codes, weights=(fact > plan).astype(float), minlength=n_leaves),
+    }
+
+
+def update_hierarchy_index(index, kept_mask, df_removed, df_added):
+    """Дозагрузка: вычесть ушедшие строки из листьев и добавить новые.
+
+    kept_mask — bool-массив по строкам старого DataFrame (True — строка осталась),
+    df_removed — ушедшие строки в исходном порядке, df_added — новые строки
+    (в итоговом DataFrame идут после оставшихся). Стоимость пропорциональна
+    числу новых/ушедших строк и листьев, а не истории.
+    """
+    levels = index['levels']
+    leaves = index['leaves'].copy()
+    old_codes = index['leaf_codes']
+    n_leaves = len(leaves)
+
+    removed_codes = old_codes[~kept_mask]
+    if len(removed_codes):
+        removed = _leaf_measures(df_removed, removed_codes, n_leaves)
+        for m, vals in removed.items():
+            leaves[m] = leaves[m].to_numpy(dtype=float) - vals
+
+    added = build_hierarchy_index(df_added)
+    new_codes = np.zeros(0, dtype=np.int64)
+    if len(added['leaves']):
+        key_to_leaf = {k: i for i, k in enumerate(leaves[levels].itertuples(index=False, name=None))}
+        mapping = np.empty(len(added['leaves']), dtype=np.int64)
+        new_rows = []
+        for j, key in enumerate(added['leaves'][levels].itertuples(index=False, name=None)):
+            leaf = key_to_leaf.get(key)
+            if leaf is None:
+                leaf = n_leaves + len(new_rows)
+                new_rows.append(dict(zip(levels, key), count=0, plan=0.0, fact=0.0, overrun=0))
+            mapping[j] = leaf
+        if new_rows:
+            leaves = pd.concat([leaves, pd.DataFrame(new_rows)], ignore_index=True)
+        for m in LEAF_MEASURES:
+            vals = leaves[m].to_numpy(dtype=float)
+            np.add.at(vals, mapping, added['leaves'][m].to_numpy(dtype=float))
+            leaves[m] = vals
+        new_codes = mapping[added['leaf_codes']]
+
+    return {'levels': levels, 'leaf_codes': np.concatenate([old_codes[kept_mask], new_codes]), 'leaves': leaves}
+
+
+def compute_risk_layer(index, df_scored):
+    """Риск-суммы по листьям для уже проскоренного DataFrame (строки в том же порядке)."""
+    codes = index['leaf_codes']
+    n_leaves = len(index['leaves'])
+    layer = pd.DataFrame(index=range(n_leaves))
+    if n_leaves == 0:
+        return layer
+
+    priority = df_scored['Priority_Score'].to_numpy(dtype=float)
+    layer['score_sum'] = np.bincount(codes, weights=priority, minlength=n_leaves)
+    layer['risk_count'] = np.bincount(codes, weights=(df_scored['Risk_Sum'].to_numpy(dtype=float) > 0), minlength=n_leaves)
+    category = df_scored['Risk_Category'].to_numpy()
+    for cat_name, cat_key in RISK_CATEGORIES:
+        layer[cat_key] = np.bincount(codes, weights=(category == cat_name), minlength=n_leaves)
+    return layer
+
+
+def _make_node(name, level, row, risk_row):
+    node = {
+        "name": str(name),
+        "level": level,
+        "count": int(row['count']),
+        "plan": float(row['plan']),
+        "fact": float(row['fact']),
+        "dev": float(row['fact'] - row['plan']),
+        "overrun_count": int(row['overrun']),
+        "children": {},
+    }
+    if risk_row is not None:
+        node["risk"] = {
+            "score_sum": round(float(risk_row['score_sum']), 2),
+            "risk_count": int(risk_row['risk_count']),
+            **{key: int(risk_row[key]) for _, key in RISK_CATEGORIES},
+        }
+    return node
+
+
+def rollup_tree(index, risk_layer=None):
+    """Свернуть листья вверх по уровням — вложенное дерево со суммами на каждом узле."""
+    levels = index['levels']
+    leaves = index['leaves']
+    measures = LEAF_MEASURES
+    table = leaves[levels + measures].copy()
+    if risk_layer is not None and len(risk_layer.columns) > 0:
+        risk_cols = list(risk_layer.columns)
+        table[risk_cols] = risk_layer.to_numpy()
+    else:
+        risk_cols = []
+        risk_layer = None
+    sum_cols = measures + risk_cols
+    # Листья, опустевшие после дозагрузки, в дерево не попадают
+    table = table[table['count'] > 0]
+
+    totals = table[sum_cols].sum()
+    root = _make_node('Все', None, totals, totals if risk_layer is not None else None)
+
+    for depth in range(1, len(levels) + 1):
+        keys = levels[:depth]
+        # observed=True: у category-уровней иначе декартово произведение категорий
+        grp = table.groupby(keys, observed=True, dropna=False, sort=True)[sum_cols].sum().reset_index()
+        for rec in grp.to_dict('records'):
+            parent = root
+            for key in keys[:-1]:
+                parent = parent['children'][str(rec[key])]
+            name = rec[keys[-1]]
+            parent['children'][str(name)] = _make_node(
+                name, keys[-1], rec, rec if risk_layer is not None else None
+            )
+    return root
+
+
+def thresholds_key(thresholds):
+    """Стабильный ключ набора порогов для кэша риск-слоя."""
+    return json.dumps(thresholds, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def get_hierarchy_tree(session, thresholds):
+    """Дерево свёрток сессии для набора порогов (риск-слой кэшируется по порогам)."""
+    from core.risk_scoring_v2 import apply_risk_scoring_v2
+    from core.risk_methods import required_aggregates
+    from core.aggregates import session_aggregates
+
+    state = session.get('hierarchy')
+    if state is None:
+        state = {'index': build_hierarchy_index(session['df']), 'trees': {}}
+        session['hierarchy'] = state
+
+    key = thresholds_key(thresholds)
+    tree = state['trees'].get(key)
+    if tree is None:
+        # Агрегаты по всей сессии (индекс дублей) — в session['agg'], один раз
+        session_aggregates(session['agg'], session['df'], required_aggregates())
+        df_scored, _ = apply_risk_scoring_v2(session['df'], session['agg'], thresholds)
+        tree = rollup_tree(state['index'], compute_risk_layer(state['index'], df_scored))
+        while len(state['trees']) >= RISK_CACHE_SIZE:
+            state['trees'].pop(next(iter(state['trees'])))
+        state['trees'][key] = tree
+    return tree
+
+
+def get_subtree(tree, path, depth=1):
+    """Узел по пути (список названий от корня) с детьми до глубины depth.
+
+    Возвращает None, если путь не найден.
+    """
+    node = tree
+    for name in path:
+        node = node['children'].get(str(name))
+        if node is None:
+            return None
+    return _serialize_node(node, depth)
+
+
+def _serialize_node(node, depth):
+    result = {k: v for k, v in node.items() if k != 'children'}
+    result['n_children'] = len(node['children'])
+    if depth > 0:
+        children = sorted(node['children'].values(), key=lambda n: n['fact'], reverse=True)
+        result['children'] = [_serialize_node(ch, depth - 1) for ch in children]
+    return result
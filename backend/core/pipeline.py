@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+core/pipeline.py — Общий проход вкладок: фильтры → агрегаты → скоринг
+
+Разбор параметров filters/thresholds и один проход фильтрации и
+риск-скоринга, результат которого используют построители вкладок
+(build_* в api/routes_*.py) — по отдельности или все сразу (/api/dashboard).
+"""
+
+import json
+
+from utils.filters import apply_hierarchy_filters, apply_extra_filters
+from core.aggregates import compute_aggregates, session_aggregates, frozen_aggregates, SESSION_AGG_KEYS
+from core.risk_scoring_v2 import apply_risk_scoring_v2
+from core.risk_methods import required_aggregates
+from core.baseline_store import history_aggregates
+from config.constants import METHODS_RISK
+from utils.cancellation import checkpoint
+
+DEFAULT_THRESHOLDS = {m: info['threshold_default'] for m, info in METHODS_RISK.items()}
+
+
+def parse_filters(filters):
+    """Фильтры запроса: JSON-строка или словарь; ошибка разбора → {}."""
+    if isinstance(filters, dict):
+        return filters
+    try:
+        f = json.loads(filters)
+    except Exception:
+        return {}
+    return f if isinstance(f, dict) else {}
+
+
+def merge_thresholds(thresholds):
+    """Пороги запроса (JSON-строка или словарь) поверх порогов по умолчанию."""
+    try:
+        thresh = thresholds if isinstance(thresholds, dict) else json.loads(thresholds)
+        return {**DEFAULT_THRESHOLDS, **thresh}
+    except Exception:
+        return DEFAULT_THRESHOLDS
+
+
+def filter_state(f, thresh):
+    """Состояние фильтров сессии для поколений отмены (utils/cancellation.py).
+
+    Фильтры и пороги; quick_filters и параметры страниц — вид отдельной
+    вкладки, а не состояние сессии, и в него не входят.
+    """
+    f = {k: v for k, v in f.items() if k != 'quick_filters'}
+    return json.dumps([f, thresh], sort_keys=True, ensure_ascii=False, default=str)
+
+
+def uses_history(f):
+    """Фильтр baseline='history': база C1-M6 / C2-M2 — историческая (core/baseline_store.py)."""
+    return f.get('baseline') == 'history'
+
+
+def apply_baseline(agg, df_f, f):
+    """При baseline='history' — медианы ТМ и счётчики ЕО из исторической базы.
+
+    ТМ, которых в базе нет, остаются с медианой по выборке.
+    """
+    if not uses_history(f):
+        return agg
+    history = history_aggregates(df_f)
+    if 'median_by_tm' in history:
+        agg['median_by_tm'] = {**agg.get('median_by_tm', {}), **history['median_by_tm']}
+    if 'history_count_by_eo' in history:
+        agg['history_count_by_eo'] = history['history_count_by_eo']
+    return agg
+
+
+def filter_df(df, f):
+    """Иерархические и дополнительные фильтры."""
+    hierarchy = f.get('hierarchy', {})
+    extra = {k: v for k, v in f.items() if k not in ('hierarchy', 'baseline')}
+    df_f = apply_hierarchy_filters(df, hierarchy)
+    return apply_extra_filters(df_f, extra)
+
+
+def filter_and_score(df, f, thresholds, session_agg=None):
+    """Фильтры → агрегаты по выборке → скоринг v2.
+
+    Агрегаты — только объявленные методами реестра (required_aggregates).
+    session_agg — агрегаты сессии (session['agg']): агрегаты по всем данным
+    (SESSION_AGG_KEYS, например индекс дублей NEW-11) берутся из них и
+    строятся один раз; без session_agg — по выборке. Фильтр baseline='history'
+    — база C1-M6 / C2-M2 из исторической базы загрузок (apply_baseline).
+    Между этапами — checkpoint(): вытесненный расчёт вкладки прерывается.
+    Возвращает словарь: filtered (до скоринга), scored, agg, scoring_info.
+    """
+    df_f = filter_df(df, f)
+    checkpoint()
+    keys = required_aggregates()
+    if session_agg is None:
+        agg = compute_aggregates(df_f, keys)
+    else:
+        agg = compute_aggregates(df_f, [k for k in keys if k not in SESSION_AGG_KEYS])
+        agg.update(session_aggregates(session_agg, df, keys))
+    apply_baseline(agg, df_f, f)
+    checkpoint()
+    df_scored, scoring_info = apply_risk_scoring_v2(df_f, agg, thresholds)
+    return {'filtered': df_f, 'scored': df_scored, 'agg': agg, 'scoring_info': scoring_info}
+
+
+def score_batch(df, thresholds, df_all, session_agg, f=None):
+    """Скоринг внешних заказов df (prepare_batch) с базой — данными сессии.
+
+    Агрегаты — замороженные агрегаты сессии (frozen_aggregates): пакет не
+    сдвигает медианы ТМ и счётчики ЕО и не меняет сессию. f — только
+    baseline='history' (историческая база вместо сессии).
+    Возвращает (scored, scoring_info), как apply_risk_scoring_v2.
+    """
+    agg = frozen_aggregates(session_agg, df_all, df, required_aggregates())
+    apply_baseline(agg, df, f or {})
+    return apply_risk_scoring_v2(df, agg, thresholds)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+core/risk_methods.py — Реестр методов риск-скоринга
+
+Метод регистрируется один раз (register_method) и объявляет:
+- requires_fields — колонки, без которых он не считается (по умолчанию
+  из METHODS_RISK; кортеж в списке — «любая из колонок»);
+- requires_agg — ключи агрегатов выборки (core/aggregates.AGG_KEYS);
+- metrics(df, agg) → словарь массивов, не зависящих от порога;
+- kernel(метрики, порог) → балл 0-10 (векторная NumPy-арифметика);
+- extra — ключи метрик, которые отдаются в scoring_info (orders_without_eo).
+Движок (apply_risk_scoring_v2) считает только выбранные методы, агрегаты —
+только объявленные ими, метод без входных колонок пропускается (балл 0).
+Новый метод — регистрация здесь же и описание для интерфейса (info,
+попадает в METHODS_RISK); маршруты берут список методов из METHODS_RISK.
+"""
+
+from config.constants import METHODS_RISK
+
+# Имя метода → описание; порядок — порядок регистрации (= METHODS_RISK)
+RISK_METHODS = {}
+
+
+def register_method(name, metrics, kernel, requires_fields=None, requires_agg=(), extra=(),
+                    stage=None, info=None):
+    """Зарегистрировать метод.
+
+    info — описание для интерфейса (desc, threshold_default, weight, ...) для
+    метода, которого ещё нет в METHODS_RISK. stage — имя этапа в метриках
+    времени (по умолчанию score_<имя>).
+    """
+    if info is not None:
+        METHODS_RISK.setdefault(name, info)
+    if name not in METHODS_RISK:
+        raise ValueError(f"Метод {name!r} не описан в METHODS_RISK (передайте info)")
+    if requires_fields is None:
+        requires_fields = METHODS_RISK[name].get('requires_fields', [])
+    RISK_METHODS[name] = {
+        'name': name,
+        'metrics': metrics,
+        'kernel': kernel,
+        'requires_fields': list(requires_fields),
+        'requires_agg': tuple(requires_agg),
+        'extra': tuple(extra),
+        'stage': stage or f"score_{name}",
+    }
+    return RISK_METHODS[name]
+
+
+def select_methods(methods=None):
+    """Описания выбранных методов (по умолчанию — все) в порядке METHODS_RISK."""
+    wanted = None if methods is None else set(methods)
+    return [RISK_METHODS[name] for name in METHODS_RISK
+            if name in RISK_METHODS and (wanted is None or name in wanted)]
+
+
+def missing_fields(spec, df):
+    """Объявленные колонки метода, которых нет в df."""
+    missing = []
+    for field in spec['requires_fields']:
+        options = field if isinstance(field, (tuple, list)) else (field,)
+        if not any(col in df.columns for col in options):
+            missing.append(' | '.join(options))
+    return missing
+
+
+def required_aggregates(methods=None):
+    """Ключи агрегатов, нужные выбранным методам."""
+    keys = []
+    for spec in select_methods(methods):
+        keys.extend(k for k in spec['requires_agg'] if k not in keys)
+    return keys
@@ -1,17 +1,23 @@
 # -*- coding: utf-8 -*-
 """
-core/risk_scoring.py — Логика методов риск-скоринга (6 методов)
+core/risk_scoring.py — Логика методов риск-скоринга (бинарные флаги v1)
+
+Сравнения v1 сохранены как есть (строгое «>», Plan_N = 0 считается как 1).
+Методы без логики v1 (добавленные в реестр core/risk_methods.py позже)
+флагуются по ядру реестра: балл ≥ 5, т.е. значение на пороге и выше.
 """
 
+import numpy as np
 import pandas as pd
 from config.constants import METHODS_RISK
-from core.risk_scoring_v2 import is_empty_eo_mask
+from core.risk_methods import RISK_METHODS, missing_fields
+from core.risk_scoring_v2 import eo_valid_mask
 
 
 def _check_problem_equipment(df, threshold, agg):
     """C2-M2: Проблемное оборудование (только по ЕО).
 
-    Использует единую векторизованную фильтрацию is_empty_eo_mask.
+    Использует предвычисленную маску валидности ЕО (eo_valid_mask).
     """
     result = pd.Series(False, index=df.index)
     if not agg:
@@ -24,7 +30,7 @@ def _check_problem_equipment(df, threshold, agg):
     if eo_col not in df.columns:
         return result
 
-    has_eo = ~is_empty_eo_mask(df[eo_col])
+    has_eo = eo_valid_mask(df)
     eo_count = df[eo_col].map(count_by_eo).fillna(0)
     result = has_eo & (eo_count > threshold)
 
@@ -57,14 +63,28 @@ def _check_december_formal(df, threshold):
     return result.fillna(False)
 
 
+def _registry_logic(name, agg):
+    """Флаг по ядру реестра (для методов без логики v1)."""
+    spec = RISK_METHODS.get(name)
+
+    def logic(d, p):
+        if spec is None or missing_fields(spec, d):
+            return pd.Series(False, index=d.index)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = spec['kernel'](spec['metrics'](d, agg), p)
+        return pd.Series(score >= 5.0, index=d.index)
+    return logic
+
+
 def get_logic(name, agg=None, thresholds=None):
-    """Получить функцию логики для метода."""
+    """Получить функцию логики для метода: (df, порог) → pd.Series[bool]."""
     logic = {
         "C1-M1: Перерасход бюджета":
             lambda d, p: (d['Fact_N'] / d['Plan_N'].replace(0, 1) - 1) * 100 > p,
         "C1-M6: Аномалия по истории ТМ":
             lambda d, p: (
-                d['Fact_N'] > d['ТМ'].map(agg['median_by_tm']).fillna(0) * (p / 100)
+                # ТМ — category: map даёт category медиан, fillna(0) на ней падает
+                d['Fact_N'] > d['ТМ'].map(agg['median_by_tm']).astype(float).fillna(0) * (p / 100)
                 if agg and 'median_by_tm' in agg
                 else pd.Series(False, index=d.index)
             ),
@@ -84,7 +104,7 @@ def get_logic(name, agg=None, thresholds=None):
                 else pd.Series(False, index=d.index)
             )
     }
-    return logic.get(name, lambda d, p: pd.Series(False, index=d.index))
+    return logic.get(name) or _registry_logic(name, agg)
 
 
 def apply_risk_scoring(df, agg, thresholds):
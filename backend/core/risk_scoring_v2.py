@@ -7,12 +7,36 @@ Priority_Score = Methods_Total × Multiplier + DQ_Risk × 0.8
 Категории: Красный >7, Жёлтый 4-7, Серый 1-4, Зелёный <1
 """
 
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 from config.constants import METHODS_RISK
-
-# Множитель по количеству сработавших методов
+from core.risk_methods import register_method, select_methods, missing_fields
+from utils.metrics import timed, record
+from utils.cancellation import checkpoint
+from utils.profiling import profiled
+
+# Потоков на расчёт методов одного скоринга (методы читают разные колонки,
+# арифметика NumPy/pandas отпускает GIL); 1 — последовательно
+SCORING_WORKERS = int(os.environ.get('TITAN_SCORING_WORKERS', str(min(4, os.cpu_count() or 1))))
+# С какого числа строк считать методы параллельно (на малых выборках пул дороже)
+SCORING_PARALLEL_MIN_ROWS = int(os.environ.get('TITAN_SCORING_PARALLEL_ROWS', '100000'))
+
+# Пулы потоков скоринга по числу потоков: общие для всех запросов, создаются
+# при первом обращении (обычно один — SCORING_WORKERS)
+_pools: dict = {}
+_pools_lock = threading.Lock()
+
+# Множитель по количеству сработавших методов. Методов в реестре 8 (NEW-11,
+# NEW-12), но множитель насыщается на 6: 7 и 8 методов — тот же ×3.0, чтобы
+# Priority_Score не менял шкалу категорий с добавлением методов
 MULTIPLIERS = {0: 0.0, 1: 1.0, 2: 1.3, 3: 1.7, 4: 2.2, 5: 2.5, 6: 3.0}
+MAX_MULTIPLIED_METHODS = max(MULTIPLIERS)
 
 EMPTY_EO_VALUES = {
     'Н/Д', 'н/д', 'НД', 'нд',
@@ -29,8 +53,12 @@ def is_empty_eo_mask(series):
     Возвращает pd.Series[bool] — True где ЕО пустое.
     Фильтрует: NaN, None, пустые строки, Н/Д, НД, Не присвоено,
     ПУСТО, null, 0, -, строки из одних нулей, длина < 3.
-    Без .apply() — полностью векторизовано.
+    Без .apply() — полностью векторизовано; у category — по категориям.
     """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        empty_cats = is_empty_eo_mask(pd.Series(series.cat.categories)).to_numpy()
+        codes = series.cat.codes.to_numpy()
+        return pd.Series(np.where(codes >= 0, empty_cats[codes], True), index=series.index)
     # NaN/None → пустое
     is_na = series.isna()
     # Приведение к строке + strip
@@ -61,6 +89,72 @@ def _is_empty_eo(val):
     return False
 
 
+# Колонки, предвычисленные при загрузке (add_eo_columns): валидность кода ЕО,
+# валидность наименования ЕО и код ЕО ('' для пустых). Служебные — в экспорт не идут.
+EO_VALID_COL = '_EO_VALID'
+EO_NAME_VALID_COL = '_EO_NAME_VALID'
+EO_CODE_COL = '_EO_CODE'
+
+
+def eo_code_column(df):
+    """Колонка кода ЕО: EQUNR_Код, если есть, иначе ЕО."""
+    return 'EQUNR_Код' if 'EQUNR_Код' in df.columns else 'ЕО'
+
+
+def add_eo_columns(df):
+    """Один раз при загрузке: _EO_VALID, _EO_NAME_VALID (bool) и _EO_CODE (category).
+
+    Дальше вкладки, агрегаты и скоринг читают готовые маски вместо
+    повторных строковых проходов is_empty_eo_mask по колонке ЕО.
+    """
+    eo_col = eo_code_column(df)
+    if eo_col in df.columns:
+        valid = ~is_empty_eo_mask(df[eo_col])
+        df[EO_VALID_COL] = valid.to_numpy()
+        df[EO_CODE_COL] = df[eo_col].astype(str).where(valid, '').astype('category')
+    else:
+        df[EO_VALID_COL] = False
+        df[EO_CODE_COL] = pd.Categorical([''] * len(df))
+    if 'ЕО' in df.columns:
+        df[EO_NAME_VALID_COL] = (~is_empty_eo_mask(df['ЕО'])).to_numpy()
+    else:
+        df[EO_NAME_VALID_COL] = False
+    return df
+
+
+def eo_valid_mask(df):
+    """pd.Series[bool] — True где у заказа реальное ЕО.
+
+    Берётся из _EO_VALID; для кадров без неё — is_empty_eo_mask по колонке кода.
+    """
+    if EO_VALID_COL in df.columns:
+        return df[EO_VALID_COL]
+    eo_col = eo_code_column(df)
+    if eo_col not in df.columns:
+        return pd.Series(False, index=df.index)
+    return ~is_empty_eo_mask(df[eo_col])
+
+
+def row_eo_code(row):
+    """Код ЕО строки (EQUNR_Код) для вывода; '' если пустой."""
+    if 'EQUNR_Код' not in row.index:
+        return ''
+    if EO_CODE_COL in row.index:
+        return str(row[EO_CODE_COL])
+    val = str(row['EQUNR_Код'])
+    return '' if _is_empty_eo(val) else val
+
+
+def row_eo_name(row):
+    """Наименование ЕО строки для вывода; '' если пустое."""
+    if 'ЕО' not in row.index:
+        return ''
+    val = str(row['ЕО'])
+    if EO_NAME_VALID_COL in row.index:
+        return val if row[EO_NAME_VALID_COL] else ''
+    return '' if _is_empty_eo(val) else val
+
+
 def linear_score(value, threshold):
     """Линейный скоринг: value=threshold → 5, 2×threshold → 10."""
     if threshold <= 0 or pd.isna(value):
@@ -69,107 +163,196 @@ def linear_score(value, threshold):
     return min(max(score, 0.0), 10.0)
 
 
-def _score_c1m1(df, threshold):
-    """C1-M1: Перерасход бюджета — непрерывный балл."""
+# ── Методы: метрики (не зависят от порога) и ядро балла по порогу ──
+# Ядро — чистая NumPy-арифметика: порог может быть числом или вектором
+# (метрики тогда — столбцы (n, 1)), так что кривая чувствительности по сетке
+# порогов считается одним broadcast-вычислением (core/risk_sweep.py).
+# Методы регистрируются в реестре core/risk_methods.py (внизу раздела).
+
+def _finish(raw):
+    """Балл 0-10: NaN → 0, ±inf → граница."""
+    return np.nan_to_num(np.clip(raw, 0, 10), nan=0.0)
+
+
+def _c1m1_metrics(df, agg=None):
     plan = df['Plan_N'].replace(0, np.nan)
     pct_overrun = ((df['Fact_N'] / plan) - 1) * 100
-    pct_overrun = pct_overrun.clip(lower=0).fillna(0)
-    scores = (pct_overrun / threshold) * 5.0
-    return scores.clip(0, 10).fillna(0)
+    return {'pct_overrun': pct_overrun.clip(lower=0).fillna(0).to_numpy(dtype=float)}
 
 
-def _score_c1m6(df, threshold, agg):
-    """C1-M6: Аномалия по истории ТМ — непрерывный балл."""
-    scores = pd.Series(0.0, index=df.index)
+def _c1m1_kernel(m, threshold):
+    return _finish((m['pct_overrun'] / threshold) * 5.0)
+
+
+def _c1m6_metrics(df, agg=None):
     if not agg or 'median_by_tm' not in agg:
-        return scores
-    median_mapped = df['ТМ'].map(agg['median_by_tm']).fillna(0)
+        return {'fact': np.zeros(len(df)), 'median': np.zeros(len(df))}
+    median_mapped = df['ТМ'].map(agg['median_by_tm']).astype(float).fillna(0)
+    return {'fact': df['Fact_N'].to_numpy(dtype=float), 'median': median_mapped.to_numpy(dtype=float)}
+
+
+def _c1m6_kernel(m, threshold):
     # ratio = Fact_N / (median * threshold/100)
-    denom = median_mapped * (threshold / 100)
-    denom = denom.replace(0, np.nan)
-    ratio = df['Fact_N'] / denom
+    denom = m['median'] * (threshold / 100)
+    denom = np.where(denom == 0, np.nan, denom)
+    ratio = m['fact'] / denom
     # ratio=1 значит на пороге → 5 баллов, ratio=2 → 10 баллов
-    scores = (ratio * 5.0).fillna(0).clip(0, 10)
-    return scores
+    return _finish(ratio * 5.0)
 
 
-def _score_c1m9(df):
-    """C1-M9: Незавершённые работы — бинарный (0 или 5)."""
+def _c1m9_metrics(df, agg=None):
     mask = df['STAT'].str.contains(
         'ОТКР|Внутреннее планирование|В работе',
         na=False, regex=True
     )
-    return mask.astype(float) * 5.0
-
-
-def _score_c2m2(df, threshold, agg):
-    """C2-M2: Проблемное оборудование — непрерывный балл. Только заказы с реальным ЕО.
+    return {'score': mask.to_numpy(dtype=float) * 5.0}
 
-    Жёсткая фильтрация: все строки где ЕО пустое, None, NaN, nan, Н/Д, НД,
-    Не присвоено, пусто, null, 0, -, из одних нулей, длина < 3 — ИСКЛЮЧАЮТСЯ.
 
-    Возвращает кортеж (scores, orders_without_eo).
-    """
-    scores = pd.Series(0.0, index=df.index)
-    orders_without_eo = 0
+def _c1m9_kernel(m, threshold=None):
+    # Бинарный метод — порог не влияет
+    return m['score']
 
-    if not agg:
-        return scores, orders_without_eo
 
-    eo_col = 'EQUNR_Код' if 'EQUNR_Код' in df.columns else 'ЕО'
+def _c2m2_metrics(df, agg=None):
+    """Число заказов по ЕО (только строки с реальным ЕО) и маска реального ЕО."""
+    zeros = np.zeros(len(df))
+    result = {'eo_count': zeros, 'has_eo': zeros, 'orders_without_eo': 0}
+    eo_col = eo_code_column(df)
     if eo_col not in df.columns:
-        return scores, orders_without_eo
+        return result
 
-    # Жёсткая фильтрация — векторизованная (без .apply)
-    has_eo = ~is_empty_eo_mask(df[eo_col])
-    orders_without_eo = int((~has_eo).sum())
+    # Жёсткая фильтрация — готовая маска _EO_VALID (без строковых проходов)
+    has_eo = eo_valid_mask(df)
+    result['orders_without_eo'] = int((~has_eo).sum())
 
     # Пересчитываем count_by_eo ТОЛЬКО для строк с реальным ЕО
-    df_valid_eo = df[has_eo]
-    if len(df_valid_eo) == 0:
-        return scores, orders_without_eo
-    valid_count_by_eo = df_valid_eo[eo_col].value_counts().to_dict()
+    if not has_eo.any():
+        return result
+    history = agg.get('history_count_by_eo') if agg else None
+    if history is not None:
+        # Историческая база (core/baseline_store.py): заказы ЕО по всем загрузкам
+        eo = df[eo_col]
+        if isinstance(eo.dtype, pd.CategoricalDtype):
+            by_cat = np.array([history.get(str(c), 0) for c in eo.cat.categories] + [0], dtype=float)
+            mapped = by_cat[eo.cat.codes.to_numpy()]  # код -1 (NaN) → последний элемент, 0
+        else:
+            mapped = eo.astype(str).map(history).astype(float).fillna(0).to_numpy()
+        eo_count = np.where(has_eo.to_numpy(), mapped, 0.0)
+    elif EO_CODE_COL in df.columns:
+        codes = df[EO_CODE_COL].cat.codes.to_numpy()
+        valid = has_eo.to_numpy()
+        counts = np.bincount(codes[valid], minlength=len(df[EO_CODE_COL].cat.categories))
+        eo_count = np.where(valid, counts[codes], 0).astype(float)
+    else:
+        valid_count_by_eo = df.loc[has_eo, eo_col].value_counts().to_dict()
+        eo_count = df[eo_col].map(valid_count_by_eo).astype(float).fillna(0).to_numpy()
+    result['eo_count'] = eo_count
+    result['has_eo'] = has_eo.to_numpy(dtype=float)
+    return result
 
-    eo_count = df[eo_col].map(valid_count_by_eo).fillna(0)
-    raw_scores = (eo_count / threshold) * 5.0
-    scores = (raw_scores * has_eo.astype(float)).clip(0, 10).fillna(0)
-    return scores, orders_without_eo
 
+def _c2m2_kernel(m, threshold):
+    raw_scores = (m['eo_count'] / threshold) * 5.0
+    return _finish(raw_scores * m['has_eo'])
 
-def _score_new9(df, threshold):
-    """NEW-9: Формальное закрытие в декабре — непрерывный балл."""
-    scores = pd.Series(0.0, index=df.index)
+
+def _new9_metrics(df, agg=None):
+    zeros = np.zeros(len(df))
     required = ['Факт_Конец', 'Конец', 'Факт_Длит', 'План_Длит']
     if not all(c in df.columns for c in required):
-        return scores
+        return {'speed_ratio': zeros, 'valid': zeros}
     try:
         is_dec = df['Факт_Конец'].dt.month == 12
         not_planned_dec = df['Конец'].dt.month != 12
         plan_dur = pd.to_numeric(df['План_Длит'], errors='coerce').fillna(0)
         fact_dur = pd.to_numeric(df['Факт_Длит'], errors='coerce').fillna(0)
         valid = (plan_dur > 0) & (fact_dur >= 0) & is_dec & not_planned_dec
-
         # ratio = plan_dur / fact_dur — чем быстрее закрыт, тем выше
-        coeff = threshold / 100
         speed_ratio = plan_dur / fact_dur.replace(0, np.nan)
-        # Если fact_dur < plan_dur * coeff → подозрительно
-        # Скоринг: нормализуем по порогу
-        raw = (speed_ratio / (1 / coeff)) * 5.0
-        scores = (raw * valid.astype(float)).fillna(0).clip(0, 10)
+        return {'speed_ratio': speed_ratio.to_numpy(dtype=float), 'valid': valid.to_numpy(dtype=float)}
     except Exception:
-        pass
-    return scores
+        return {'speed_ratio': zeros, 'valid': zeros}
 
 
-def _score_new10(df, threshold):
-    """NEW-10: Возвраты статусов — непрерывный балл."""
+def _new9_kernel(m, threshold):
+    # Если fact_dur < plan_dur * coeff → подозрительно
+    # Скоринг: нормализуем по порогу
+    coeff = threshold / 100
+    raw = (m['speed_ratio'] / (1 / coeff)) * 5.0
+    return _finish(raw * m['valid'])
+
+
+def _new10_metrics(df, agg=None):
     if 'N_STATUS_RETURNS' not in df.columns:
-        return pd.Series(0.0, index=df.index)
+        return {'returns': np.zeros(len(df))}
     returns = pd.to_numeric(df['N_STATUS_RETURNS'], errors='coerce').fillna(0)
-    scores = (returns / threshold) * 5.0
-    return scores.clip(0, 10).fillna(0)
+    return {'returns': returns.to_numpy(dtype=float)}
+
+
+def _new10_kernel(m, threshold):
+    return _finish((m['returns'] / threshold) * 5.0)
+
+
+# Регистрация (порядок — как в METHODS_RISK). Колонки — requires_fields из METHODS_RISK.
+register_method("C1-M1: Перерасход бюджета", _c1m1_metrics, _c1m1_kernel, stage='score_c1m1')
+register_method("C1-M6: Аномалия по истории ТМ", _c1m6_metrics, _c1m6_kernel,
+                requires_agg=('median_by_tm',), stage='score_c1m6')
+register_method("C1-M9: Незавершённые работы", _c1m9_metrics, _c1m9_kernel, stage='score_c1m9')
+register_method("C2-M2: Проблемное оборудование", _c2m2_metrics, _c2m2_kernel,
+                extra=('orders_without_eo',), stage='score_c2m2')
+register_method("NEW-9: Формальное закрытие в декабре", _new9_metrics, _new9_kernel, stage='score_new9')
+register_method("NEW-10: Возвраты статусов", _new10_metrics, _new10_kernel, stage='score_new10')
+
+
+def _score(df, kernel, metrics, threshold):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.Series(kernel(metrics, threshold), index=df.index)
+
+
+@timed()
+def _score_c1m1(df, threshold):
+    """C1-M1: Перерасход бюджета — непрерывный балл."""
+    return _score(df, _c1m1_kernel, _c1m1_metrics(df), threshold)
+
+
+@timed()
+def _score_c1m6(df, threshold, agg):
+    """C1-M6: Аномалия по истории ТМ — непрерывный балл."""
+    return _score(df, _c1m6_kernel, _c1m6_metrics(df, agg), threshold)
+
+
+@timed()
+def _score_c1m9(df):
+    """C1-M9: Незавершённые работы — бинарный (0 или 5)."""
+    return _score(df, _c1m9_kernel, _c1m9_metrics(df), None)
+
 
+@timed()
+def _score_c2m2(df, threshold, agg):
+    """C2-M2: Проблемное оборудование — непрерывный балл. Только заказы с реальным ЕО.
+
+    Жёсткая фильтрация: все строки где ЕО пустое, None, NaN, nan, Н/Д, НД,
+    Не присвоено, пусто, null, 0, -, из одних нулей, длина < 3 — ИСКЛЮЧАЮТСЯ.
+
+    Возвращает кортеж (scores, orders_without_eo).
+    """
+    m = _c2m2_metrics(df, agg)
+    return _score(df, _c2m2_kernel, m, threshold), m['orders_without_eo']
+
+
+@timed()
+def _score_new9(df, threshold):
+    """NEW-9: Формальное закрытие в декабре — непрерывный балл."""
+    return _score(df, _new9_kernel, _new9_metrics(df), threshold)
 
+
+@timed()
+def _score_new10(df, threshold):
+    """NEW-10: Возвраты статусов — непрерывный балл."""
+    return _score(df, _new10_kernel, _new10_metrics(df), threshold)
+
+
+@timed()
 def compute_dq_risk(df):
     """Вычисляет DQ_Risk (0-10) на основе Data_Completeness."""
     if 'Data_Completeness' not in df.columns:
@@ -180,7 +363,35 @@ def compute_dq_risk(df):
     return dq.clip(0, 10)
 
 
-def apply_risk_scoring_v2(df, agg, thresholds):
+def _run_method(spec, df, agg, threshold):
+    """Метод целиком: недостающие объявленные агрегаты → метрики → балл.
+
+    Возвращает (балл, доп. значения, сек).
+    """
+    checkpoint()
+    t0 = time.perf_counter()
+    needed = [k for k in spec['requires_agg'] if not agg or k not in agg]
+    if needed:
+        from core.aggregates import compute_aggregates
+        agg = {**(agg or {}), **compute_aggregates(df, needed)}
+    m = spec['metrics'](df, agg)
+    checkpoint()
+    score = _score(df, spec['kernel'], m, threshold)
+    elapsed = time.perf_counter() - t0
+    record(spec['stage'], elapsed, len(df))
+    return score, {key: m[key] for key in spec['extra']}, elapsed
+
+
+def _scoring_pool(workers):
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='titan-score')
+        return pool
+
+
+@timed()
+def apply_risk_scoring_v2(df, agg, thresholds, methods=None, workers=None):
     """Применить непрерывный риск-скоринг v2 к DataFrame.
 
     Добавляет колонки:
@@ -192,34 +403,64 @@ def apply_risk_scoring_v2(df, agg, thresholds):
     - Priority_Score — итоговый приоритет
     - Risk_Category — категория (Красный/Жёлтый/Серый/Зелёный)
     - Risk_Sum — для обратной совместимости
+
+    methods — какие методы считать (по умолчанию все из реестра); у остальных
+    и у методов без входных колонок балл 0. Недостающие в agg агрегаты,
+    объявленные методом, досчитываются по df.
+    workers — потоков на методы (по умолчанию SCORING_WORKERS; от
+    SCORING_PARALLEL_MIN_ROWS строк). Методы и DQ_Risk независимы и
+    считаются в общем пуле потоков (_scoring_pool), результат собирается в порядке METHODS_RISK —
+    одинаковый при любом числе потоков.
+    Возвращает (df, extra_info): extra_info — дополнительные значения методов
+    (orders_without_eo), method_timings (сек по методам), skipped_methods
+    (метод → недостающие колонки).
     """
     df = df.copy()
 
     method_scores = {}
-    extra_info = {}  # Дополнительная информация от методов
-
-    # C2-M2 возвращает кортеж (scores, orders_without_eo)
-    c2m2_result = _score_c2m2(df, thresholds.get("C2-M2: Проблемное оборудование", 5), agg)
-    extra_info['orders_without_eo'] = c2m2_result[1]
-
-    method_funcs = {
-        "C1-M1: Перерасход бюджета": lambda: _score_c1m1(df, thresholds.get("C1-M1: Перерасход бюджета", 20)),
-        "C1-M6: Аномалия по истории ТМ": lambda: _score_c1m6(df, thresholds.get("C1-M6: Аномалия по истории ТМ", 140), agg),
-        "C1-M9: Незавершённые работы": lambda: _score_c1m9(df),
-        "C2-M2: Проблемное оборудование": lambda: c2m2_result[0],
-        "NEW-9: Формальное закрытие в декабре": lambda: _score_new9(df, thresholds.get("NEW-9: Формальное закрытие в декабре", 50)),
-        "NEW-10: Возвраты статусов": lambda: _score_new10(df, thresholds.get("NEW-10: Возвраты статусов", 3)),
-    }
+    # Дополнительная информация от методов
+    extra_info = {'orders_without_eo': 0, 'method_timings': {}, 'skipped_methods': {}}
+    tasks = []
+    for spec in select_methods(methods):
+        missing = missing_fields(spec, df)
+        if missing:
+            extra_info['skipped_methods'][spec['name']] = missing
+            continue
+        threshold = thresholds.get(spec['name'], METHODS_RISK[spec['name']].get('threshold_default', 0))
+        tasks.append((spec, threshold))
+
+    workers = SCORING_WORKERS if workers is None else workers
+    if workers < 2 or len(tasks) < 2 or len(df) < SCORING_PARALLEL_MIN_ROWS:
+        results = [_run_method(spec, df, agg, threshold) for spec, threshold in tasks]
+        dq_risk = compute_dq_risk(df)
+    else:
+        pool = _scoring_pool(workers)
+        # Копия контекста на задачу — замеры этапов попадут в метрики запроса
+        futures = [pool.submit(contextvars.copy_context().run, profiled(_run_method), spec, df, agg, threshold)
+                   for spec, threshold in tasks]
+        dq_future = pool.submit(contextvars.copy_context().run, profiled(compute_dq_risk), df)
+        try:
+            results = [fut.result() for fut in futures]
+            dq_risk = dq_future.result()
+        except Exception:
+            # Ошибка или отмена расчёта — ещё не начатые методы не запускать
+            for fut in futures + [dq_future]:
+                fut.cancel()
+            raise
+
+    computed = {}
+    for (spec, _threshold), (score, extra, elapsed) in zip(tasks, results):
+        computed[spec['name']] = score
+        extra_info.update(extra)
+        extra_info['method_timings'][spec['name']] = round(elapsed, 6)
 
     methods_total = pd.Series(0.0, index=df.index)
     methods_count = pd.Series(0, index=df.index)
 
     for method_name, method_info in METHODS_RISK.items():
         weight = method_info.get('weight', 1)
-        score_func = method_funcs.get(method_name)
-        if score_func:
-            score = score_func()
-        else:
+        score = computed.get(method_name)
+        if score is None:
             score = pd.Series(0.0, index=df.index)
 
         col_score = f"Score_{method_name}"
@@ -232,10 +473,10 @@ def apply_risk_scoring_v2(df, agg, thresholds):
         method_scores[method_name] = score
 
     # DQ_Risk
-    df['DQ_Risk'] = compute_dq_risk(df).round(2)
+    df['DQ_Risk'] = dq_risk.round(2)
 
     # Multiplier по количеству сработавших методов
-    multiplier = methods_count.clip(0, 6).map(MULTIPLIERS).fillna(1.0)
+    multiplier = methods_count.clip(0, MAX_MULTIPLIED_METHODS).map(MULTIPLIERS).fillna(1.0)
 
     # Priority_Score = Methods_Total × Multiplier + DQ_Risk × 0.8
     df['Methods_Total'] = methods_total.round(2)
@@ -355,4 +596,8 @@ def _self_test():
     print("="*60 + "\n")
 
 
+# Методы, реализованные в своих модулях (регистрируются при импорте)
+import core.duplicates  # noqa: E402,F401  NEW-11
+import core.eo_series  # noqa: E402,F401  NEW-12
+
 # _self_test()  # Раскомментировать для отладки
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+core/risk_sweep.py — Чувствительность риск-скоринга к порогам методов
+
+Для сетки порогов одного метода (или двух — 2-D сетка) считает в каждой
+точке: сколько заказов помечено методом и их Σ Fact_N, распределение по
+категориям Красный/Жёлтый/Серый/Зелёный. Метрики методов (не зависят от
+порога) считаются один раз и кэшируются в сессии, сетка — одно
+broadcast-вычисление ядер методов (реестр core/risk_methods.py) по блокам строк.
+Арифметика та же, что в apply_risk_scoring_v2: точка сетки совпадает
+с полным пересчётом при тех же порогах.
+"""
+
+import os
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from config.constants import METHODS_RISK
+from core.risk_scoring_v2 import MULTIPLIERS, MAX_MULTIPLIED_METHODS, compute_dq_risk
+from core.risk_methods import RISK_METHODS, select_methods, missing_fields, required_aggregates
+from core.aggregates import compute_aggregates, session_aggregates, SESSION_AGG_KEYS
+from core.pipeline import filter_df, apply_baseline, uses_history
+from core.baseline_store import store_version
+from utils.metrics import timed
+
+# Ячеек (строк × точек сетки) в одном блоке вычислений — ограничивает память
+SWEEP_CHUNK_CELLS = int(os.environ.get('TITAN_SWEEP_CHUNK_CELLS', '4000000'))
+# Предел точек сетки
+SWEEP_MAX_POINTS = int(os.environ.get('TITAN_SWEEP_MAX_POINTS', '2500'))
+# Сколько наборов метрик (по фильтрам) держать в сессии
+SWEEP_CACHE_SIZE = 2
+
+CATEGORIES = ('Красный', 'Жёлтый', 'Серый', 'Зелёный')
+
+_MULTIPLIER_TABLE = np.array([MULTIPLIERS[i] for i in range(MAX_MULTIPLIED_METHODS + 1)])
+
+
+@timed()
+def method_metrics(df, agg):
+    """Метрики всех методов, DQ_Risk и Fact_N выборки — всё, что нужно ядрам.
+
+    Метод без входных колонок — None (балл 0, как в apply_risk_scoring_v2).
+    """
+    return {
+        'methods': {spec['name']: (None if missing_fields(spec, df) else spec['metrics'](df, agg))
+                    for spec in select_methods()},
+        'dq': compute_dq_risk(df).round(2).to_numpy(dtype=float),
+        'fact': np.nan_to_num(df['Fact_N'].to_numpy(dtype=float)) if 'Fact_N' in df.columns else np.zeros(len(df)),
+        'rows': len(df),
+    }
+
+
+def session_metrics(session, f):
+    """Метрики для фильтров f — из кэша сессии (по версии данных и фильтрам)."""
+    key = (session.get('version', 1), json.dumps(f, sort_keys=True, ensure_ascii=False, default=str),
+           store_version() if uses_history(f) else None)
+    cache = session.setdefault('risk_sweep_cache', OrderedDict())
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    df_f = filter_df(session['df'], f)
+    keys = required_aggregates()
+    agg = compute_aggregates(df_f, [k for k in keys if k not in SESSION_AGG_KEYS])
+    agg.update(session_aggregates(session['agg'], session['df'], keys))
+    apply_baseline(agg, df_f, f)
+    metrics = method_metrics(df_f, agg)
+    cache[key] = metrics
+    while len(cache) > SWEEP_CACHE_SIZE:
+        cache.popitem(last=False)
+    return metrics
+
+
+def _slice(metrics, start, stop, ndim):
+    """Блок строк метрик метода, развёрнутый под оси сетки: (n, 1[, 1])."""
+    shape = (-1,) + (1,) * ndim
+    return {k: (v[start:stop].reshape(shape) if isinstance(v, np.ndarray) else v) for k, v in metrics.items()}
+
+
+@timed()
+def sweep(metrics, thresholds, grid):
+    """Прогон сетки порогов.
+
+    thresholds — пороги остальных методов; grid — {метод: [значения]}
+    (1 или 2 метода). Возвращает сводку по точкам сетки.
+    """
+    methods = list(grid)
+    values = [np.asarray(grid[m], dtype=float) for m in methods]
+    shape = tuple(len(v) for v in values)
+    ndim = len(shape)
+    n_points = int(np.prod(shape))
+
+    # Оси сетки: порог метода i меняется по оси i
+    axis_values = {}
+    for i, (m, v) in enumerate(zip(methods, values)):
+        axis_shape = [1] * ndim
+        axis_shape[i] = len(v)
+        axis_values[m] = v.reshape(axis_shape)
+
+    flagged = {m: np.zeros(shape, dtype=np.int64) for m in methods}
+    flagged_fact = {m: np.zeros(shape) for m in methods}
+    categories = {c: np.zeros(shape, dtype=np.int64) for c in CATEGORIES}
+
+    rows = metrics['rows']
+    chunk = max(1, SWEEP_CHUNK_CELLS // max(n_points, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, rows, chunk):
+            stop = min(start + chunk, rows)
+            total = 0.0
+            count = 0
+            # Порядок методов и операций — как в apply_risk_scoring_v2
+            for name, info in METHODS_RISK.items():
+                if metrics['methods'].get(name) is None:
+                    continue
+                kernel = RISK_METHODS[name]['kernel']
+                m = _slice(metrics['methods'][name], start, stop, ndim)
+                if name in axis_values:
+                    score = kernel(m, axis_values[name])
+                else:
+                    score = kernel(m, thresholds.get(name, info['threshold_default']))
+                hit = score >= 5.0
+                total = total + score * info.get('weight', 1)
+                count = count + hit
+                if name in flagged:
+                    fact = metrics['fact'][start:stop].reshape((-1,) + (1,) * ndim)
+                    flagged[name] += hit.sum(axis=0)
+                    flagged_fact[name] += (hit * fact).sum(axis=0)
+
+            dq = metrics['dq'][start:stop].reshape((-1,) + (1,) * ndim)
+            multiplier = _MULTIPLIER_TABLE[np.clip(count, 0, MAX_MULTIPLIED_METHODS)]
+            priority = np.round(total * multiplier + dq * 0.8, 2)
+            priority = np.broadcast_to(priority, (stop - start,) + shape)
+            red = priority >= 7
+            yellow = (priority >= 4) & ~red
+            grey = (priority >= 1) & (priority < 4)
+            categories['Красный'] += red.sum(axis=0)
+            categories['Жёлтый'] += yellow.sum(axis=0)
+            categories['Серый'] += grey.sum(axis=0)
+            categories['Зелёный'] += (priority < 1).sum(axis=0)
+
+    points = []
+    for idx in np.ndindex(*shape):
+        points.append({
+            "thresholds": {m: float(values[i][idx[i]]) for i, m in enumerate(methods)},
+            "flagged": {m: {"count": int(flagged[m][idx]), "fact": round(float(flagged_fact[m][idx]), 2)}
+                        for m in methods},
+            "categories": {c: int(categories[c][idx]) for c in CATEGORIES},
+        })
+    return {
+        "methods": methods,
+        "values": [v.tolist() for v in values],
+        "shape": list(shape),
+        "rows": rows,
+        "points": points,
+    }
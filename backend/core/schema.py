@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+core/schema.py — Схема колонок обработанного DataFrame
+
+Для каждой известной колонки задан тип: category для иерархии и
+справочных полей, Arrow-строки для свободного текста и ID, float64/float32
+для мер, datetime64 для дат. Текст с частыми повторами и неизвестные
+строковые колонки — по доле уникальных значений (category или Arrow-строки).
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = pd.StringDtype('pyarrow')
+except ImportError:
+    # Без pyarrow свободный текст остаётся object
+    STRING_DTYPE = object
+
+# Значения, которые при загрузке считаются пустыми и заменяются на 'Н/Д'
+EMPTY_TEXT_VALUES = ('nan', 'None', '', '0', 'Не присвоено', 'Не присв', 'Пусто')
+
+# Доля уникальных значений, ниже которой неизвестная колонка хранится как category
+CATEGORY_MAX_RATIO = 0.5
+
+CATEGORY_COLUMNS = [
+    # Иерархия
+    'БЕ', 'БЕ_Код', 'ЗАВОД', 'ЗАВОД_Код', 'ПРОИЗВОДСТВО', 'ПРОИЗВОДСТВО_Код',
+    'ЦЕХ', 'ЦЕХ_Код', 'УСТАНОВКА', 'УСТАНОВКА_Код', 'ЕО', 'EQUNR_Код',
+    'ТМ', 'ТМ_Код',
+    # Справочники и исполнители
+    'Вид', 'Вид_Код', 'STAT', 'STAT_Код', 'USTAT', 'ABC', 'ABC_Код',
+    'РМ', 'РМ_Код', 'INGRP', 'INGRP_Код', 'КЛАСС', 'КЛАСС_Код',
+    'USER', 'LAST_USER', 'КТО_СОЗДАЛ', 'КТО_ИЗМЕНИЛ', 'MVZ',
+    'ВИД_РАБОТ', 'ILART_Код', 'МЕСТОПОЛ', 'МЕСТОПОЛ_Код', 'MAUFNR', 'MAUFNR_Код',
+    'УЗЕЛ', 'ГРУППА_СООБЩ', 'USER4',
+]
+
+STRING_COLUMNS = ['ID', 'Текст', 'ALL_STATUSES', 'ДЕФЕКТ_ВЕД', 'ДОГОВОР', 'ОСНОВА_ЗАКАЗ']
+
+FLOAT64_COLUMNS = [
+    'Plan_N', 'Fact_N', 'План_Длит', 'Факт_Длит', 'Превыш_Длит', 'Data_Completeness',
+    'N_STATUS_CHANGES', 'N_STATUS_RETURNS',
+]
+
+# Трудозатраты в скоринге не участвуют — хватает float32
+FLOAT32_COLUMNS = ['Plan_T', 'Fact_T']
+
+DATETIME_COLUMNS = ['Начало', 'Конец', 'Факт_Начало', 'Факт_Конец']
+
+COLUMN_SCHEMA = {
+    **{c: 'category' for c in CATEGORY_COLUMNS},
+    **{c: 'string' for c in STRING_COLUMNS},
+    **{c: 'float64' for c in FLOAT64_COLUMNS},
+    **{c: 'float32' for c in FLOAT32_COLUMNS},
+    **{c: 'datetime64[ns]' for c in DATETIME_COLUMNS},
+}
+
+
+def _text_kind(n_unique, n_rows):
+    """Строки с частыми повторами дешевле хранить словарём (category)."""
+    return 'category' if n_rows and n_unique / n_rows < CATEGORY_MAX_RATIO else 'string'
+
+
+def column_kind(col, series):
+    """Целевой тип колонки: из схемы, для текста и неизвестных строковых — по кардинальности."""
+    kind = COLUMN_SCHEMA.get(col)
+    if kind == 'string' or (kind is None and (isinstance(series.dtype, pd.CategoricalDtype)
+                                              or series.dtype == object)):
+        return _text_kind(series.nunique(), len(series))
+    return kind
+
+
+def _to_string(values):
+    return pd.array(values, dtype=STRING_DTYPE) if STRING_DTYPE is not object else values
+
+
+def normalize_text(series, kind='category', empty_values=EMPTY_TEXT_VALUES, fill='Н/Д'):
+    """Строковое поле: str(), пустые → fill, сразу в category или Arrow-строки
+    (для kind='string' с частыми повторами — тоже category).
+
+    Нормализуются только уникальные значения (factorize), без прохода
+    astype(str) по всем строкам. Категории отсортированы, как у astype('category').
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    labels = [str(u) for u in uniques]
+    if (codes < 0).any():
+        # Пропуски (код -1) → последняя метка, как 'nan' у astype(str)
+        labels.append('nan')
+    labels = np.array(labels, dtype=object)
+    labels[np.isin(labels, list(empty_values))] = fill
+    cats, inverse = np.unique(labels, return_inverse=True)
+    new_codes = inverse[codes]
+    if kind == 'string':
+        kind = _text_kind(len(cats), len(series))
+    if kind == 'category':
+        return pd.Series(pd.Categorical.from_codes(new_codes, categories=cats), index=series.index)
+    return pd.Series(_to_string(cats[new_codes]), index=series.index)
+
+
+def apply_schema(df):
+    """Привести колонки обработанного DataFrame к типам схемы (in place)."""
+    for col in list(df.columns):
+        if str(col).startswith('_'):
+            continue
+        s = df[col]
+        kind = column_kind(col, s)
+        if kind is None:
+            continue
+        if kind == 'category':
+            if not isinstance(s.dtype, pd.CategoricalDtype):
+                df[col] = s.astype('category')
+        elif kind == 'string':
+            if s.dtype != STRING_DTYPE:
+                df[col] = s.astype(STRING_DTYPE)
+        elif kind.startswith('datetime'):
+            if not pd.api.types.is_datetime64_any_dtype(s):
+                df[col] = pd.to_datetime(s, errors='coerce')
+        elif s.dtype != kind:
+            df[col] = pd.to_numeric(s, errors='coerce').astype(kind)
+    return df
+
+
+def column_stats(df):
+    """По колонкам: тип, память (deep), кардинальность и доля пропусков."""
+    n = max(len(df), 1)
+    stats = []
+    for col in df.columns:
+        s = df[col]
+        size = int(s.memory_usage(index=False, deep=True))
+        stats.append({
+            "name": str(col),
+            "dtype": str(s.dtype),
+            "bytes": size,
+            "bytes_per_row": round(size / n, 2),
+            "cardinality": int(s.nunique(dropna=True)),
+            "null_share": round(float(s.isna().sum()) / n, 4),
+        })
+    stats.sort(key=lambda c: c['bytes'], reverse=True)
+    return stats
+
+
+def _legacy_bytes(s):
+    """Размер колонки при прежнем подходе: object-строки, category при < 50% уникальных."""
+    if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s) or pd.api.types.is_bool_dtype(s):
+        if s.dtype == np.float32:
+            return int(s.astype(np.float64).memory_usage(index=False, deep=True))
+        return int(s.memory_usage(index=False, deep=True))
+    obj = s.astype(object)
+    if len(obj) and obj.nunique() / len(obj) < CATEGORY_MAX_RATIO:
+        obj = obj.astype('category')
+    return int(obj.memory_usage(index=False, deep=True))
+
+
+def memory_report(df, legacy=True):
+    """Память по колонкам (deep) и байт на строку; с legacy — сравнение с прежними типами."""
+    n = max(len(df), 1)
+    columns = {}
+    total = 0
+    legacy_total = 0
+    for col in df.columns:
+        s = df[col]
+        size = int(s.memory_usage(index=False, deep=True))
+        total += size
+        info = {"dtype": str(s.dtype), "bytes": size, "bytes_per_row": round(size / n, 2)}
+        if legacy:
+            old = _legacy_bytes(s)
+            legacy_total += old
+            info["legacy_bytes"] = old
+        columns[str(col)] = info
+    report = {
+        "rows": len(df),
+        "bytes": total,
+        "bytes_per_row": round(total / n, 2),
+        "columns": columns,
+    }
+    if legacy:
+        report["legacy_bytes"] = legacy_total
+        report["legacy_bytes_per_row"] = round(legacy_total / n, 2)
+        report["saving_pct"] = round((1 - total / legacy_total) * 100, 1) if legacy_total else 0.0
+    return report
+
+
+if __name__ == '__main__':
+    # python -m core.schema <файл выгрузки> — отчёт по памяти против прежних типов
+    import sys
+    from core.data_loader import load_file
+    from core.data_processor import process_data
+
+    path = sys.argv[1]
+    with open(path, 'rb') as f:
+        df = process_data(load_file(f.read(), path))
+    rep = memory_report(df)
+    print(f"{'колонка':<24}{'dtype':<18}{'байт/стр':>10}{'было':>10}")
+    for col, info in sorted(rep['columns'].items(), key=lambda kv: -kv[1]['bytes']):
+        print(f"{col:<24}{info['dtype']:<18}{info['bytes_per_row']:>10}{info['legacy_bytes'] / max(rep['rows'], 1):>10.1f}")
+    print(f"Итого: {rep['bytes_per_row']} байт/строку, было {rep['legacy_bytes_per_row']} ({rep['saving_pct']}% экономии)")
@@ -12,8 +12,9 @@ _LOADED = False
 
 
 def _get_json_path():
-    """Ищет tm_structure.json в разных местах."""
+    """Ищет tm_structure.json в разных местах (TITAN_TM_STRUCTURE — явный путь)."""
     possible_paths = [
+        os.environ.get('TITAN_TM_STRUCTURE', ''),
         os.path.join(os.path.dirname(__file__), '..', 'tm_structure.json'),
         os.path.join(os.path.dirname(__file__), 'tm_structure.json'),
         'tm_structure.json',
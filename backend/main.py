@@ -20,15 +20,35 @@ from api.routes_risks import router as risks_router
 from api.routes_quality import router as quality_router
 from api.routes_orders import router as orders_router
 from api.routes_equipment import router as equipment_router
+from api.routes_dashboard import router as dashboard_router
 from api.routes_export import router as export_router
 from api.routes_chat import router as chat_router
+from api.routes_hierarchy import router as hierarchy_router
+from api.routes_session import router as session_router
+from api.routes_metrics import router as metrics_router
+from api.routes_profiling import router as profiling_router
+from state.session import start_sweeper, stop_sweeper
+from state.export_jobs import start_sweeper as start_export_sweeper, stop_sweeper as stop_export_sweeper
+from utils.llm_client import close_client
+from utils.metrics import MetricsMiddleware
+from utils.columnar import ColumnarMiddleware, ColumnarJSONResponse
+from utils.compression import CompressionMiddleware
+from utils.profiling import ProfilingMiddleware
+from utils.etag import ETagMiddleware
+from utils.cancellation import Cancelled, cancelled_handler
 
 app = FastAPI(
     title="ТИТАН Аудит ТОРО v.200",
     description="Аналитическая система аудита заказов ТОРО",
-    version="2.0.0"
+    version="2.0.0",
+    # Сериализация ответов замеряется (этап json_render в /api/metrics);
+    # по запросу клиента — колоночный JSON или Arrow IPC
+    default_response_class=ColumnarJSONResponse,
 )
 
+# Расчёт вкладки вытеснен новыми фильтрами сессии или клиент ушёл — 409 / 499
+app.add_exception_handler(Cancelled, cancelled_handler)
+
 # CORS — разрешить Vite dev server
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +58,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Формат ответа (format=columns|arrow или Accept)
+app.add_middleware(ColumnarMiddleware)
+# Сжатие br/gzip по Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+# ETag / 304 для вкладок — до любой работы pandas
+app.add_middleware(ETagMiddleware)
+# Замеры этапов по маршрутам — /api/metrics
+app.add_middleware(MetricsMiddleware)
+# Профиль отдельного запроса по ?profile=1|sample (при TITAN_PROFILING=1)
+app.add_middleware(ProfilingMiddleware)
+
 # Подключение роутов
 app.include_router(upload_router)
 app.include_router(kpi_router)
@@ -51,8 +82,29 @@ app.include_router(risks_router)
 app.include_router(quality_router)
 app.include_router(orders_router)
 app.include_router(equipment_router)
+app.include_router(dashboard_router)
 app.include_router(export_router)
 app.include_router(chat_router)
+app.include_router(hierarchy_router)
+app.include_router(session_router)
+app.include_router(metrics_router)
+app.include_router(profiling_router)
+
+
+@app.on_event("startup")
+async def on_startup():
+    # Фоновая очистка сессий и контроль бюджета памяти
+    start_sweeper()
+    # Фоновое удаление устаревших файлов экспорта
+    start_export_sweeper()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    stop_sweeper()
+    stop_export_sweeper()
+    # Пул соединений к LLM-провайдерам
+    await close_client()
 
 
 @app.get("/api/health")
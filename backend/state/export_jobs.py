@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+state/export_jobs.py — Фоновые задания экспорта
+
+Экспорт выполняется в отдельном пуле потоков (не в пуле HTTP-обработчиков),
+очередь ограничена EXPORT_QUEUE_SIZE. Готовые файлы кэшируются по ключу
+(сессия, фильтры, пороги, формат, колонки) до истечения EXPORT_JOB_TTL;
+устаревшие файлы удаляет фоновая очистка (start_sweeper).
+"""
+
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.export import export_to_tempfile
+
+# Потоков экспорта — не больше, чтобы не отнимать CPU у вкладок
+EXPORT_WORKERS = int(os.environ.get('TITAN_EXPORT_WORKERS', '1'))
+# Максимум заданий в очереди + в работе
+EXPORT_QUEUE_SIZE = int(os.environ.get('TITAN_EXPORT_QUEUE_SIZE', '4'))
+# Время жизни готового файла
+EXPORT_JOB_TTL = 3600
+# Период фоновой очистки устаревших заданий
+EXPORT_SWEEP_INTERVAL = int(os.environ.get('TITAN_EXPORT_SWEEP_INTERVAL', '60'))
+
+_jobs: dict = {}
+_jobs_by_key: dict = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='titan-export')
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_sweeper = None
+_sweeper_stop = threading.Event()
+
+
+class ExportQueueFull(Exception):
+    """Очередь экспорта заполнена."""
+
+
+class ExportCancelled(Exception):
+    """Задание отменено пользователем."""
+
+
+def _remove_file(job):
+    path = job.get('path')
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    job['path'] = None
+
+
+def cleanup_old_jobs():
+    """Удалить завершённые задания старше EXPORT_JOB_TTL вместе с файлами."""
+    now = time.time()
+    with _lock:
+        expired = [jid for jid, j in _jobs.items()
+                   if j['status'] not in ACTIVE_STATUSES and now - (j['finished'] or j['created']) > EXPORT_JOB_TTL]
+        for jid in expired:
+            job = _jobs.pop(jid)
+            _remove_file(job)
+            if _jobs_by_key.get(job['key']) == jid:
+                del _jobs_by_key[job['key']]
+
+
+def _run_job(job, build_df, write_kwargs):
+    cancel = job['_cancel']
+    if cancel.is_set():
+        # Отменено, когда поток уже взял задание (future.cancel() не сработал)
+        job['status'] = 'cancelled'
+        job['finished'] = time.time()
+        return
+    job['status'] = 'running'
+    job['started'] = time.time()
+    try:
+        job['stage'] = 'filtering'
+        df = build_df()
+        if cancel.is_set():
+            raise ExportCancelled()
+        job['rows_total'] = len(df)
+        job['stage'] = 'writing'
+
+        def _progress(rows):
+            job['rows_written'] = rows
+            if cancel.is_set():
+                raise ExportCancelled()
+
+        job['path'] = export_to_tempfile(df, job['format'], progress=_progress, **write_kwargs)
+        job['status'] = 'done'
+    except ExportCancelled:
+        job['status'] = 'cancelled'
+    except Exception as e:
+        job['status'] = 'error'
+        job['error'] = str(e)
+    finally:
+        job['stage'] = None
+        job['finished'] = time.time()
+
+
+def submit_export_job(session_id, key, build_df, fmt, filename_prefix='titan_export', **write_kwargs):
+    """Поставить экспорт в очередь или вернуть уже готовое/идущее задание с тем же ключом.
+
+    build_df — функция без аргументов, возвращающая DataFrame для выгрузки.
+    Бросает ExportQueueFull, если очередь заполнена.
+    """
+    cleanup_old_jobs()
+    with _lock:
+        existing = _jobs.get(_jobs_by_key.get(key))
+        if existing and (existing['status'] in ACTIVE_STATUSES or
+                         (existing['status'] == 'done' and existing['path'] and os.path.exists(existing['path']))):
+            return existing
+
+        active = sum(1 for j in _jobs.values() if j['status'] in ACTIVE_STATUSES)
+        if active >= EXPORT_QUEUE_SIZE:
+            raise ExportQueueFull()
+
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'session_id': session_id,
+            'key': key,
+            'format': fmt,
+            'filename_prefix': filename_prefix,
+            'status': 'queued',
+            'stage': None,
+            'rows_total': None,
+            'rows_written': 0,
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'path': None,
+            'error': None,
+            '_cancel': threading.Event(),
+        }
+        _jobs[job['id']] = job
+        _jobs_by_key[key] = job['id']
+        job['_future'] = _executor.submit(_run_job, job, build_df, write_kwargs)
+    return job
+
+
+def get_job(job_id):
+    """Получить задание по id."""
+    return _jobs.get(job_id)
+
+
+def cancel_job(job_id):
+    """Отменить задание: снять из очереди или прервать запись на ближайшем чанке."""
+    job = _jobs.get(job_id)
+    if not job:
+        return None
+    job['_cancel'].set()
+    future = job.get('_future')
+    if future is not None and future.cancel():
+        job['status'] = 'cancelled'
+        job['finished'] = time.time()
+    if job['status'] in ('done', 'error', 'cancelled'):
+        _remove_file(job)
+    # Идущее задание дорабатывает до ближайшего чанка, но по ключу его уже
+    # не отдавать — повторный запрос того же экспорта ставит новое задание
+    with _lock:
+        if _jobs_by_key.get(job['key']) == job_id:
+            del _jobs_by_key[job['key']]
+    return job
+
+
+def job_status(job):
+    """Публичное представление задания для API."""
+    total = job['rows_total']
+    progress = None
+    if total:
+        progress = round(min(job['rows_written'] / total, 1.0) * 100, 1)
+    elif job['status'] == 'done':
+        progress = 100.0
+    return {
+        "job_id": job['id'],
+        "session_id": job['session_id'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "format": job['format'],
+        "rows_total": total,
+        "rows_written": job['rows_written'],
+        "progress": progress,
+        "error": job['error'],
+        "created": job['created'],
+        "started": job['started'],
+        "finished": job['finished'],
+        "download_url": f"/api/export/jobs/{job['id']}/download" if job['status'] == 'done' else None,
+    }
+
+
+def _sweep_loop():
+    while not _sweeper_stop.wait(EXPORT_SWEEP_INTERVAL):
+        try:
+            cleanup_old_jobs()
+        except Exception:
+            pass
+
+
+def start_sweeper():
+    """Запустить фоновую очистку заданий экспорта (идемпотентно)."""
+    global _sweeper
+    if _sweeper is not None and _sweeper.is_alive():
+        return
+    _sweeper_stop.clear()
+    _sweeper = threading.Thread(target=_sweep_loop, name='titan-export-sweeper', daemon=True)
+    _sweeper.start()
+
+
+def stop_sweeper():
+    """Остановить фоновую очистку."""
+    _sweeper_stop.set()
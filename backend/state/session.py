@@ -1,46 +1,369 @@
 # -*- coding: utf-8 -*-
 """
 state/session.py — Хранение DataFrame в памяти
+
+Сессии учитываются по размеру в памяти (DataFrame + агрегаты + кэши).
+При превышении общего бюджета давно не использованные сессии (LRU)
+выгружаются на диск в parquet и поднимаются обратно при обращении.
+Устаревшие сессии удаляет фоновый поток (start_sweeper).
 """
 
+import os
+import sys
 import time
 import uuid
+import tempfile
+import threading
 from typing import Optional
+import numpy as np
 import pandas as pd
 
-# Хранилище сессий
+from core.schema import STRING_DTYPE
+
+# Хранилище сессий (порядок ключей — от давно использованных к недавним)
 _sessions: dict = {}
+_lock = threading.RLock()
+# Поколения состояния фильтров: session_id → (поколение, хэш состояния);
+# отдельно от словаря сессии — он подменяется при выгрузке на диск
+_generations: dict = {}
 
 # Автоочистка — удалять сессии старше 1 часа
-SESSION_TTL = 3600
+SESSION_TTL = int(os.environ.get('TITAN_SESSION_TTL', '3600'))
+# Общий бюджет памяти под сессии
+SESSION_MEMORY_BUDGET = int(os.environ.get('TITAN_SESSION_MEMORY_MB', '4096')) * 1024 * 1024
+# Каталог для выгруженных сессий
+SPILL_DIR = os.environ.get('TITAN_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'titan_spill'))
+# Период фоновой очистки и пересчёта размеров
+SWEEP_INTERVAL = int(os.environ.get('TITAN_SWEEP_INTERVAL', '30'))
 
+# Служебные поля сессии (в размер не входят)
+_META_KEYS = ('id', 'timestamp', 'created', 'version', 'nbytes', 'spill_path', 'attrs',
+              'hits', 'timings', 'shape')
+# Что остаётся в памяти у выгруженной сессии; остальное (df и производные
+# кэши) при выгрузке отбрасывается и строится заново
+_RESIDENT_KEYS = _META_KEYS + ('agg',)
 
-def create_session(df: pd.DataFrame, agg: dict) -> str:
-    """Создать новую сессию."""
-    cleanup_old_sessions()
+_sweeper = None
+_sweeper_stop = threading.Event()
+
+
+def deep_size(obj, _depth=0):
+    """Оценка занимаемой памяти: DataFrame/ndarray — по буферам, контейнеры — рекурсивно."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    size = sys.getsizeof(obj)
+    if _depth > 16:
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, _depth + 1) + deep_size(v, _depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(v, _depth + 1) for v in obj)
+    return size
+
+
+def session_nbytes(session):
+    """Размер сессии в памяти: DataFrame + агрегаты + производные кэши."""
+    return sum(deep_size(v) for k, v in session.items() if k not in _META_KEYS)
+
+
+def _spill_path(session_id):
+    return os.path.join(SPILL_DIR, f"session_{session_id}.parquet")
+
+
+def _write_spill(df, path):
+    """DataFrame → parquet; без pyarrow или для несовместимых колонок — pickle."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        df.to_parquet(path)
+        return path
+    except Exception:
+        path = os.path.splitext(path)[0] + '.pkl'
+        df.to_pickle(path)
+        return path
+
+
+def _read_spill(path):
+    if path.endswith('.pkl'):
+        return pd.read_pickle(path)
+    df = pd.read_parquet(path)
+    # parquet возвращает строки с python-хранилищем — вернуть Arrow-строки схемы
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.StringDtype) and df[col].dtype != STRING_DTYPE:
+            df[col] = df[col].astype(STRING_DTYPE)
+    return df
+
+
+def _remove_spill(session):
+    path = session.get('spill_path')
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _spill(session_id):
+    """Выгрузить сессию на диск. Держатели старого словаря сессии дорабатывают с ним."""
+    session = _sessions.get(session_id)
+    if session is None or 'df' not in session:
+        return
+    df = session['df']
+    stub = {k: session[k] for k in _RESIDENT_KEYS if k in session}
+    stub['attrs'] = dict(df.attrs)
+    stub['shape'] = df.shape
+    stub['spill_path'] = _write_spill(df, _spill_path(session_id))
+    stub['nbytes'] = 0
+    _sessions[session_id] = stub
+
+
+def _rehydrate(session):
+    """Поднять выгруженную сессию с диска."""
+    df = _read_spill(session['spill_path'])
+    df.attrs.update(session.pop('attrs', {}))
+    _remove_spill(session)
+    session['spill_path'] = None
+    session['df'] = df
+    session['nbytes'] = session_nbytes(session)
+
+
+def _enforce_budget(keep=None):
+    """Выгружать давно не использованные сессии, пока суммарный размер выше бюджета."""
+    total = sum(s.get('nbytes', 0) for s in _sessions.values())
+    for sid in list(_sessions):
+        if total <= SESSION_MEMORY_BUDGET:
+            break
+        session = _sessions[sid]
+        if sid == keep or 'df' not in session:
+            continue
+        total -= session.get('nbytes', 0)
+        _spill(sid)
+
+
+def _touch(session_id, session):
+    """Отметить обращение: обновить время и перенести в конец LRU-порядка."""
+    session['timestamp'] = time.time()
+    _sessions.pop(session_id, None)
+    _sessions[session_id] = session
+
+
+def create_session(df: pd.DataFrame, agg: dict, timings: Optional[dict] = None) -> str:
+    """Создать новую сессию.
+
+    timings — длительности этапов загрузки (сек), для статистики сессии.
+    """
     session_id = str(uuid.uuid4())[:8]
-    _sessions[session_id] = {
+    now = time.time()
+    session = {
+        'id': session_id,
         'df': df,
         'agg': agg,
-        'timestamp': time.time(),
+        'timestamp': now,
+        'created': now,
+        'version': 1,
+        'hits': 0,
+        'timings': dict(timings or {}),
     }
+    session['nbytes'] = session_nbytes(session)
+    with _lock:
+        _sessions[session_id] = session
+        _enforce_budget(keep=session_id)
     return session_id
 
 
+def update_session_data(session, df, agg, **derived):
+    """Заменить данные сессии (дозагрузка) и поднять версию данных.
+
+    derived — пересчитанные производные структуры (например, 'hierarchy').
+    """
+    session['df'] = df
+    session['agg'] = agg
+    session.pop('hierarchy', None)
+    session.update(derived)
+    session['version'] = session.get('version', 1) + 1
+    session['nbytes'] = session_nbytes(session)
+    with _lock:
+        if 'id' in session:
+            _touch(session['id'], session)
+            _enforce_budget(keep=session['id'])
+        else:
+            session['timestamp'] = time.time()
+
+
+def begin_generation(session_id, state):
+    """Поколение состояния фильтров сессии для запроса с состоянием state.
+
+    Новое состояние поднимает поколение — расчёты прежних поколений
+    вытеснены (utils/cancellation.py); то же состояние — текущее поколение.
+    """
+    key = hash(state)
+    with _lock:
+        generation, current = _generations.get(session_id, (0, None))
+        if current != key:
+            generation += 1
+            _generations[session_id] = (generation, key)
+        return generation
+
+
+def current_generation(session_id):
+    """Текущее поколение состояния фильтров сессии."""
+    return _generations.get(session_id, (0, None))[0]
+
+
 def get_session(session_id: str) -> Optional[dict]:
-    """Получить данные сессии."""
-    session = _sessions.get(session_id)
-    if session and (time.time() - session['timestamp']) < SESSION_TTL:
-        session['timestamp'] = time.time()
+    """Получить данные сессии (выгруженная сессия поднимается с диска)."""
+    with _lock:
+        session = _sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session['timestamp'] >= SESSION_TTL:
+            _drop(session_id)
+            return None
+        if 'df' not in session:
+            _rehydrate(session)
+            _touch(session_id, session)
+            _enforce_budget(keep=session_id)
+        else:
+            _touch(session_id, session)
+        session['hits'] = session.get('hits', 0) + 1
         return session
-    if session:
-        del _sessions[session_id]
-    return None
+
+
+def peek_session(session_id: str) -> Optional[dict]:
+    """Сессия без обращения: не поднимает с диска, не меняет LRU и счётчик hits."""
+    return _sessions.get(session_id)
+
+
+def session_version(session_id: str) -> Optional[int]:
+    """Версия данных сессии или None (нет/устарела).
+
+    Обращение продлевает жизнь сессии, но не поднимает её с диска —
+    для условных запросов (ETag), которым данные не нужны.
+    """
+    with _lock:
+        session = _sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session['timestamp'] >= SESSION_TTL:
+            _drop(session_id)
+            return None
+        _touch(session_id, session)
+        return session.get('version', 1)
+
+
+def list_sessions() -> dict:
+    """Снимок хранилища {session_id: сессия}."""
+    with _lock:
+        return dict(_sessions)
+
+
+def session_stats(session):
+    """Сводка по сессии: размеры частей, возраст, обращения, этапы загрузки."""
+    now = time.time()
+    df = session.get('df')
+    rows, cols = df.shape if df is not None else session.get('shape', (None, None))
+    parts = {k: deep_size(v) for k, v in session.items() if k not in _META_KEYS}
+    return {
+        "session_id": session.get('id'),
+        "rows": rows,
+        "columns": cols,
+        "version": session.get('version', 1),
+        "generation": current_generation(session.get('id')),
+        "hits": session.get('hits', 0),
+        "created": session.get('created'),
+        "age_sec": round(now - session.get('created', now), 1),
+        "idle_sec": round(now - session['timestamp'], 1),
+        "spilled": df is None,
+        "spill_path": session.get('spill_path'),
+        "bytes": sum(parts.values()),
+        "bytes_by_part": parts,
+        "timings": session.get('timings', {}),
+    }
+
+
+def store_stats():
+    """Сводка по всему хранилищу: бюджет, занято, сессии в памяти и на диске."""
+    sessions = [session_stats(s) for s in list_sessions().values()]
+    resident = [s for s in sessions if not s['spilled']]
+    return {
+        "budget_bytes": SESSION_MEMORY_BUDGET,
+        "total_bytes": sum(s['bytes'] for s in resident),
+        "sessions_total": len(sessions),
+        "sessions_resident": len(resident),
+        "sessions_spilled": len(sessions) - len(resident),
+        "ttl_sec": SESSION_TTL,
+        "sessions": sorted(sessions, key=lambda s: s['bytes'], reverse=True),
+    }
+
+
+def _drop(session_id):
+    _generations.pop(session_id, None)
+    session = _sessions.pop(session_id, None)
+    if session is not None:
+        _remove_spill(session)
 
 
 def cleanup_old_sessions():
-    """Удалить устаревшие сессии."""
+    """Удалить устаревшие сессии (вместе с файлами выгрузки)."""
     now = time.time()
-    expired = [sid for sid, s in _sessions.items() if now - s['timestamp'] > SESSION_TTL]
-    for sid in expired:
-        del _sessions[sid]
+    with _lock:
+        expired = [sid for sid, s in _sessions.items() if now - s['timestamp'] > SESSION_TTL]
+        for sid in expired:
+            _drop(sid)
+
+
+def sweep_sessions():
+    """Один проход очистки: удалить устаревшие, пересчитать размеры, соблюсти бюджет.
+
+    Размеры пересчитываются, т.к. кэши сессии (дерево иерархии и т.п.)
+    растут после создания.
+    """
+    cleanup_old_sessions()
+    with _lock:
+        resident = [(sid, s) for sid, s in _sessions.items() if 'df' in s]
+    for sid, s in resident:
+        s['nbytes'] = session_nbytes(s)
+    with _lock:
+        _enforce_budget()
+
+
+def _sweep_loop():
+    while not _sweeper_stop.wait(SWEEP_INTERVAL):
+        try:
+            sweep_sessions()
+        except Exception:
+            pass
+
+
+def _remove_orphan_spills():
+    """Файлы выгрузки, оставшиеся от прошлого запуска процесса, никому не принадлежат."""
+    if not os.path.isdir(SPILL_DIR):
+        return
+    with _lock:
+        known = {s.get('spill_path') for s in _sessions.values()}
+    for name in os.listdir(SPILL_DIR):
+        path = os.path.join(SPILL_DIR, name)
+        if name.startswith('session_') and path not in known:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def start_sweeper():
+    """Запустить фоновую очистку сессий (идемпотентно)."""
+    global _sweeper
+    if _sweeper is not None and _sweeper.is_alive():
+        return
+    _remove_orphan_spills()
+    _sweeper_stop.clear()
+    _sweeper = threading.Thread(target=_sweep_loop, name='titan-session-sweeper', daemon=True)
+    _sweeper.start()
+
+
+def stop_sweeper():
+    """Остановить фоновую очистку."""
+    _sweeper_stop.set()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+utils/cancellation.py — Отмена вытесненных расчётов вкладок
+
+Щелчок по фильтру запускает расчёт всех вкладок (8+ запросов); при быстром
+перещёлкивании сервер в основном считает результаты, которые никто не
+увидит. У сессии есть поколение состояния фильтров
+(state.session.begin_generation): запрос с новыми фильтрами/порогами
+поднимает поколение, расчёты прежних поколений считаются вытесненными.
+
+Расчёт вкладки идёт в пуле потоков (run_cancellable) под токеном отмены.
+Конвейер между этапами (фильтры, агрегаты, методы скоринга, построение
+вкладки, разделы дашборда) вызывает checkpoint() — он бросает Cancelled,
+если токен вытеснен или клиент отключился (http.disconnect ждётся
+параллельно расчёту). Начатый этап доигрывается: pandas/numpy не прерываются.
+Ответ на отменённый запрос — cancelled_handler (409 / 499).
+Отмены — в метриках этапом cancelled.<причина>: число отмен и секунды
+работы до отмены по маршрутам. TITAN_CANCEL=0 — не отменять.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from contextvars import ContextVar
+
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from state.session import begin_generation, current_generation
+from utils.metrics import record
+from utils.profiling import profiled
+
+CANCEL_ENABLED = os.environ.get('TITAN_CANCEL', '1') != '0'
+
+# Причина отмены → HTTP-статус и текст ответа (499 — клиент ушёл, ответ не прочтут)
+CANCEL_STATUS = {'superseded': 409, 'disconnected': 499}
+CANCEL_MESSAGES = {
+    'superseded': 'Расчёт отменён: фильтры сессии изменились',
+    'disconnected': 'Расчёт отменён: клиент отключился',
+}
+
+# Токен отмены текущего запроса или None (фоновые задачи, выгрузки)
+_current_token: ContextVar = ContextVar('titan_cancel_token', default=None)
+
+
+class Cancelled(Exception):
+    """Расчёт отменён; reason — 'superseded' или 'disconnected'."""
+
+    def __init__(self, reason):
+        super().__init__(CANCEL_MESSAGES[reason])
+        self.reason = reason
+
+
+def begin(session_id, state):
+    """Токен отмены запроса с состоянием фильтров state (None — отмена выключена)."""
+    if not CANCEL_ENABLED:
+        return None
+    return {
+        'session_id': session_id,
+        'generation': begin_generation(session_id, state),
+        'disconnected': threading.Event(),
+        'start': time.perf_counter(),
+    }
+
+
+def cancel_reason(token):
+    """Почему расчёт под токеном пора прекратить (None — продолжать)."""
+    if token is None:
+        return None
+    if token['disconnected'].is_set():
+        return 'disconnected'
+    if current_generation(token['session_id']) != token['generation']:
+        return 'superseded'
+    return None
+
+
+def check(token):
+    """Cancelled, если расчёт под токеном вытеснен или клиент ушёл."""
+    reason = cancel_reason(token)
+    if reason:
+        raise Cancelled(reason)
+
+
+def checkpoint():
+    """Граница этапов конвейера: check() по токену текущего запроса (вне запроса — ничего)."""
+    check(_current_token.get())
+
+
+def record_cancel(token, reason):
+    """Отмена в метриках: этап cancelled.<причина>, секунды работы до отмены."""
+    record(f'cancelled.{reason}', time.perf_counter() - token['start'])
+
+
+async def _wait_disconnect(request, token):
+    # Тело запроса к этому моменту прочитано — дальше приходит только http.disconnect
+    while (await request.receive())['type'] != 'http.disconnect':
+        pass
+    token['disconnected'].set()
+
+
+def _checked(func, *args):
+    # Запрос мог быть вытеснен, пока ждал свободный поток
+    checkpoint()
+    return func(*args)
+
+
+async def run_cancellable(token, request, func, *args):
+    """func(*args) в пуле потоков под токеном; Cancelled — расчёт вытеснен или клиент ушёл.
+
+    Работа в потоке попадает в профиль запроса (utils/profiling.profiled).
+    """
+    if token is None:
+        return await run_in_threadpool(profiled(func), *args)
+    watcher = asyncio.ensure_future(_wait_disconnect(request, token))
+    # Пул потоков копирует контекст — checkpoint() в потоке видит токен
+    reset = _current_token.set(token)
+    try:
+        return await run_in_threadpool(profiled(_checked), func, *args)
+    except Cancelled as e:
+        record_cancel(token, e.reason)
+        raise
+    finally:
+        _current_token.reset(reset)
+        watcher.cancel()
+
+
+async def cancelled_handler(request, exc):
+    """Ответ на отменённый расчёт (обработчик исключения Cancelled)."""
+    return JSONResponse(status_code=CANCEL_STATUS[exc.reason],
+                        content={"error": str(exc), "cancelled": exc.reason})
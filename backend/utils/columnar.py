@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+utils/columnar.py — Колоночный формат ответов вкладок (по запросу клиента)
+
+Таблицы в ответах (списки записей: реестр заказов, тепловая карта ЕО,
+парето) в JSON повторяют имена полей в каждой записи. Клиент может
+запросить другой формат — заголовком Accept или параметром format=:
+- columns (application/vnd.titan.columns+json) — каждая таблица заменяется
+  на {"$columns": {поле: [значения]}}, остальной ответ без изменений;
+- arrow (application/vnd.apache.arrow.stream) — Arrow IPC stream с одной
+  таблицей (параметр table=<ключ>, по умолчанию самая большая), остальной
+  ответ — JSON в метаданных схемы (ключ 'titan'), таблица в нём — null.
+По умолчанию — обычный JSON. Потоковые ответы (разделы /api/dashboard)
+поддерживают columns построчно (wants_columns).
+"""
+
+import json
+import time
+from contextvars import ContextVar
+from urllib.parse import parse_qsl
+
+from utils.metrics import TimedJSONResponse, record
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+COLUMNS_MEDIA_TYPE = 'application/vnd.titan.columns+json'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+# Формат ответа текущего запроса: (формат, таблица для arrow) или None
+_response_format: ContextVar = ContextVar('titan_response_format', default=None)
+
+
+def _is_table(value):
+    return isinstance(value, list) and len(value) > 0 and all(isinstance(r, dict) for r in value)
+
+
+def records_to_columns(records):
+    """Список записей → {поле: [значения]} (поля — в порядке появления)."""
+    fields = {}
+    for r in records:
+        for k in r:
+            fields.setdefault(k, None)
+    return {k: [r.get(k) for r in records] for k in fields}
+
+
+def to_columns(payload):
+    """Заменить все таблицы ответа на {"$columns": ...}."""
+    if isinstance(payload, dict):
+        return {k: to_columns(v) for k, v in payload.items()}
+    if _is_table(payload):
+        return {"$columns": records_to_columns(payload)}
+    if isinstance(payload, list):
+        return [to_columns(v) for v in payload]
+    return payload
+
+
+def _find_tables(payload, path=()):
+    if isinstance(payload, dict):
+        for k, v in payload.items():
+            if _is_table(v):
+                yield path + (k,), v
+            else:
+                yield from _find_tables(v, path + (k,))
+
+
+def _arrow_array(values):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Смешанные типы в колонке — как строки
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def to_arrow_ipc(payload, table=None):
+    """Ответ → Arrow IPC stream. table — ключ (через точку) таблицы ответа."""
+    tables = dict(_find_tables(payload)) if isinstance(payload, dict) else {}
+    if table:
+        key = next((p for p in tables if '.'.join(p) == table or p[-1] == table), None)
+    else:
+        key = max(tables, key=lambda p: len(tables[p]), default=None)
+    if key is None:
+        raise ValueError(f"В ответе нет таблицы {table!r}" if table else "В ответе нет таблиц")
+
+    columns = records_to_columns(tables[key])
+    rest = json.loads(json.dumps(payload, ensure_ascii=False, default=str))
+    node = rest
+    for k in key[:-1]:
+        node = node[k]
+    node[key[-1]] = None
+    meta = {'titan': json.dumps(rest, ensure_ascii=False), 'titan_table': '.'.join(key)}
+
+    arrow_table = pa.Table.from_arrays([_arrow_array(v) for v in columns.values()], names=list(columns))
+    arrow_table = arrow_table.replace_schema_metadata(meta)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return sink.getvalue().to_pybytes()
+
+
+def negotiate_format(query_string, accept):
+    """(формат, таблица) по параметрам format/table и заголовку Accept."""
+    params = dict(parse_qsl(query_string))
+    fmt = params.get('format', '').lower()
+    if fmt not in ('columns', 'arrow'):
+        fmt = None
+        if ARROW_MEDIA_TYPE in accept:
+            fmt = 'arrow'
+        elif COLUMNS_MEDIA_TYPE in accept:
+            fmt = 'columns'
+    if fmt == 'arrow' and pa is None:
+        fmt = 'columns'
+    return (fmt, params.get('table')) if fmt else None
+
+
+def wants_columns():
+    """Клиент текущего запроса просил колоночный формат (для потоковых ответов: Arrow в них нет)."""
+    negotiated = _response_format.get()
+    return negotiated is not None and negotiated[0] in ('columns', 'arrow')
+
+
+class ColumnarMiddleware:
+    """ASGI-мидлварь: запоминает запрошенный формат ответа для ColumnarJSONResponse."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith('/api/'):
+            await self.app(scope, receive, send)
+            return
+        accept = ''
+        for key, value in scope.get('headers', []):
+            if key == b'accept':
+                accept = value.decode('latin-1')
+        token = _response_format.set(negotiate_format(scope.get('query_string', b'').decode('latin-1'), accept))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _response_format.reset(token)
+
+
+class ColumnarJSONResponse(TimedJSONResponse):
+    """Ответ по умолчанию: JSON, либо колоночный JSON / Arrow, если клиент попросил."""
+
+    def render(self, content):
+        negotiated = _response_format.get()
+        if negotiated is None or not isinstance(content, dict) or 'error' in content:
+            return super().render(content)
+        fmt, table = negotiated
+        if fmt == 'columns':
+            self.media_type = COLUMNS_MEDIA_TYPE
+            return super().render(to_columns(content))
+        t0 = time.perf_counter()
+        try:
+            body = to_arrow_ipc(content, table)
+        except ValueError:
+            # Таблицы нет — обычный JSON
+            return super().render(content)
+        record('arrow_render', time.perf_counter() - t0)
+        self.media_type = ARROW_MEDIA_TYPE
+        return body
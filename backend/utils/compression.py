@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+utils/compression.py — Сжатие ответов по Accept-Encoding
+
+br (если установлен пакет brotli) или gzip для текстовых и табличных
+ответов не меньше COMPRESS_MIN_BYTES. Ответ одним куском сжимается
+целиком, потоковый (NDJSON, выгрузки) — по мере отправки.
+"""
+
+import os
+import gzip
+import time
+import zlib
+
+from utils.metrics import record
+
+try:
+    import brotli
+except ImportError:
+    # Без brotli — только gzip
+    brotli = None
+
+# TITAN_COMPRESS=0 — отключить
+COMPRESS_ENABLED = os.environ.get('TITAN_COMPRESS', '1') != '0'
+# Меньшие ответы не сжимаются: выигрыша нет, а заголовки и CPU тратятся
+COMPRESS_MIN_BYTES = int(os.environ.get('TITAN_COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('TITAN_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('TITAN_BROTLI_QUALITY', '4'))
+
+# Что сжимать (xlsx/parquet уже сжаты внутри)
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/x-ndjson', 'application/vnd.titan.columns+json',
+    'application/vnd.apache.arrow.stream', 'text/',
+)
+
+
+def _accepted_encodings(header):
+    """Кодировки из Accept-Encoding с q > 0."""
+    accepted = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' или None."""
+    accepted = _accepted_encodings(accept_encoding or '')
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """Сжать ответ целиком."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class _StreamCompressor:
+    """Потоковое сжатие кусками с досылкой (flush) после каждого куска."""
+
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._write, self._flush, self._finish = self._c.process, self._c.flush, self._c.finish
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._write = self._c.compress
+            self._flush = lambda: self._c.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._c.flush
+
+    def chunk(self, data, last):
+        out = self._write(data) if data else b''
+        return out + (self._finish() if last else self._flush())
+
+
+def _header(headers, name):
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI-мидлварь: Content-Encoding br/gzip по Accept-Encoding клиента."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not COMPRESS_ENABLED or scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = None
+        for key, value in scope.get('headers', []):
+            if key == b'accept-encoding':
+                encoding = choose_encoding(value.decode('latin-1'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                content_type = _header(headers, b'content-type') or ''
+                if (_header(headers, b'content-encoding') is not None
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                    await send(message)
+                    return
+                # Ждём первый кусок тела: по нему решаем, сжимать ли
+                start = {**message, 'headers': headers}
+                return
+            if start is None:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more = message.get('more_body', False)
+            if compressor is None:
+                headers = start['headers']
+                if not more and len(body) < COMPRESS_MIN_BYTES:
+                    start['headers'] = headers + [(b'vary', b'Accept-Encoding')]
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                headers = [(k, v) for k, v in headers if k.lower() != b'content-length']
+                headers += [(b'content-encoding', encoding.encode()), (b'vary', b'Accept-Encoding')]
+                if not more:
+                    t0 = time.perf_counter()
+                    packed = compress(body, encoding)
+                    record('compress', time.perf_counter() - t0)
+                    headers.append((b'content-length', str(len(packed)).encode()))
+                    await send({**start, 'headers': headers})
+                    start = None
+                    await send({'type': 'http.response.body', 'body': packed})
+                    return
+                compressor = _StreamCompressor(encoding)
+                await send({**start, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': compressor.chunk(body, not more),
+                        'more_body': more})
+
+        await self.app(scope, receive, send_compressed)
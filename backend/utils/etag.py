@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+utils/etag.py — Условные запросы (ETag / 304) для вкладок
+
+Ответ вкладки — функция от (сессия, версия данных сессии, путь, параметры
+запроса). ETag строится из них без обращения к данным; при совпадении
+с If-None-Match ответ 304 отдаётся до любой работы pandas. Дозагрузка
+(update_session_data) поднимает версию — и тег меняется. С фильтром
+baseline='history' в тег входит и версия исторической базы.
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+from urllib.parse import parse_qsl
+
+from state.session import session_version
+from core.baseline_store import store_version
+from utils.metrics import record
+
+# TITAN_ETAG=0 — отключить
+ETAG_ENABLED = os.environ.get('TITAN_ETAG', '1') != '0'
+# max-age для браузера, сек; 0 — всегда перепроверять (no-cache)
+ETAG_MAX_AGE = int(os.environ.get('TITAN_ETAG_MAX_AGE', '0'))
+
+# GET-маршруты, чей ответ зависит только от данных сессии и параметров
+CACHEABLE_PREFIXES = ('/api/tab/', '/api/kpi', '/api/filters/options', '/api/hierarchy/tree')
+
+# Параметры, не влияющие на содержимое ответа
+_IGNORED_PARAMS = ('profile',)
+# JSON-параметры: приводятся к каноническому виду (порядок ключей не важен)
+_JSON_PARAMS = ('filters', 'thresholds')
+
+# Сессии живут в памяти процесса, а ответы зависят от кода — теги
+# прошлого запуска (или прошлой версии приложения) недействительны
+_EPOCH = uuid.uuid4().hex[:8]
+
+CACHE_CONTROL = f"private, max-age={ETAG_MAX_AGE}" if ETAG_MAX_AGE > 0 else "private, no-cache"
+
+
+def _canonical(key, value):
+    if key in _JSON_PARAMS:
+        try:
+            return json.dumps(json.loads(value), sort_keys=True, ensure_ascii=False)
+        except ValueError:
+            return value
+    return value
+
+
+def compute_etag(path, query_string, version, accept=''):
+    """Слабый ETag ответа по пути, параметрам, формату (Accept) и версии данных сессии."""
+    params = sorted((k, _canonical(k, v)) for k, v in parse_qsl(query_string, keep_blank_values=True)
+                    if k not in _IGNORED_PARAMS)
+    raw = json.dumps([_EPOCH, path, version, params, accept], ensure_ascii=False)
+    return 'W/"' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def _uses_history(query_string):
+    """Фильтр baseline='history' в параметре filters."""
+    try:
+        filters = json.loads(dict(parse_qsl(query_string)).get('filters') or '{}')
+    except ValueError:
+        return False
+    return isinstance(filters, dict) and filters.get('baseline') == 'history'
+
+
+def _matches(if_none_match, etag):
+    if if_none_match.strip() == '*':
+        return True
+    # Сравнение слабое: W/ не учитывается
+    bare = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == bare:
+            return True
+    return False
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+class ETagMiddleware:
+    """ASGI-мидлварь: ETag и Cache-Control для вкладок, 304 по If-None-Match."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (not ETAG_ENABLED or scope['type'] != 'http' or scope.get('method') != 'GET'
+                or not scope['path'].startswith(CACHEABLE_PREFIXES)):
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        query = scope.get('query_string', b'').decode('latin-1')
+        session_id = dict(parse_qsl(query)).get('session_id')
+        version = session_version(session_id) if session_id else None
+        if version is None:
+            # Нет сессии — ответ (404) формирует сам маршрут
+            await self.app(scope, receive, send)
+            return
+
+        if _uses_history(query):
+            version = (version, store_version())
+        etag = compute_etag(scope['path'], query, version, _header(scope, b'accept') or '')
+        headers = [(b'etag', etag.encode('latin-1')), (b'cache-control', CACHE_CONTROL.encode('latin-1')),
+                   (b'vary', b'Accept')]
+
+        if_none_match = _header(scope, b'if-none-match')
+        if if_none_match and _matches(if_none_match, etag):
+            # У вкладок нет параметров пути — путь и есть шаблон маршрута
+            scope.setdefault('state', {})['route_label'] = scope['path']
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            record('etag_not_modified', time.perf_counter() - t0)
+            return
+
+        async def send_with_etag(message):
+            if message['type'] == 'http.response.start' and message['status'] == 200:
+                message['headers'] = list(message.get('headers', [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -1,21 +1,218 @@
 # -*- coding: utf-8 -*-
 """
-utils/export.py — Экспорт данных в Excel
+utils/export.py — Потоковый экспорт данных (xlsx / csv / parquet)
+
+Файл пишется чанками во временный файл (память не зависит от числа строк)
+и отдаётся клиенту кусками через iter_file().
 """
 
+import os
+import tempfile
+import numpy as np
 import pandas as pd
-from io import BytesIO
+
+# Строк в одном чанке записи
+CHUNK_ROWS = 50_000
+# xlsx пишется построчно и медленно — чанк меньше, чтобы чаще отдавать прогресс
+XLSX_CHUNK_ROWS = 5_000
+# Размер куска при отдаче файла клиенту
+STREAM_CHUNK_BYTES = 1 << 20
+# Лимит строк на лист Excel (без строки заголовка)
+XLSX_MAX_ROWS = 1_048_575
+
+EXPORT_FORMATS = {
+    'xlsx': {
+        'ext': 'xlsx',
+        'media_type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    },
+    'csv': {
+        'ext': 'csv',
+        'media_type': 'text/csv',
+    },
+    'parquet': {
+        'ext': 'parquet',
+        'media_type': 'application/vnd.apache.parquet',
+    },
+}
+
+CSV_ENCODINGS = ('utf-8-sig', 'cp1251')
+
+
+def public_columns(df):
+    """Колонки для выгрузки — без служебных (с префиксом '_')."""
+    return [c for c in df.columns if not str(c).startswith('_')]
+
+
+def project_columns(df, columns):
+    """Оставить только запрошенные колонки (в порядке запроса, неизвестные пропускаются).
+
+    Без списка — все колонки, кроме служебных.
+    """
+    cols = [c for c in columns if c in df.columns] if columns else []
+    if not cols:
+        cols = public_columns(df)
+    return df[cols] if len(cols) < len(df.columns) else df
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _xlsx_values(chunk):
+    """Колонки чанка → списки python-значений для xlsxwriter (NaN/NaT → None)."""
+    columns = []
+    for col in chunk.columns:
+        s = chunk[col]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            vals = s.dt.to_pydatetime().tolist()
+            na = s.isna().to_numpy()
+            columns.append([None if na[i] else v for i, v in enumerate(vals)])
+        elif pd.api.types.is_bool_dtype(s):
+            columns.append(s.tolist())
+        elif pd.api.types.is_numeric_dtype(s):
+            arr = s.to_numpy(dtype=float, na_value=np.nan)
+            columns.append([None if v != v or v in (np.inf, -np.inf) else v for v in arr.tolist()])
+        else:
+            na = s.isna().to_numpy()
+            vals = s.astype(object).tolist()
+            columns.append([None if na[i] else str(v) for i, v in enumerate(vals)])
+    return columns
+
+
+def _write_xlsx(df, path, sheet_name, chunk_rows, progress):
+    import xlsxwriter
+
+    wb = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'default_date_format': 'dd.mm.yyyy',
+        'strings_to_numbers': False,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+    })
+    header = [str(c) for c in df.columns]
+    ws = None
+    sheet_no = 0
+    row = XLSX_MAX_ROWS + 1
+    written = 0
+    try:
+        for chunk in _chunks(df, chunk_rows):
+            for values in zip(*_xlsx_values(chunk)):
+                if row > XLSX_MAX_ROWS:
+                    sheet_no += 1
+                    name = sheet_name if sheet_no == 1 else f"{sheet_name[:26]}_{sheet_no}"
+                    ws = wb.add_worksheet(name[:31])
+                    ws.write_row(0, 0, header)
+                    row = 1
+                ws.write_row(row, 0, values)
+                row += 1
+            written += len(chunk)
+            if progress:
+                progress(written)
+        if ws is None:
+            ws = wb.add_worksheet(sheet_name[:31])
+            ws.write_row(0, 0, header)
+    finally:
+        wb.close()
+
+
+def _write_csv(df, path, encoding, chunk_rows, progress):
+    written = 0
+    with open(path, 'w', encoding=encoding, errors='replace', newline='') as f:
+        if len(df) == 0:
+            df.to_csv(f, sep=';', index=False)
+        for chunk in _chunks(df, chunk_rows):
+            chunk.to_csv(f, sep=';', index=False, header=(written == 0), date_format='%d.%m.%Y')
+            written += len(chunk)
+            if progress:
+                progress(written)
+
+
+def _parquet_schema(df, pa):
+    """Схема parquet по всему фрейму (а не по первому чанку).
+
+    Типы — по dtype колонок; у object-колонок (dtype типа не задаёт) — по
+    непустым значениям всей колонки. Колонки из одних пустых значений и со
+    смешанными типами — string; вторые возвращаются списком: их значения
+    приводятся к строкам в каждом чанке.
+    """
+    schema = pa.Schema.from_pandas(df.head(0), preserve_index=False)
+    text_columns = []
+    for i, field in enumerate(schema):
+        if not pa.types.is_null(field.type):
+            continue
+        values = df[field.name].dropna()
+        try:
+            typ = pa.array(values, from_pandas=True).type if len(values) else pa.null()
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            typ = pa.string()
+            text_columns.append(field.name)
+        if pa.types.is_null(typ):
+            typ = pa.string()
+        schema = schema.set(i, pa.field(field.name, typ))
+    return schema, text_columns
+
+
+def _write_parquet(df, path, chunk_rows, progress):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Формат parquet недоступен: не установлен pyarrow")
+
+    schema, text_columns = _parquet_schema(df, pa)
+    written = 0
+    with pq.ParquetWriter(path, schema, compression='snappy') as writer:
+        for chunk in _chunks(df, chunk_rows):
+            if text_columns:
+                chunk = chunk.assign(**{c: chunk[c].astype('string') for c in text_columns})
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            written += len(chunk)
+            if progress:
+                progress(written)
+
+
+def write_export(df, path, fmt='xlsx', columns=None, encoding='utf-8-sig',
+                 sheet_name='Данные', chunk_rows=CHUNK_ROWS, progress=None):
+    """Записать DataFrame в файл path чанками.
+
+    progress — необязательный callback(rows_written), вызывается после каждого чанка.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+    df = project_columns(df, columns)
+    if fmt == 'xlsx':
+        _write_xlsx(df, path, sheet_name, min(chunk_rows, XLSX_CHUNK_ROWS), progress)
+    elif fmt == 'csv':
+        if encoding not in CSV_ENCODINGS:
+            raise ValueError(f"Неподдерживаемая кодировка CSV: {encoding}")
+        _write_csv(df, path, encoding, chunk_rows, progress)
+    else:
+        _write_parquet(df, path, chunk_rows, progress)
+    return path
+
+
+def export_to_tempfile(df, fmt='xlsx', **kwargs):
+    """Записать экспорт во временный файл, вернуть путь к нему."""
+    fd, path = tempfile.mkstemp(prefix='titan_export_', suffix=f".{EXPORT_FORMATS.get(fmt, {}).get('ext', 'bin')}")
+    os.close(fd)
+    try:
+        write_export(df, path, fmt, **kwargs)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
 
 
-def create_excel_download(df, filename_prefix="export"):
-    """Создать Excel-файл (.xlsx) для скачивания."""
-    output = BytesIO()
+def iter_file(path, chunk_size=STREAM_CHUNK_BYTES, delete=True):
+    """Отдать файл кусками; по окончании (или обрыве) удалить его."""
     try:
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Данные')
-    except ModuleNotFoundError:
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Данные')
-    output.seek(0)
-    return output
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                yield data
+    finally:
+        if delete and os.path.exists(path):
+            os.remove(path)
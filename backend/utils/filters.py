@@ -5,6 +5,7 @@ utils/filters.py — Работа с фильтрами
 
 import pandas as pd
 from config.constants import HIERARCHY_LEVELS
+from utils.metrics import timed
 
 
 def get_hierarchy_options(df, level_key, parent_filters):
@@ -20,6 +21,7 @@ def get_hierarchy_options(df, level_key, parent_filters):
     return sorted(options)
 
 
+@timed()
 def apply_hierarchy_filters(df, hierarchy_filters):
     """Применить иерархические фильтры к DataFrame."""
     df_filtered = df
@@ -31,6 +33,7 @@ def apply_hierarchy_filters(df, hierarchy_filters):
     return df_filtered
 
 
+@timed()
 def apply_extra_filters(df, extra_filters):
     """Применить дополнительные фильтры."""
     mask = pd.Series(True, index=df.index)
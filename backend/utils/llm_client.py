@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+utils/llm_client.py — Клиент LLM-провайдеров чата (DeepSeek → Ollama)
+
+Один долгоживущий httpx.AsyncClient с пулом keep-alive соединений на
+процесс (закрывается при остановке приложения), доступность Ollama
+кэшируется на HEALTH_TTL секунд. Ответ — целиком (complete) или потоком
+токенов (stream): DeepSeek отдаёт SSE (data: {...choices[0].delta}),
+Ollama — NDJSON ({"message": {"content"}, "done"}). С инструментами
+(core/chat_tools.py) модель сначала вызывает их, ответ — после; в потоке
+каждый раунд идёт потоком, вызовы инструментов собираются из него.
+Инструменты (pandas) выполняются в пуле потоков, не в цикле событий.
+
+Адреса и модели настраиваются переменными окружения (и .env рядом с
+backend), так что для проверки можно поднять заглушку bench/llm_stub.py.
+"""
+
+import os
+import json
+import time
+import asyncio
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+
+# ── Загрузка .env ──
+
+def _load_env():
+    for p in [os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env"),
+              os.path.join(os.path.dirname(__file__), "..", ".env")]:
+        if os.path.exists(p):
+            with open(p) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#") and "=" in line:
+                        k, v = line.split("=", 1)
+                        os.environ.setdefault(k.strip(), v.strip())
+
+_load_env()
+
+# ── Конфигурация ──
+
+DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
+DEEPSEEK_API_URL = os.environ.get("TITAN_DEEPSEEK_URL", "https://api.deepseek.com/chat/completions")
+DEEPSEEK_MODEL = os.environ.get("TITAN_DEEPSEEK_MODEL", "deepseek-chat")
+
+OLLAMA_BASE_URL = os.environ.get("TITAN_OLLAMA_URL", "http://localhost:11434").rstrip("/")
+OLLAMA_MODEL = os.environ.get("TITAN_OLLAMA_MODEL", "qwen3:4b")
+
+# Сколько секунд доверять последней проверке Ollama
+HEALTH_TTL = float(os.environ.get("TITAN_LLM_HEALTH_TTL", "30"))
+HEALTH_TIMEOUT = 3.0
+DEEPSEEK_TIMEOUT = 60.0
+OLLAMA_TIMEOUT = 120.0
+# Предел раундов вызова инструментов на один вопрос
+MAX_TOOL_ROUNDS = int(os.environ.get("TITAN_CHAT_TOOL_ROUNDS", "4"))
+
+_client = None
+# Доступность Ollama: [значение, момент проверки]
+_ollama_health = [False, 0.0]
+_health_lock = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Общий клиент с пулом соединений (создаётся при первом обращении)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=HEALTH_TIMEOUT),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+        )
+    return _client
+
+
+async def close_client():
+    """Закрыть общий клиент (остановка приложения)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _mark_ollama(available):
+    _ollama_health[0] = available
+    _ollama_health[1] = time.monotonic()
+
+
+async def check_ollama(force: bool = False) -> bool:
+    """Доступность Ollama с кэшем на HEALTH_TTL; одновременные проверки объединяются."""
+    global _health_lock
+    if not force and time.monotonic() - _ollama_health[1] < HEALTH_TTL:
+        return _ollama_health[0]
+    if _health_lock is None:
+        _health_lock = asyncio.Lock()
+    async with _health_lock:
+        # Пока ждали блокировку, проверку мог сделать другой запрос
+        if not force and time.monotonic() - _ollama_health[1] < HEALTH_TTL:
+            return _ollama_health[0]
+        try:
+            resp = await get_client().get(f"{OLLAMA_BASE_URL}/api/tags", timeout=HEALTH_TIMEOUT)
+            _mark_ollama(resp.status_code == 200)
+        except Exception:
+            _mark_ollama(False)
+        return _ollama_health[0]
+
+
+async def provider_status() -> dict:
+    """Какой провайдер будет использован."""
+    has_ds = bool(DEEPSEEK_API_KEY)
+    has_ol = await check_ollama()
+    return {
+        "available": has_ds or has_ol,
+        "provider": "deepseek" if has_ds else ("ollama" if has_ol else "none"),
+    }
+
+
+def _deepseek_request(messages, stream, tools=None):
+    headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
+    payload = {"model": DEEPSEEK_MODEL, "messages": messages, "max_tokens": 2000,
+               "temperature": 0.3, "stream": stream}
+    if tools:
+        payload["tools"] = tools
+    return get_client().build_request("POST", DEEPSEEK_API_URL, json=payload, headers=headers,
+                                      timeout=DEEPSEEK_TIMEOUT)
+
+
+def _ollama_request(messages, stream, tools=None):
+    payload = {"model": OLLAMA_MODEL, "messages": messages, "stream": stream}
+    if tools:
+        payload["tools"] = tools
+    return get_client().build_request("POST", f"{OLLAMA_BASE_URL}/api/chat", json=payload,
+                                      timeout=OLLAMA_TIMEOUT)
+
+
+async def _query_deepseek(messages: list[dict]) -> str:
+    resp = await get_client().send(_deepseek_request(messages, False))
+    resp.raise_for_status()
+    return resp.json()["choices"][0]["message"]["content"]
+
+
+async def _query_ollama(messages: list[dict]) -> str:
+    resp = await get_client().send(_ollama_request(messages, False))
+    resp.raise_for_status()
+    return resp.json().get("message", {}).get("content", "Нет ответа от модели.")
+
+
+def _merge_call_delta(calls, part):
+    """Фрагмент вызова инструмента из потока DeepSeek → calls (аргументы приходят кусками)."""
+    index = part.get("index", len(calls))
+    while len(calls) <= index:
+        calls.append({"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+    call = calls[index]
+    if part.get("id"):
+        call["id"] = part["id"]
+    fn = part.get("function") or {}
+    call["function"]["name"] += fn.get("name") or ""
+    call["function"]["arguments"] += fn.get("arguments") or ""
+
+
+async def _stream_deepseek(messages, tools=None, calls=None):
+    """Токены ответа; вызовы инструментов (если tools) — в список calls."""
+    resp = await get_client().send(_deepseek_request(messages, True, tools), stream=True)
+    try:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            delta = json.loads(data)["choices"][0].get("delta", {})
+            for part in delta.get("tool_calls") or []:
+                _merge_call_delta(calls, part)
+            if delta.get("content"):
+                yield delta["content"]
+    finally:
+        await resp.aclose()
+
+
+async def _stream_ollama(messages, tools=None, calls=None):
+    """Токены ответа; вызовы инструментов (если tools) — в список calls."""
+    resp = await get_client().send(_ollama_request(messages, True, tools), stream=True)
+    try:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            message = chunk.get("message", {})
+            if message.get("tool_calls"):
+                calls.extend(message["tool_calls"])
+            token = message.get("content")
+            if token:
+                yield token
+            if chunk.get("done"):
+                break
+    finally:
+        await resp.aclose()
+
+
+# ── Вызовы инструментов ──
+
+def _tool_calls(message):
+    """Вызовы инструментов из ответа модели: [(id, имя, аргументы)].
+
+    DeepSeek (формат OpenAI) передаёт аргументы JSON-строкой, Ollama — объектом.
+    """
+    calls = []
+    for i, call in enumerate(message.get("tool_calls") or []):
+        fn = call.get("function", {})
+        args = fn.get("arguments") or {}
+        if isinstance(args, str):
+            try:
+                args = json.loads(args)
+            except ValueError:
+                args = {}
+        calls.append((call.get("id") or f"call_{i}", fn.get("name", ""), args))
+    return calls
+
+
+def _tool_message(provider, call_id, name, result):
+    content = json.dumps(result, ensure_ascii=False, default=str)
+    if provider == "deepseek":
+        return {"role": "tool", "tool_call_id": call_id, "content": content}
+    return {"role": "tool", "tool_name": name, "content": content}
+
+
+async def _ask(provider, messages, tools):
+    """Один запрос без потока → сообщение ассистента (dict)."""
+    if provider == "deepseek":
+        resp = await get_client().send(_deepseek_request(messages, False, tools))
+        resp.raise_for_status()
+        return resp.json()["choices"][0]["message"]
+    resp = await get_client().send(_ollama_request(messages, False, tools))
+    resp.raise_for_status()
+    return resp.json().get("message", {})
+
+
+async def _run_tools(provider, messages, message, tools):
+    """Выполнить вызовы инструментов из ответа модели, дописать их в messages."""
+    messages.append({"role": "assistant", "content": message.get("content") or "",
+                     "tool_calls": message["tool_calls"]})
+    for call_id, name, args in _tool_calls(message):
+        if tools.get("on_call"):
+            await tools["on_call"](name, args)
+        result = await run_in_threadpool(tools["execute"], name, args)
+        messages.append(_tool_message(provider, call_id, name, result))
+
+
+async def _answer_with_tools(provider, messages, tools):
+    """Диалог с вызовами инструментов до текстового ответа.
+
+    tools — {'specs': описания для модели, 'execute': (имя, аргументы) → результат
+    (синхронная, выполняется в пуле потоков), 'on_call': необязательный
+    обработчик (имя, аргументы)}. Возвращает текст ответа.
+    """
+    messages = list(messages)
+    for _ in range(MAX_TOOL_ROUNDS):
+        message = await _ask(provider, messages, tools["specs"])
+        if not _tool_calls(message):
+            return message.get("content") or ""
+        await _run_tools(provider, messages, message, tools)
+    # Модель не остановилась — последний ответ без инструментов
+    return (await _ask(provider, messages, None)).get("content") or ""
+
+
+async def _stream_with_tools(provider, messages, tools):
+    """То же потоком: каждый раунд идёт потоком, раунд без вызовов инструментов — ответ."""
+    generator = _stream_deepseek if provider == "deepseek" else _stream_ollama
+    messages = list(messages)
+    for _ in range(MAX_TOOL_ROUNDS):
+        calls, parts = [], []
+        async for token in generator(messages, tools["specs"], calls):
+            parts.append(token)
+            yield token
+        if not calls:
+            return
+        await _run_tools(provider, messages, {"content": "".join(parts), "tool_calls": calls}, tools)
+    async for token in generator(messages):
+        yield token
+
+
+async def _fallback_messages(messages, plain_messages):
+    """Сообщения для модели без инструментов: plain_messages() строит полную сводку (pandas)."""
+    return await run_in_threadpool(plain_messages) if plain_messages else messages
+
+
+def _providers():
+    providers = []
+    if DEEPSEEK_API_KEY:
+        providers.append("deepseek")
+    providers.append("ollama")
+    return providers
+
+
+async def complete(messages: list[dict], tools=None, plain_messages=None):
+    """Ответ целиком: (текст, провайдер) или (None, None), если LLM недоступна.
+
+    Приоритет: DeepSeek API → Ollama. С tools модель может вызывать
+    инструменты; если провайдер (модель) их не поддерживает — повтор
+    без инструментов с plain_messages() — функцией, строящей промпт
+    с полной сводкой (только при таком откате).
+    """
+    for provider in _providers():
+        if provider == "ollama" and not await check_ollama():
+            continue
+        try:
+            if tools:
+                try:
+                    return await _answer_with_tools(provider, messages, tools), provider
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 400:
+                        raise
+                    print(f"[Chat] {provider}: инструменты не поддерживаются ({e})")
+            query = _query_deepseek if provider == "deepseek" else _query_ollama
+            return await query(await _fallback_messages(messages, plain_messages)), provider
+        except Exception as e:
+            if provider == "ollama":
+                # Упавший провайдер не проверять заново до истечения TTL
+                _mark_ollama(False)
+            print(f"[Chat] {provider} error: {e}")
+    return None, None
+
+
+async def stream(messages: list[dict], tools=None, plain_messages=None):
+    """Ответ по мере генерации: пары (провайдер, токен).
+
+    С tools каждый раунд идёт потоком (обработчик tools['on_call'] сообщает
+    о каждом вызове инструмента), токены ответа — по мере генерации;
+    если инструменты не поддерживаются — обычный поток по plain_messages().
+    Если провайдер упал до первого токена — следующий по приоритету;
+    после первого токена ошибка пробрасывается (ответ уже частично отдан).
+    Ничего не отдано — LLM недоступна.
+    """
+    generators = {"deepseek": _stream_deepseek, "ollama": _stream_ollama}
+    for name in _providers():
+        if name == "ollama" and not await check_ollama():
+            continue
+        started = False
+        try:
+            if tools:
+                try:
+                    async for token in _stream_with_tools(name, messages, tools):
+                        started = True
+                        yield name, token
+                    return
+                except httpx.HTTPStatusError as e:
+                    if started or e.response.status_code != 400:
+                        raise
+                    print(f"[Chat] {name}: инструменты не поддерживаются ({e})")
+            async for token in generators[name](await _fallback_messages(messages, plain_messages)):
+                started = True
+                yield name, token
+            return
+        except Exception as e:
+            if started:
+                raise
+            if name == "ollama":
+                _mark_ollama(False)
+            print(f"[Chat] {name} error: {e}")
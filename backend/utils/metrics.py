@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+utils/metrics.py — Замеры этапов конвейера запроса
+
+Этапы (загрузка файла, обработка, фильтры, агрегаты, методы скоринга,
+сериализация JSON) замеряются через timed / stage / stage_laps. Внутри
+запроса замеры копятся в списке запроса и сбрасываются в гистограммы
+одним захватом блокировки, когда MetricsMiddleware узнаёт шаблон маршрута.
+Вне запроса (фоновые потоки) — сразу в гистограммы с route="background".
+Наружу — текстовый формат Prometheus (GET /api/metrics). Запросы дольше
+SLOW_REQUEST_SEC попадают в кольцевой журнал с разбивкой по этапам
+(GET /api/metrics/slow).
+"""
+
+import os
+import time
+import bisect
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi.responses import JSONResponse
+
+# TITAN_METRICS=0 — отключить замеры
+METRICS_ENABLED = os.environ.get('TITAN_METRICS', '1') != '0'
+
+# Границы корзин гистограммы, сек
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+NO_ROUTE = 'background'
+
+# Порог «медленного» запроса, сек, и размер журнала медленных запросов
+SLOW_REQUEST_SEC = float(os.environ.get('TITAN_SLOW_REQUEST_SEC', '1.0'))
+SLOW_LOG_SIZE = int(os.environ.get('TITAN_SLOW_LOG_SIZE', '50'))
+
+# (route, stage) → [счётчики по корзинам (+Inf последней), сумма сек, кол-во, строк]
+_histograms: dict = {}
+_lock = threading.Lock()
+_slow_requests = deque(maxlen=SLOW_LOG_SIZE)
+
+# Замеры текущего запроса: список (stage, сек, строк) или None вне запроса
+_request_samples: ContextVar = ContextVar('titan_request_samples', default=None)
+
+
+def _observe(route, stage, seconds, rows):
+    h = _histograms.get((route, stage))
+    if h is None:
+        h = _histograms[(route, stage)] = [[0] * (len(BUCKETS) + 1), 0.0, 0, 0]
+    h[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+    h[1] += seconds
+    h[2] += 1
+    if rows:
+        h[3] += rows
+
+
+def record(stage, seconds, rows=None):
+    """Зафиксировать длительность этапа (и число обработанных строк)."""
+    if not METRICS_ENABLED:
+        return
+    samples = _request_samples.get()
+    if samples is not None:
+        samples.append((stage, seconds, rows))
+        return
+    with _lock:
+        _observe(NO_ROUTE, stage, seconds, rows)
+
+
+def _rows_of(obj):
+    """Число строк у DataFrame/Series, иначе None."""
+    return len(obj) if hasattr(obj, 'index') and hasattr(obj, 'shape') else None
+
+
+@contextmanager
+def stage(name, rows=None):
+    """with stage('имя', rows=len(df)): ... — замер блока кода."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0, rows)
+
+
+def timed(name=None):
+    """Декоратор: замер вызова функции.
+
+    Строки — по первому аргументу-DataFrame, иначе по результату (load_file).
+    """
+    def decorator(func):
+        stage_name = name or func.__name__.lstrip('_')
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return func(*args, **kwargs)
+            t0 = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                rows = _rows_of(args[0]) if args else None
+                record(stage_name, time.perf_counter() - t0, rows if rows is not None else _rows_of(result))
+        return wrapper
+    return decorator
+
+
+def stage_laps(prefix, rows=None):
+    """Последовательные подэтапы длинной функции без лишних отступов.
+
+    lap = stage_laps('process_data', len(df)); ...; lap('rename'); ...; lap('dates')
+    — каждый вызов фиксирует время от предыдущего как '<prefix>.<имя>'.
+    """
+    last = [time.perf_counter()]
+
+    def lap(name):
+        now = time.perf_counter()
+        record(f"{prefix}.{name}", now - last[0], rows)
+        last[0] = now
+    return lap
+
+
+def _route_label(scope):
+    route = scope.get('route')
+    # Ответ мимо маршрутизатора (304 из ETagMiddleware) — метку ставит мидлварь
+    path = getattr(route, 'path', None) or scope.get('state', {}).get('route_label')
+    # Шаблон маршрута (/api/session/{session_id}/...), а не сырой путь — иначе
+    # по метке на каждую сессию
+    return path if path else 'unmatched'
+
+
+def _stage_breakdown(samples):
+    """Замеры запроса → {этап: {seconds, calls, rows}} в порядке первого появления."""
+    stages = {}
+    for name, seconds, rows in samples:
+        st = stages.get(name)
+        if st is None:
+            st = stages[name] = {"seconds": 0.0, "calls": 0, "rows": 0}
+        st["seconds"] += seconds
+        st["calls"] += 1
+        st["rows"] += rows or 0
+    for st in stages.values():
+        st["seconds"] = round(st["seconds"], 4)
+    return stages
+
+
+def _log_slow(scope, route, status, elapsed, samples):
+    _slow_requests.append({
+        "time": time.time(),
+        "method": scope.get('method'),
+        "path": scope.get('path'),
+        "query": scope.get('query_string', b'').decode('latin-1'),
+        "route": route,
+        "status": status,
+        "duration": round(elapsed, 4),
+        "profile_id": scope.get('state', {}).get('profile_id'),
+        "stages": _stage_breakdown(samples),
+    })
+
+
+def slow_requests():
+    """Журнал медленных запросов, новые первыми."""
+    with _lock:
+        return list(reversed(_slow_requests))
+
+
+class MetricsMiddleware:
+    """ASGI-мидлварь: общий замер запроса, сброс замеров этапов по маршруту,
+    журнал медленных запросов."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        samples = []
+        status = []
+        token = _request_samples.set(samples)
+
+        async def send_status(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _request_samples.reset(token)
+            route = _route_label(scope)
+            with _lock:
+                _observe(route, 'request', elapsed, None)
+                for name, seconds, rows in samples:
+                    _observe(route, name, seconds, rows)
+                if elapsed >= SLOW_REQUEST_SEC:
+                    _log_slow(scope, route, status[0] if status else None, elapsed, samples)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse с замером сериализации (этап json_render)."""
+
+    def render(self, content):
+        t0 = time.perf_counter()
+        body = super().render(content)
+        record('json_render', time.perf_counter() - t0)
+        return body
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """Гистограммы этапов в текстовом формате Prometheus 0.0.4."""
+    with _lock:
+        snapshot = {k: (list(v[0]), v[1], v[2], v[3]) for k, v in _histograms.items()}
+
+    lines = [
+        '# HELP titan_stage_duration_seconds Длительность этапов конвейера по маршрутам',
+        '# TYPE titan_stage_duration_seconds histogram',
+    ]
+    rows_lines = [
+        '# HELP titan_stage_rows_total Строк обработано этапом',
+        '# TYPE titan_stage_rows_total counter',
+    ]
+    for (route, name), (counts, total, n, rows) in sorted(snapshot.items()):
+        labels = f'route="{_escape(route)}",stage="{_escape(name)}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS, counts):
+            cumulative += count
+            lines.append(f'titan_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'titan_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {n}')
+        lines.append(f'titan_stage_duration_seconds_sum{{{labels}}} {_fmt(total)}')
+        lines.append(f'titan_stage_duration_seconds_count{{{labels}}} {n}')
+        if rows:
+            rows_lines.append(f'titan_stage_rows_total{{{labels}}} {rows}')
+    return '\n'.join(lines + rows_lines) + '\n'
+
+
+def reset_metrics():
+    """Сбросить все гистограммы."""
+    with _lock:
+        _histograms.clear()
+        _slow_requests.clear()
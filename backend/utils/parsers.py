@@ -5,6 +5,7 @@ utils/parsers.py — Парсинг данных
 Функции для преобразования данных из выгрузки SAP.
 """
 
+import numpy as np
 import pandas as pd
 
 
@@ -40,3 +41,24 @@ def safe_parse_datetime(series):
             return pd.to_datetime(cleaned, errors='coerce')
         except Exception:
             return pd.NaT
+
+
+def parse_dates(series):
+    """
+    Даты уже обработанных данных (пакеты внешнего скоринга, экспорт).
+
+    ISO 8601 ('2024-05-05', '2024-05-05T08:00:00Z'), остальное — ДД.ММ.ГГГГ,
+    как в CSV-экспорте. Оба формата разбираются векторно.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.tz_convert(None) if series.dt.tz is not None else series
+    # Даты в пакете повторяются — разбираются только уникальные значения
+    codes, uniques = pd.factorize(series)
+    values = pd.Series(uniques)
+    parsed = pd.to_datetime(values, errors='coerce', format='ISO8601', utc=True).dt.tz_convert(None)
+    rest = parsed.isna()
+    if rest.any():
+        parsed = parsed.where(~rest, pd.to_datetime(values.where(rest), errors='coerce', format='%d.%m.%Y'))
+    result = parsed.to_numpy()[codes]
+    result[codes < 0] = np.datetime64('NaT')
+    return pd.Series(result, index=series.index, name=series.name)
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+utils/profiling.py — Профилирование отдельного запроса по требованию
+
+Включается конфигом (TITAN_PROFILING=1) и параметром запроса к любому /api/*:
+- profile=1 — детерминированный cProfile: <id>.prof (pstats/snakeviz) и топ функций;
+- profile=sample — сэмплирование стеков потоков запроса: <id>.folded
+  (формат flamegraph.pl / speedscope) и топ функций по собственным сэмплам.
+Профилируется не только поток цикла событий, но и все потоки, делающие
+работу запроса: пул обработчиков (run_in_threadpool), разделы дашборда,
+методы скоринга. Профиль запроса передаётся через contextvar, работа в
+потоке оборачивается profiled(): cProfile — свой на поток (профили потоков
+сливаются в один; с Python 3.12 профилировщик один на интерпретатор — потоки
+запроса сэмплируются, сводка worker_top), сэмплер — снимает стек и этого потока.
+Файлы складываются в PROFILE_DIR, ответ получает заголовок X-Profile-Id;
+сводка — GET /api/profiles/{id}. Одновременно профилируется один запрос.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import tempfile
+import threading
+import functools
+from collections import Counter
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+PROFILING_ENABLED = os.environ.get('TITAN_PROFILING', '0') == '1'
+PROFILE_DIR = os.environ.get('TITAN_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'titan_profiles'))
+# Сколько последних профилей хранить на диске
+PROFILE_KEEP = int(os.environ.get('TITAN_PROFILE_KEEP', '50'))
+# Период сэмплирования стека, сек
+SAMPLE_INTERVAL = float(os.environ.get('TITAN_PROFILE_SAMPLE_SEC', '0.005'))
+# Сколько функций в сводке
+TOP_N = 30
+
+_busy = threading.Lock()
+
+# Профиль текущего запроса: {'mode', 'thread', 'profiles', 'sampler', 'lock'} или None.
+# Пулы потоков копируют контекст — его видят потоки, работающие на запрос
+_active: ContextVar = ContextVar('titan_profile', default=None)
+# Поток уже профилируется (вложенный profiled() в том же потоке — без второго профиля)
+_local = threading.local()
+# До 3.12 cProfile профилирует свой поток (sys.setprofile) — потокам запроса
+# нужен свой профилировщик. С 3.12 он один на интерпретатор (sys.monitoring),
+# второй даёт ValueError — потоки запроса снимает сэмплер
+_PER_THREAD_CPROFILE = sys.version_info < (3, 12)
+
+
+def _profile_mode(query_string):
+    value = parse_qs(query_string.decode('latin-1')).get('profile', [''])[-1].lower()
+    if value in ('1', 'true', 'cprofile'):
+        return 'cprofile'
+    if value in ('sample', 'flame'):
+        return 'sample'
+    return None
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler(threading.Thread):
+    """Фоновый поток: раз в interval снимает стеки потоков запроса и копит свёрнутые стеки.
+
+    Потоки — поток цикла событий и те, что сейчас выполняют работу запроса
+    (add/discard из profiled()).
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='titan-profile-sampler', daemon=True)
+        self.thread_ids = Counter({thread_id: 1} if thread_id is not None else {})
+        self.interval = interval
+        self.stacks = Counter()
+        self._halt = threading.Event()
+        self._lock = threading.Lock()
+
+    def add(self, thread_id):
+        with self._lock:
+            self.thread_ids[thread_id] += 1
+
+    def discard(self, thread_id):
+        with self._lock:
+            self.thread_ids[thread_id] -= 1
+            if self.thread_ids[thread_id] <= 0:
+                del self.thread_ids[thread_id]
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            with self._lock:
+                thread_ids = list(self.thread_ids)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if labels:
+                    self.stacks[';'.join(reversed(labels))] += 1
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+
+def _enable_profile():
+    """Включённый cProfile.Profile или None, если профилировщик занят другим инструментом."""
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError:
+        return None
+    return prof
+
+
+def profiled(func):
+    """func, профилируемая в любом потоке, если её запрос профилируется.
+
+    Для работы запроса, уходящей в другой поток: run_in_threadpool(profiled(f)),
+    pool.submit(copy_context().run, profiled(f), ...).
+    """
+    if not PROFILING_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        active = _active.get()
+        if active is None or getattr(_local, 'busy', False) or threading.get_ident() == active['thread']:
+            return func(*args, **kwargs)
+        _local.busy = True
+        ident = threading.get_ident()
+        prof = _enable_profile() if active['mode'] == 'cprofile' and _PER_THREAD_CPROFILE else None
+        # Без своего cProfile поток снимает сэмплер запроса
+        sampler = active['sampler'] if prof is None else None
+        if sampler is not None:
+            sampler.add(ident)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if prof is not None:
+                prof.disable()
+                with active['lock']:
+                    active['profiles'].append(prof)
+            if sampler is not None:
+                sampler.discard(ident)
+            _local.busy = False
+    return wrapper
+
+
+def profiled_iter(iterable):
+    """Итератор, каждый шаг которого — profiled() (потоковые ответы: шаги идут в пуле потоков)."""
+    it = iter(iterable)
+    step = profiled(next)
+    while True:
+        try:
+            item = step(it)
+        except StopIteration:
+            return
+        yield item
+
+
+def _merged_stats(profiles):
+    """Профили потоков запроса → один pstats.Stats."""
+    stats = pstats.Stats(profiles[0])
+    for prof in profiles[1:]:
+        stats.add(prof)
+    return stats
+
+
+def _top_from_stats(stats):
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append({
+            "function": f"{func} ({os.path.basename(filename)}:{line})",
+            "calls": nc,
+            "tottime": round(tt, 4),
+            "cumtime": round(ct, 4),
+        })
+    return {
+        "by_cumtime": sorted(rows, key=lambda r: r['cumtime'], reverse=True)[:TOP_N],
+        "by_tottime": sorted(rows, key=lambda r: r['tottime'], reverse=True)[:TOP_N],
+    }
+
+
+def _top_from_stacks(stacks, interval):
+    own = Counter()
+    total = Counter()
+    for stack, n in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += n
+        for label in set(frames):
+            total[label] += n
+    return {
+        "samples": sum(stacks.values()),
+        "by_self": [{"function": f, "samples": n, "seconds": round(n * interval, 4)} for f, n in own.most_common(TOP_N)],
+        "by_total": [{"function": f, "samples": n, "seconds": round(n * interval, 4)} for f, n in total.most_common(TOP_N)],
+    }
+
+
+def _prune():
+    """Оставить PROFILE_KEEP последних профилей."""
+    try:
+        summaries = sorted((f for f in os.listdir(PROFILE_DIR) if f.endswith('.json')),
+                           key=lambda f: os.path.getmtime(os.path.join(PROFILE_DIR, f)))
+    except OSError:
+        return
+    for name in summaries[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else summaries:
+        stem = name[:-len('.json')]
+        for ext in ('.json', '.prof', '.folded'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, stem + ext))
+            except OSError:
+                pass
+
+
+def _save(profile_id, summary, stats=None, stacks=None):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, profile_id)
+    if stats is not None:
+        stats.dump_stats(base + '.prof')
+    if stacks is not None:
+        with open(base + '.folded', 'w', encoding='utf-8') as f:
+            for stack, n in stacks.most_common():
+                f.write(f"{stack} {n}\n")
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+    _prune()
+
+
+def _safe_id(profile_id):
+    return profile_id if profile_id and profile_id.isalnum() else None
+
+
+def load_profile(profile_id):
+    """Сводка сохранённого профиля или None."""
+    profile_id = _safe_id(profile_id)
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.json") if profile_id else None
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def profile_file(profile_id, ext):
+    """Путь к .prof/.folded профиля или None."""
+    profile_id = _safe_id(profile_id)
+    if not profile_id or ext not in ('prof', 'folded'):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{ext}")
+    return path if os.path.exists(path) else None
+
+
+def list_profiles():
+    """Сохранённые профили, новые первыми (без топа функций)."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    items = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith('.json'):
+            summary = load_profile(name[:-len('.json')])
+            if summary:
+                items.append({k: v for k, v in summary.items() if k not in ('top', 'worker_top')})
+    return sorted(items, key=lambda s: s['started'], reverse=True)
+
+
+class ProfilingMiddleware:
+    """ASGI-мидлварь: профилирует запрос с ?profile=1|sample, если профилирование включено."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (not PROFILING_ENABLED or scope['type'] != 'http'
+                or not scope['path'].startswith('/api/') or scope['path'].startswith('/api/profiles')):
+            await self.app(scope, receive, send)
+            return
+        mode = _profile_mode(scope.get('query_string', b''))
+        # Профилировщик один на процесс: параллельный запрос идёт без профиля
+        if mode is None or not _busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+        scope.setdefault('state', {})['profile_id'] = profile_id
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', profile_id.encode())]
+            await send(message)
+
+        prof = sampler = None
+        active = {'mode': mode, 'thread': threading.get_ident(), 'profiles': [], 'sampler': None,
+                  'lock': threading.Lock()}
+        started = time.time()
+        t0 = time.perf_counter()
+        token = _active.set(active)
+        try:
+            if mode == 'cprofile':
+                prof = _enable_profile()
+                if prof is not None:
+                    active['profiles'].append(prof)
+                else:
+                    # Профилировщик занят другим инструментом — сэмплирование вместо cProfile
+                    mode = active['mode'] = 'sample'
+            if mode == 'sample':
+                sampler = active['sampler'] = _StackSampler(threading.get_ident(), SAMPLE_INTERVAL)
+                sampler.start()
+            elif not _PER_THREAD_CPROFILE:
+                # Сэмплер только для потоков запроса: cProfile в них не включить
+                sampler = active['sampler'] = _StackSampler(None, SAMPLE_INTERVAL)
+                sampler.start()
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _active.reset(token)
+            if prof is not None:
+                prof.disable()
+            if sampler is not None:
+                sampler.stop()
+            elapsed = time.perf_counter() - t0
+            try:
+                stats = None
+                if prof is not None:
+                    with active['lock']:
+                        stats = _merged_stats(list(active['profiles']))
+                summary = {
+                    "id": profile_id,
+                    "mode": mode,
+                    "method": scope.get('method'),
+                    "path": scope['path'],
+                    "query": scope.get('query_string', b'').decode('latin-1'),
+                    "started": started,
+                    "duration": round(elapsed, 4),
+                    "threads": len(active['profiles']) if prof is not None else None,
+                    "top": _top_from_stats(stats) if stats is not None else _top_from_stacks(sampler.stacks, SAMPLE_INTERVAL),
+                }
+                if stats is not None and sampler is not None:
+                    summary["worker_top"] = _top_from_stacks(sampler.stacks, SAMPLE_INTERVAL)
+                _save(profile_id, summary, stats=stats, stacks=sampler.stacks if sampler is not None else None)
+            finally:
+                _busy.release()
@@ -1,5 +1,6 @@
 import { useState } from 'react';
 import { FiltersProvider, useFilters } from './hooks/useFilters';
+import { DashboardProvider, useDashboardSection } from './hooks/useDashboard';
 import { C } from './theme/arctic';
 import Navbar from './components/Navbar';
 import Sidebar from './components/Sidebar';
@@ -8,8 +9,6 @@ import Footer from './components/Footer';
 import UploadScreen from './components/UploadScreen';
 import KpiRow from './components/KpiRow';
 import KpiCard from './components/KpiCard';
-import { apiGet } from './api/client';
-import { useEffect } from 'react';
 
 // Вкладки
 import Finance from './tabs/Finance';
@@ -52,21 +51,14 @@ const TAB_COMPONENTS = {
 };
 
 /**
- * Основное содержимое приложения (внутри FiltersProvider)
+ * Основное содержимое приложения (внутри FiltersProvider и DashboardProvider)
  */
 function AppContent() {
-  const { sessionId, fileInfo, filters, thresholds } = useFilters();
+  const { sessionId, fileInfo } = useFilters();
   const [activeTab, setActiveTab] = useState('finance');
   const [activeMethod, setActiveMethod] = useState(null);
-  const [kpi, setKpi] = useState(null);
-
-  // Загрузка KPI при изменении фильтров
-  useEffect(() => {
-    if (!sessionId) return;
-    apiGet('/api/kpi', { session_id: sessionId, filters, thresholds })
-      .then(setKpi)
-      .catch(() => {});
-  }, [sessionId, filters, thresholds]);
+  // KPI — раздел общего запроса дашборда (до прихода нового — прежние значения)
+  const { data: kpi } = useDashboardSection('kpi');
 
   // Экран загрузки файла
   if (!sessionId) {
@@ -130,7 +122,9 @@ function AppContent() {
 export default function App() {
   return (
     <FiltersProvider>
-      <AppContent />
+      <DashboardProvider>
+        <AppContent />
+      </DashboardProvider>
     </FiltersProvider>
   );
 }
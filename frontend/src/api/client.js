@@ -20,7 +20,11 @@ export async function apiUpload(file) {
   return res.json();
 }
 
-export async function apiGet(endpoint, params = {}) {
+/**
+ * GET-запрос к API. options.signal — AbortSignal: прерванный запрос
+ * сервер тоже прекращает считать.
+ */
+export async function apiGet(endpoint, params = {}, options = {}) {
   const url = new URL(`${BASE_URL}${endpoint}`, window.location.origin);
   Object.entries(params).forEach(([k, v]) => {
     if (v !== undefined && v !== null) {
@@ -28,14 +32,57 @@ export async function apiGet(endpoint, params = {}) {
     }
   });
 
-  const res = await fetch(url.toString());
+  const res = await fetch(url.toString(), { signal: options.signal });
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
-    throw new Error(err.error || `Ошибка ${res.status}`);
+    const error = new Error(err.error || `Ошибка ${res.status}`);
+    error.status = res.status;
+    // Расчёт отменён сервером: фильтры сессии изменились (superseded)
+    error.cancelled = err.cancelled || null;
+    throw error;
   }
   return res.json();
 }
 
+/**
+ * Ошибка запроса, который вытеснен новым (прерван клиентом или отменён
+ * сервером): за ним уже идёт новый запрос, загрузку не завершать.
+ */
+export function isCancelled(err) {
+  return err?.name === 'AbortError' || Boolean(err?.cancelled);
+}
+
+/**
+ * Колоночный ответ ({"$columns": {поле: [значения]}}) → обычные записи.
+ */
+export function fromColumns(value) {
+  if (Array.isArray(value)) return value.map(fromColumns);
+  if (!value || typeof value !== 'object') return value;
+  const keys = Object.keys(value);
+  if (keys.length === 1 && keys[0] === '$columns') {
+    const cols = value.$columns;
+    const names = Object.keys(cols);
+    const n = names.length ? cols[names[0]].length : 0;
+    const rows = new Array(n);
+    for (let i = 0; i < n; i++) {
+      const row = {};
+      for (const name of names) row[name] = cols[name][i];
+      rows[i] = row;
+    }
+    return rows;
+  }
+  const out = {};
+  for (const k of keys) out[k] = fromColumns(value[k]);
+  return out;
+}
+
+/**
+ * Как apiGet, но таблицы ответа передаются по колонкам (меньше объём).
+ */
+export async function apiGetColumns(endpoint, params = {}, options = {}) {
+  return fromColumns(await apiGet(endpoint, { ...params, format: 'columns' }, options));
+}
+
 export async function apiDownload(endpoint, params = {}) {
   const url = new URL(`${BASE_URL}${endpoint}`, window.location.origin);
   Object.entries(params).forEach(([k, v]) => {
@@ -48,9 +95,60 @@ export async function apiDownload(endpoint, params = {}) {
   if (!res.ok) throw new Error('Ошибка скачивания');
 
   const blob = await res.blob();
+  const disposition = res.headers.get('Content-Disposition') || '';
+  const match = disposition.match(/filename="?([^";]+)"?/);
   const a = document.createElement('a');
   a.href = URL.createObjectURL(blob);
-  a.download = `titan_export_${new Date().toISOString().slice(0,10)}.xlsx`;
+  a.download = match ? match[1] : `titan_export_${new Date().toISOString().slice(0,10)}.xlsx`;
   a.click();
   URL.revokeObjectURL(a.href);
 }
+
+/**
+ * Несколько вкладок одним запросом (POST /api/dashboard).
+ * С onSection разделы приходят потоком (NDJSON) по мере готовности.
+ * Таблицы разделов (тепловая карта ЕО, реестр заказов, парето) передаются
+ * по колонкам и разворачиваются в записи (fromColumns).
+ * options.signal — AbortSignal; ошибки — как у apiGet (isCancelled).
+ */
+export async function apiDashboard(body, onSection, options = {}) {
+  const res = await fetch(`${BASE_URL}/api/dashboard?format=columns`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ ...body, stream: Boolean(onSection) }),
+    signal: options.signal,
+  });
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({}));
+    const error = new Error(err.error || `Ошибка ${res.status}`);
+    error.status = res.status;
+    error.cancelled = err.cancelled || null;
+    throw error;
+  }
+  if (!onSection) return fromColumns(await res.json());
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  const sections = {};
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const { section, data, cancelled } = JSON.parse(line);
+      // Расчёт вытеснен после начала ответа — последней строкой {"cancelled": причина}
+      if (cancelled) {
+        const error = new Error('Расчёт отменён');
+        error.cancelled = cancelled;
+        throw error;
+      }
+      sections[section] = fromColumns(data);
+      onSection(section, sections[section]);
+    }
+    if (done) break;
+  }
+  return { sections };
+}
@@ -93,22 +93,46 @@ export default function ChatWidget() {
 
   const checkLlm = async () => {
     try {
-      const res = await fetch(`${BASE_URL}/api/chat`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          session_id: sessionId,
-          message: 'ping',
-          history: [],
-        }),
-      });
+      const res = await fetch(`${BASE_URL}/api/chat/status`);
       const data = await res.json();
-      setLlmAvailable(data.llm_available);
+      setLlmAvailable(data.available);
     } catch {
       setLlmAvailable(false);
     }
   };
 
+  // Ответ потоком (SSE): события token / done / error
+  const streamReply = async (body, onToken) => {
+    const res = await fetch(`${BASE_URL}/api/chat/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(body),
+    });
+    if (!res.ok) {
+      const err = await res.json().catch(() => ({}));
+      throw new Error(err.detail || `Ошибка ${res.status}`);
+    }
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = { llm_available: false };
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const raw of events) {
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+        if (event === 'token') onToken(data.text);
+        else if (event === 'done') result = data;
+        else if (event === 'error') throw new Error(data.error);
+      }
+      if (done) break;
+    }
+    return result;
+  };
+
   const sendMessage = useCallback(async () => {
     const text = input.trim();
     if (!text || loading || !sessionId) return;
@@ -124,21 +148,25 @@ export default function ChatWidget() {
         .filter((m) => m !== WELCOME_MESSAGE)
         .map((m) => ({ role: m.role, content: m.content }));
 
-      const res = await fetch(`${BASE_URL}/api/chat`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          session_id: sessionId,
-          message: text,
-          history,
-        }),
+      let started = false;
+      const data = await streamReply({ session_id: sessionId, message: text, history }, (token) => {
+        // Первый токен — новое сообщение ассистента, дальше дописываем его
+        if (!started) {
+          started = true;
+          setLoading(false);
+          setMessages((prev) => [...prev, { role: 'assistant', content: token }]);
+        } else {
+          setMessages((prev) => [
+            ...prev.slice(0, -1),
+            { ...prev[prev.length - 1], content: prev[prev.length - 1].content + token },
+          ]);
+        }
       });
-
-      const data = await res.json();
       setLlmAvailable(data.llm_available);
 
-      const assistantMsg = { role: 'assistant', content: data.reply || 'Нет ответа.' };
-      setMessages((prev) => [...prev, assistantMsg]);
+      if (!started) {
+        setMessages((prev) => [...prev, { role: 'assistant', content: 'Нет ответа.' }]);
+      }
     } catch (err) {
       setMessages((prev) => [
         ...prev,
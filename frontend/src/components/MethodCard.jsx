@@ -3,7 +3,7 @@ import { C, GRADIENTS, METHOD_COLORS } from '../theme/arctic';
 /**
  * Карточка метода с donut SVG — единый размер, увеличенный донат
  */
-export default function MethodCard({ name, desc, count, total, sum, color, threshold, icon, orders_without_eo }) {
+export default function MethodCard({ name, desc, count, total, sum, color, threshold, icon, orders_without_eo, missing_fields }) {
   const pct = total > 0 ? (count / total * 100) : 0;
   const methodKey = name.split(':')[0];
   const clr = color || METHOD_COLORS[methodKey] || C.accent;
@@ -62,6 +62,11 @@ export default function MethodCard({ name, desc, count, total, sum, color, thres
             Заказов без ЕО: {orders_without_eo.toLocaleString('ru-RU')} (не учтены)
           </div>
         )}
+        {missing_fields && missing_fields.length > 0 && (
+          <div style={{ fontSize: 11, color: C.dim, marginTop: 4 }}>
+            Не рассчитан: нет колонок {missing_fields.join(', ')}
+          </div>
+        )}
       </div>
     </div>
   );
@@ -137,6 +137,20 @@ export default function Sidebar() {
             );
           })}
 
+          {/* База сравнения C1-M6 / C2-M2 */}
+          <div style={{ marginBottom: 12, marginTop: 12 }}>
+            <label style={{ fontSize: 11, color: C.muted, textTransform: 'uppercase' }}>База сравнения</label>
+            <select
+              value={filters.baseline || 'session'}
+              onChange={e => updateFilter('baseline', e.target.value)}
+              title="Медианы ТМ и счётчики ЕО: по текущей выборке или по всем загрузкам"
+              style={inputStyle}
+            >
+              <option value="session">Текущая выборка</option>
+              <option value="history">История загрузок</option>
+            </select>
+          </div>
+
           {/* Пороги методов */}
           <div style={{ marginBottom: 12, marginTop: 12 }}>
             <div style={{ fontSize: 11, color: C.muted, textTransform: 'uppercase', marginBottom: 8 }}>
@@ -148,6 +162,8 @@ export default function Sidebar() {
               { key: 'C2-M2: Проблемное оборудование', label: 'C2-M2: Проблемное оборудование', unit: 'шт', min: 2, max: 20, color: '#fb923c' },
               { key: 'NEW-9: Формальное закрытие в декабре', label: 'NEW-9: Формальное закрытие', unit: '%', min: 30, max: 70, color: '#22d3ee' },
               { key: 'NEW-10: Возвраты статусов', label: 'NEW-10: Возвраты статусов', unit: 'шт', min: 1, max: 10, color: '#34d399' },
+              { key: 'NEW-11: Дубли заказов', label: 'NEW-11: Дубли заказов', unit: '%', min: 50, max: 99, color: '#e879f9' },
+              { key: 'NEW-12: Всплеск затрат ЕО', label: 'NEW-12: Всплеск затрат ЕО', unit: 'z', min: 2, max: 10, step: 0.5, color: '#38bdf8' },
             ].map(t => (
               <div key={t.key} style={{ marginBottom: 10, padding: '6px 8px', borderRadius: 6, background: `${t.color}08`, borderLeft: `3px solid ${t.color}` }}>
                 <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: 2 }}>
@@ -160,6 +176,7 @@ export default function Sidebar() {
                   type="range"
                   min={t.min}
                   max={t.max}
+                  step={t.step || 1}
                   value={thresholds[t.key] || 0}
                   onChange={e => updateThreshold(t.key, Number(e.target.value))}
                   style={{ width: '100%', accentColor: t.color, marginTop: 2 }}
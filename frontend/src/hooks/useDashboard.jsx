@@ -0,0 +1,57 @@
+import React, { createContext, useContext, useEffect, useState } from 'react';
+import { useFilters } from './useFilters';
+import { apiDashboard, isCancelled } from '../api/client';
+
+const DashboardContext = createContext(null);
+
+// Разделы POST /api/dashboard: KPI и все вкладки (Risks и Orders — первая страница)
+const SECTIONS = [
+  'kpi', 'finance', 'timeline', 'work_types', 'planners',
+  'workplaces', 'risks', 'quality', 'equipment', 'orders',
+];
+
+/**
+ * KPI и вкладки одним запросом: при смене фильтров — один проход фильтров
+ * и скоринга на сервере, разделы приходят потоком по мере готовности.
+ */
+export function DashboardProvider({ children }) {
+  const { sessionId, filters, thresholds } = useFilters();
+  // sections — последние полученные данные разделов, received — пришедшие в текущем запросе
+  const [state, setState] = useState({ sections: {}, received: {}, loading: false });
+
+  useEffect(() => {
+    if (!sessionId) return;
+    const controller = new AbortController();
+    setState(prev => ({ ...prev, received: {}, loading: true }));
+    const onSection = (section, data) => setState(prev => ({
+      ...prev,
+      sections: { ...prev.sections, [section]: data },
+      received: { ...prev.received, [section]: true },
+    }));
+    apiDashboard({ session_id: sessionId, filters, thresholds, sections: SECTIONS }, onSection,
+      { signal: controller.signal })
+      .then(() => setState(prev => ({ ...prev, loading: false })))
+      .catch(err => { if (!isCancelled(err)) setState(prev => ({ ...prev, loading: false })); });
+    return () => controller.abort();
+  }, [sessionId, filters, thresholds]);
+
+  return (
+    <DashboardContext.Provider value={state}>
+      {children}
+    </DashboardContext.Provider>
+  );
+}
+
+/**
+ * Раздел дашборда: { data, loading }. Пока раздел текущего запроса не пришёл,
+ * data — прежние данные (null, если раздела не было или он с ошибкой).
+ */
+export function useDashboardSection(name) {
+  const ctx = useContext(DashboardContext);
+  if (!ctx) throw new Error('useDashboardSection must be used within DashboardProvider');
+  const data = ctx.sections[name];
+  return {
+    data: data && !data.error ? data : null,
+    loading: ctx.loading && !ctx.received[name],
+  };
+}
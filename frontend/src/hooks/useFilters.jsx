@@ -15,6 +15,7 @@ const DEFAULT_FILTERS = {
   ingrp: [],
   date_from: '',
   date_to: '',
+  baseline: 'session',
 };
 
 const DEFAULT_THRESHOLDS = {
@@ -24,6 +25,8 @@ const DEFAULT_THRESHOLDS = {
   "C2-M2: Проблемное оборудование": 5,
   "NEW-9: Формальное закрытие в декабре": 50,
   "NEW-10: Возвраты статусов": 3,
+  "NEW-11: Дубли заказов": 85,
+  "NEW-12: Всплеск затрат ЕО": 3.5,
 };
 
 export function FiltersProvider({ children }) {
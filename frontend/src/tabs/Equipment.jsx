@@ -1,8 +1,9 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { BarChart, Bar, PieChart, Pie, Cell, XAxis, YAxis, Tooltip, ResponsiveContainer, LabelList, LineChart, Line, AreaChart, Area } from 'recharts';
 import { C, ABC_COLORS } from '../theme/arctic';
 import { useFilters } from '../hooks/useFilters';
-import { apiGet, apiDownload } from '../api/client';
+import { useDashboardSection } from '../hooks/useDashboard';
+import { apiDownload } from '../api/client';
 import KpiCard from '../components/KpiCard';
 import KpiRow from '../components/KpiRow';
 import SectionTitle from '../components/SectionTitle';
@@ -45,8 +46,7 @@ function sortMonthLabels(labels) {
 
 export default function Equipment() {
   const { sessionId, filters, thresholds } = useFilters();
-  const [data, setData] = useState(null);
-  const [loading, setLoading] = useState(false);
+  const { data, loading } = useDashboardSection('equipment');
   const [topSort, setTopSort] = useState({ col: 'fact', dir: 'desc' });
   const csAbc = useChartSettings('eq-abc');
   const csClasses = useChartSettings('eq-classes');
@@ -57,13 +57,6 @@ export default function Equipment() {
   const [classesChartType, setClassesChartType] = useState('hbar');
   const [freqChartType, setFreqChartType] = useState('hbar');
 
-  useEffect(() => {
-    if (!sessionId) return;
-    setLoading(true);
-    apiGet('/api/tab/equipment', { session_id: sessionId, filters, thresholds })
-      .then(setData).catch(() => {}).finally(() => setLoading(false));
-  }, [sessionId, filters, thresholds]);
-
   if (loading) return <p style={{ color: C.muted }}>Загрузка...</p>;
   if (!data) return null;
 
@@ -1,8 +1,8 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { BarChart, Bar, XAxis, YAxis, Tooltip, ResponsiveContainer, AreaChart, Area, LineChart, Line, ReferenceLine, LabelList, Legend } from 'recharts';
 import { C } from '../theme/arctic';
-import { useFilters } from '../hooks/useFilters';
-import { apiGet, apiDownload } from '../api/client';
+import { useDashboardSection } from '../hooks/useDashboard';
+import { apiDownload } from '../api/client';
 import KpiCard from '../components/KpiCard';
 import KpiRow from '../components/KpiRow';
 import SectionTitle from '../components/SectionTitle';
@@ -49,9 +49,7 @@ const shortMonth = (label) => {
 };
 
 export default function Finance() {
-  const { sessionId, filters, thresholds } = useFilters();
-  const [data, setData] = useState(null);
-  const [loading, setLoading] = useState(false);
+  const { data, loading } = useDashboardSection('finance');
   const csMain = useChartSettings('fin-monthly');
   const csPareto = useChartSettings('fin-pareto');
 
@@ -59,15 +57,6 @@ export default function Finance() {
   const [monthlyChartType, setMonthlyChartType] = useState('bar');
   const [paretoChartType, setParetoChartType] = useState('area');
 
-  useEffect(() => {
-    if (!sessionId) return;
-    setLoading(true);
-    apiGet('/api/tab/finance', { session_id: sessionId, filters, thresholds })
-      .then(setData)
-      .catch(() => {})
-      .finally(() => setLoading(false));
-  }, [sessionId, filters, thresholds]);
-
   if (loading) return <p style={{ color: C.muted }}>Загрузка...</p>;
   if (!data) return null;
 
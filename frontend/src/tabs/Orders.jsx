@@ -1,7 +1,8 @@
 import { useState, useEffect, useCallback } from 'react';
 import { C } from '../theme/arctic';
 import { useFilters } from '../hooks/useFilters';
-import { apiGet, apiDownload } from '../api/client';
+import { useDashboardSection } from '../hooks/useDashboard';
+import { apiGetColumns, apiDownload, isCancelled } from '../api/client';
 import KpiCard from '../components/KpiCard';
 import KpiRow from '../components/KpiRow';
 import SectionTitle from '../components/SectionTitle';
@@ -24,8 +25,8 @@ function fmtNum(v) {
 
 export default function Orders({ activeMethod, setActiveMethod }) {
   const { sessionId, filters, thresholds } = useFilters();
-  const [data, setData] = useState(null);
-  const [loading, setLoading] = useState(false);
+  const [viewData, setViewData] = useState(null);
+  const [viewLoading, setViewLoading] = useState(false);
   const [page, setPage] = useState(1);
   const [sort, setSort] = useState('Risk_Sum');
   const [order, setOrder] = useState('desc');
@@ -76,15 +77,26 @@ export default function Orders({ activeMethod, setActiveMethod }) {
     return filters;
   }, [filters, appliedQf]);
 
+  // Первая страница без быстрых фильтров и своей сортировки — из общего запроса
+  // дашборда, остальное — своим запросом
+  const firstPage = useDashboardSection('orders');
+  const fromDashboard = page === 1 && sort === 'Risk_Sum' && order === 'desc'
+    && !Object.values(appliedQf).some(v => v.length > 0);
+
   useEffect(() => {
-    if (!sessionId) return;
-    setLoading(true);
-    apiGet('/api/tab/orders', {
+    if (!sessionId || fromDashboard) return;
+    const controller = new AbortController();
+    setViewLoading(true);
+    apiGetColumns('/api/tab/orders', {
       session_id: sessionId, filters: buildFilters(), thresholds,
       page, page_size: 50, sort, order,
-    })
-      .then(setData).catch(() => {}).finally(() => setLoading(false));
-  }, [sessionId, filters, thresholds, page, sort, order, appliedQf]);
+    }, { signal: controller.signal })
+      .then(d => { setViewData(d); setViewLoading(false); })
+      .catch(err => { if (!isCancelled(err)) setViewLoading(false); });
+    return () => controller.abort();
+  }, [sessionId, filters, thresholds, page, sort, order, appliedQf, fromDashboard]);
+
+  const { data, loading } = fromDashboard ? firstPage : { data: viewData, loading: viewLoading };
 
   if (loading) return <p style={{ color: C.muted }}>Загрузка...</p>;
   if (!data) return null;
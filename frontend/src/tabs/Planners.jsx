@@ -1,8 +1,7 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { BarChart, Bar, PieChart, Pie, Cell, XAxis, YAxis, Tooltip, ResponsiveContainer, Legend, LabelList, LineChart, Line } from 'recharts';
 import { C } from '../theme/arctic';
-import { useFilters } from '../hooks/useFilters';
-import { apiGet } from '../api/client';
+import { useDashboardSection } from '../hooks/useDashboard';
 import KpiCard from '../components/KpiCard';
 import KpiRow from '../components/KpiRow';
 import SectionTitle from '../components/SectionTitle';
@@ -36,9 +35,7 @@ const FIELD_SAP_MAP = {
 };
 
 export default function Planners() {
-  const { sessionId, filters, thresholds } = useFilters();
-  const [data, setData] = useState(null);
-  const [loading, setLoading] = useState(false);
+  const { data, loading } = useDashboardSection('planners');
   const [hoveredField, setHoveredField] = useState(null);
   const csDonut = useChartSettings('pl-donut');
   const csBar = useChartSettings('pl-bar');
@@ -47,13 +44,6 @@ export default function Planners() {
   const [donutType, setDonutType] = useState('donut');
   const [barType, setBarType] = useState('hbar');
 
-  useEffect(() => {
-    if (!sessionId) return;
-    setLoading(true);
-    apiGet('/api/tab/planners', { session_id: sessionId, filters, thresholds })
-      .then(setData).catch(() => {}).finally(() => setLoading(false));
-  }, [sessionId, filters, thresholds]);
-
   if (loading) return <p style={{ color: C.muted }}>Загрузка...</p>;
   if (!data) return null;
 
@@ -1,8 +1,7 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { BarChart, Bar, XAxis, YAxis, Tooltip, ResponsiveContainer } from 'recharts';
 import { C } from '../theme/arctic';
-import { useFilters } from '../hooks/useFilters';
-import { apiGet } from '../api/client';
+import { useDashboardSection } from '../hooks/useDashboard';
 import KpiCard from '../components/KpiCard';
 import KpiRow from '../components/KpiRow';
 import SectionTitle from '../components/SectionTitle';
@@ -10,20 +9,11 @@ import Card from '../components/Card';
 import ChartSettings, { useChartSettings } from '../components/ChartSettings';
 
 export default function Quality() {
-  const { sessionId, filters, thresholds } = useFilters();
-  const [data, setData] = useState(null);
-  const [loading, setLoading] = useState(false);
+  const { data, loading } = useDashboardSection('quality');
   const csBar = useChartSettings('q-bar');
 
   const [chartType, setChartType] = useState('hbar');
 
-  useEffect(() => {
-    if (!sessionId) return;
-    setLoading(true);
-    apiGet('/api/tab/quality', { session_id: sessionId, filters, thresholds })
-      .then(setData).catch(() => {}).finally(() => setLoading(false));
-  }, [sessionId, filters, thresholds]);
-
   if (loading) return <p style={{ color: C.muted }}>Загрузка...</p>;
   if (!data) return null;
 
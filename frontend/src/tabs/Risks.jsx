@@ -1,7 +1,8 @@
 import { useState, useEffect, useCallback } from 'react';
 import { C, METHOD_COLORS } from '../theme/arctic';
 import { useFilters } from '../hooks/useFilters';
-import { apiGet } from '../api/client';
+import { useDashboardSection } from '../hooks/useDashboard';
+import { apiGetColumns, isCancelled } from '../api/client';
 import KpiCard from '../components/KpiCard';
 import KpiRow from '../components/KpiRow';
 import SectionTitle from '../components/SectionTitle';
@@ -59,6 +60,18 @@ const METHOD_DETAILS = {
     logic: "Подсчёт количества откатов статуса заказа на предыдущий. Если возвратов > Порога — аномалия.",
     risks: "Манипуляции с документооборотом, исправление ошибок задним числом, несогласованность процессов.",
     audit: "Изучить историю статусов, выявить причины возвратов, проверить корректность согласований."
+  },
+  "NEW-11": {
+    title: "Дубли заказов",
+    logic: "Тексты заказов на одну ЕО (без ЕО — на одно ТМ) с плановым началом в пределах 30 дней сравниваются по символьным фрагментам (MinHash-LSH, проверка точным сходством). Сходство ≥ Порога — вероятный дубль; одинаковый текст — максимальный балл.",
+    risks: "Повторная оплата одной и той же работы, дробление заказа, ошибки ввода.",
+    audit: "Сопоставить заказы-дубли: объём, акты, исполнителя; убедиться, что работы выполнялись дважды."
+  },
+  "NEW-12": {
+    title: "Всплеск затрат ЕО",
+    logic: "Для каждой ЕО (без ЕО — ТМ) строятся помесячные затраты и число заказов. Месяц заказа сравнивается с медианой предыдущих 12 месяцев: отклонение в единицах MAD (робастный z) ≥ Порога — всплеск. Нужно не меньше 6 месяцев истории.",
+    risks: "Резкий рост ремонтов оборудования: скрытая авария, завышение объёмов, перенос затрат с других объектов.",
+    audit: "Сравнить заказы месяца всплеска с обычными: виды работ, исполнителей, материалы; проверить техническое состояние ЕО."
   }
 };
 
@@ -140,21 +153,31 @@ function MethodologyBlock() {
 
 export default function Risks({ setActiveMethod, setActiveTab }) {
   const { sessionId, filters, thresholds } = useFilters();
-  const [data, setData] = useState(null);
-  const [loading, setLoading] = useState(false);
+  const [pageData, setPageData] = useState(null);
+  const [pageLoading, setPageLoading] = useState(false);
   const [page, setPage] = useState(1);
   const [pageSize] = useState(50);
+  // Первая страница — из общего запроса дашборда, остальные — своим запросом
+  const firstPage = useDashboardSection('risks');
+  const fromDashboard = page === 1;
 
+  // Возвращает функцию отмены запроса (очистка эффекта)
   const loadData = useCallback(() => {
-    if (!sessionId) return;
-    setLoading(true);
-    apiGet('/api/tab/risks', { session_id: sessionId, filters, thresholds, page, page_size: pageSize })
-      .then(setData).catch(() => {}).finally(() => setLoading(false));
-  }, [sessionId, filters, thresholds, page, pageSize]);
+    if (!sessionId || fromDashboard) return undefined;
+    const controller = new AbortController();
+    setPageLoading(true);
+    apiGetColumns('/api/tab/risks', { session_id: sessionId, filters, thresholds, page, page_size: pageSize },
+      { signal: controller.signal })
+      .then(d => { setPageData(d); setPageLoading(false); })
+      .catch(err => { if (!isCancelled(err)) setPageLoading(false); });
+    return () => controller.abort();
+  }, [sessionId, filters, thresholds, page, pageSize, fromDashboard]);
 
-  useEffect(() => { loadData(); }, [loadData]);
+  useEffect(() => loadData(), [loadData]);
   useEffect(() => { setPage(1); }, [filters, thresholds]);
 
+  const { data, loading } = fromDashboard ? firstPage : { data: pageData ?? firstPage.data, loading: pageLoading };
+
   if (loading && !data) return <p style={{ color: C.muted }}>Загрузка...</p>;
   if (!data) return null;
 
@@ -214,7 +237,7 @@ export default function Risks({ setActiveMethod, setActiveTab }) {
               }} style={{ cursor: 'pointer' }}>
                 <MethodCard name={m.name} desc={m.desc} count={m.count}
                   total={m.total} sum={m.sum} color={m.color} threshold={m.threshold} icon={m.icon}
-                  orders_without_eo={m.orders_without_eo} />
+                  orders_without_eo={m.orders_without_eo} missing_fields={m.missing_fields} />
               </div>
               {details && (
                 <div style={{
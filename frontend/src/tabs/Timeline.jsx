@@ -1,8 +1,7 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { BarChart, Bar, LineChart, Line, AreaChart, Area, XAxis, YAxis, Tooltip, ResponsiveContainer, Legend, LabelList } from 'recharts';
 import { C } from '../theme/arctic';
-import { useFilters } from '../hooks/useFilters';
-import { apiGet } from '../api/client';
+import { useDashboardSection } from '../hooks/useDashboard';
 import KpiCard from '../components/KpiCard';
 import KpiRow from '../components/KpiRow';
 import SectionTitle from '../components/SectionTitle';
@@ -56,9 +55,7 @@ function mergeSeriesData(series) {
 }
 
 export default function Timeline() {
-  const { sessionId, filters, thresholds } = useFilters();
-  const [data, setData] = useState(null);
-  const [loading, setLoading] = useState(false);
+  const { data, loading } = useDashboardSection('timeline');
   const csCost = useChartSettings('tl-cost');
   const csCount = useChartSettings('tl-count');
   const csDur = useChartSettings('tl-dur');
@@ -68,13 +65,6 @@ export default function Timeline() {
   const [countType, setCountType] = useState('bar');
   const [durType, setDurType] = useState('line');
 
-  useEffect(() => {
-    if (!sessionId) return;
-    setLoading(true);
-    apiGet('/api/tab/timeline', { session_id: sessionId, filters, thresholds })
-      .then(setData).catch(() => {}).finally(() => setLoading(false));
-  }, [sessionId, filters, thresholds]);
-
   if (loading) return <p style={{ color: C.muted }}>Загрузка...</p>;
   if (!data) return null;
 
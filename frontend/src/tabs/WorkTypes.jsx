@@ -1,8 +1,7 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { BarChart, Bar, PieChart, Pie, Cell, XAxis, YAxis, Tooltip, ResponsiveContainer, Legend, LabelList, LineChart, Line } from 'recharts';
 import { C } from '../theme/arctic';
-import { useFilters } from '../hooks/useFilters';
-import { apiGet } from '../api/client';
+import { useDashboardSection } from '../hooks/useDashboard';
 import KpiCard from '../components/KpiCard';
 import KpiRow from '../components/KpiRow';
 import SectionTitle from '../components/SectionTitle';
@@ -34,9 +33,7 @@ function dedupeByLabel(arr) {
 }
 
 export default function WorkTypes() {
-  const { sessionId, filters, thresholds } = useFilters();
-  const [data, setData] = useState(null);
-  const [loading, setLoading] = useState(false);
+  const { data, loading } = useDashboardSection('work_types');
   const csDonut = useChartSettings('wt-donut');
   const csBar = useChartSettings('wt-bar');
   const csMonthly = useChartSettings('wt-monthly');
@@ -46,13 +43,6 @@ export default function WorkTypes() {
   const [barType, setBarType] = useState('hbar');
   const [monthlyType, setMonthlyType] = useState('bar');
 
-  useEffect(() => {
-    if (!sessionId) return;
-    setLoading(true);
-    apiGet('/api/tab/work-types', { session_id: sessionId, filters, thresholds })
-      .then(setData).catch(() => {}).finally(() => setLoading(false));
-  }, [sessionId, filters, thresholds]);
-
   if (loading) return <p style={{ color: C.muted }}>Загрузка...</p>;
   if (!data) return null;
 
@@ -34,6 +34,8 @@ export const METHOD_COLORS = {
   "C2-M2": "#fb923c",
   "NEW-9": "#22d3ee",
   "NEW-10": "#34d399",
+  "NEW-11": "#e879f9",
+  "NEW-12": "#38bdf8",
 };
 
 // Цвета ABC